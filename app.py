@@ -1,8 +1,24 @@
-from datetime import datetime
+import datetime
+import functools
+import logging
+import os
+import sqlite3
+import time
 import streamlit as st
+import numpy as np
+import pyarrow as pa
 import pandas as pd
-import re
-from fpdf import FPDF
+
+from counterpro.data import SourceCache, fetch_data, frame_bytes
+from counterpro.fit import FIT_MAX_PIECES, FitIndex
+from counterpro.history import QuoteHistory, log as history_log
+from counterpro.inventory import (DEFAULT_JOB_SQFT, LocationPartitions, PriceMatrix, PriceMatrixCache, SearchIndex,
+                                 SerialIndex, display_names)
+from counterpro.pdf import QuotePdfCache, make_render_pool, zip_quotes
+from counterpro.pricing import SINK_OPTIONS, TAX_RATE, WASTE_FACTOR, calculate_cost
+from counterpro.profiling import NULL_RUN, StageProfiler, log as profile_log
+from counterpro.snapshot import load_snapshot, save_snapshot
+from counterpro.store import INVENTORY_VERSIONS_KEPT, InventoryRefresher
 
 # --- 1. CONFIGURATION ---
 st.set_page_config(
@@ -164,287 +180,715 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 2. CONSTANTS ---
-INSTALL_COST_PER_SQFT    = 21.0
-FABRICATION_COST_PER_SQFT = 16.0
-WASTE_FACTOR  = 1.20
-TAX_RATE      = 0.05
-
-# Pricing Controls
-IB_MATERIAL_MARKUP    = 1.05   # 5 % markup on raw material for IB
-IB_MIN_MARGIN         = 0.18   # Ensure IB is at least 18 % margin over raw costs
-IB_TO_CUSTOMER_MARKUP = 1.15   # Customer Mat+Fab is 15 % higher than IB
+# Pricing constants, the sink list and the pricing / parsing / fetching
+# logic live in the `counterpro` package so they can be used without Streamlit.
 
 # UI Controls
 MAX_COMPARISON_COLS = 6        # Max columns shown in the comparison tray
-QUOTE_VALIDITY_DAYS = 30       # Number of days a generated quote is valid
-
-# DATA SOURCES
-DATA_SOURCES = [
-    "https://docs.google.com/spreadsheets/d/e/2PACX-1vSkoSeMuPGqr5-JEBhHO5l0fFYlkfmbMUW-VU8UZEpR0pd4lSeyK74WHE47m1zYMg/pub?output=csv"
-]
-
-# --- 3. SINK DATA  (emojis added for quick visual scanning) ---
-SINK_OPTIONS = {
-    "✅ In-Stock/No Sink": 0.00,
-    # ── Kitchen Sinks – Standard Radius ──────────────────────────────
-    "🥣 50/50 Undermount Standard Radius - SKU 83742 (16 ga)": 300.00,
-    "🥣 Large Single Bowl Undermount Standard Radius - SKU 83744 (16 ga)": 325.00,
-    "🥣 Medium Single Bowl Undermount Standard Radius - SKU 83745 (18 ga)": 230.00,
-    "🥣 60/40 Undermount Standard Radius - SKU 83747 (16 ga)": 370.00,
-    "🥣 40/60 Undermount Standard Radius - SKU 83995 (16 ga)": 370.00,
-    # ── Bar Sinks – Standard Radius ───────────────────────────────────
-    "🍸 Large Bar Undermount Standard Radius - SKU 83993 (18 ga)": 250.00,
-    "🍸 Small Bar Undermount Standard Radius - SKU 83992 (18 ga)": 180.00,
-    # ── Kitchen Sinks – 15° Radius ────────────────────────────────────
-    "🥣 50/50 Undermount 15° Radius - SKU 83749 (18 ga)": 440.00,
-    "🥣 Large Single Bowl Undermount 15° Radius - SKU 83748 (18 ga)": 450.00,
-    "🥣 Medium Single Bowl Undermount 15° Radius - SKU 83750 (18 ga)": 400.00,
-    # ── Top-mount ─────────────────────────────────────────────────────
-    "🥣 Top-mount Double Bowl Standard Radius - SKU 85446 (18 ga)": 270.00,
-    # ── Vanity Sinks (White Porcelain) ────────────────────────────────
-    "🛁 Large Rectangular Undermount Vanity - SKU 84020 (Porcelain)": 105.00,
-    "🛁 Medium Rectangular Undermount Vanity - SKU 84022 (Porcelain)": 105.00,
-    "🛁 Large Oval Undermount Vanity - SKU 84024 (Porcelain)": 89.00,
-    "🛁 Medium Oval Undermount Vanity - SKU 84026 (Porcelain)": 89.00,
-}
-
-
-# --- 4. PRICING LOGIC (unchanged) ---
-def calculate_cost(unit_cost, project_sqft, sink_price=0.0):
+RESULTS_PAGE_SIZE = 25         # Slabs per page of the Step 3 results grid
+ALL_LOCATIONS = "All locations"  # Location selector entry for the combined view
+PDF_EXPORT_WORKERS = min(4, os.cpu_count() or 1)  # Processes used by "Download All Quotes"
+PDF_EXPORT_POOL_MIN_BATCH = 20 # Smaller exports render inline; one PDF takes only a few ms
+
+# Snapshot Controls
+LOCATION_INDEXES_KEPT = 8      # Search / serial / fit indexes kept per inventory version (one per location viewed)
+INVENTORY_REFRESH_SECONDS = float(os.environ.get("COUNTERPRO_REFRESH_SECONDS", 60))  # Background refresh interval
+INVENTORY_REFRESH_JITTER  = INVENTORY_REFRESH_SECONDS / 6  # ± seconds, so processes don't refresh in step
+SNAPSHOT_PATH = os.environ.get("COUNTERPRO_SNAPSHOT_PATH", os.path.join(".cache", "inventory.parquet"))
+
+# Quote History Controls
+QUOTE_HISTORY_PATH = os.environ.get("COUNTERPRO_HISTORY_PATH", os.path.join(".cache", "quotes.sqlite"))
+
+# Profiling Controls
+PROFILE_DEFAULT = os.environ.get("COUNTERPRO_PROFILE") == "1"  # Stage timings on for every session
+
+
+# --- 3. SHARED RESOURCES  (one per process, reused across reruns and sessions) ---
+@st.cache_resource
+def _variant_memo():
+    """Product Variant parse memo, shared across reruns and cache refills."""
+    return {}
+
+
+@st.cache_resource
+def _source_cache():
+    return SourceCache()
+
+
+@st.cache_resource(max_entries=INVENTORY_VERSIONS_KEPT)
+def get_location_partitions(version, _df):
     """
-    Revised pricing logic:
-    1. Calculate Raw Direct Cost (Material + Fab).
-    2. Calculate IB (Material marked up 5 %, enforcing 18 % floor on total).
-    3. Calculate Customer Material + Fab (Fixed 15 % higher than IB).
-    4. Add Sink Price to Customer Total.
+    Grouped views and price indexes per location (and combined) for one
+    inventory version, shared by every rerun and session. The frames are
+    reused as-is, so callers must not modify them in place.
     """
-    uc         = float(unit_cost)
-    sq_finished = float(project_sqft)
-    sq_with_waste = sq_finished * WASTE_FACTOR
-    sink_price = float(sink_price)
-
-    # 1. RAW DIRECT COSTS
-    raw_material_cost = uc * sq_with_waste
-    raw_fab_cost      = FABRICATION_COST_PER_SQFT * sq_finished
-    total_direct_cost = raw_material_cost + raw_fab_cost
-
-    # 2. INTERNAL BASE (IB) CALCULATION
-    # Candidate A: Material marked up by 5 % + raw fabrication
-    ib_candidate_markup = (raw_material_cost * IB_MATERIAL_MARKUP) + raw_fab_cost
-    # Candidate B: Enforce the 18 % margin floor on direct costs
-    ib_candidate_floor  = total_direct_cost / (1 - IB_MIN_MARGIN)
-    ib_cost = max(ib_candidate_markup, ib_candidate_floor)
-
-    # 3. CUSTOMER PRICING
-    customer_mat_fab_total = ib_cost * IB_TO_CUSTOMER_MARKUP
-    customer_ins_cost      = INSTALL_COST_PER_SQFT * sq_finished
-
-    slab_subtotal = customer_mat_fab_total + customer_ins_cost
-    subtotal      = slab_subtotal + sink_price
-
-    # Analytics
-    profit     = slab_subtotal - (total_direct_cost + (INSTALL_COST_PER_SQFT * sq_finished))
-    margin_pct = (profit / slab_subtotal * 100) if slab_subtotal > 0 else 0
+    _run.miss()
+    return LocationPartitions(_df)
+
+
+@st.cache_resource(max_entries=INVENTORY_VERSIONS_KEPT * LOCATION_INDEXES_KEPT)
+def get_search_index(version, location, _grouped_df):
+    """Search index for one location (None: all) of an inventory version, shared by every rerun and session."""
+    _run.miss()
+    return SearchIndex(_grouped_df)
+
+
+@st.cache_resource(max_entries=INVENTORY_VERSIONS_KEPT * LOCATION_INDEXES_KEPT)
+def get_serial_index(version, location, _df, _rows):
+    """Serial numbers per variant for one location (None: all) of an inventory version."""
+    _run.miss()
+    return SerialIndex(_df if _rows is None else _df.iloc[_rows])
+
+
+@st.cache_resource(max_entries=INVENTORY_VERSIONS_KEPT * LOCATION_INDEXES_KEPT)
+def get_fit_index(version, location, _df, _rows, _grouped_df):
+    """Serialized pieces per variant for one location (None: all) of an inventory version, for slab fitting."""
+    _run.miss()
+    return FitIndex(_df if _rows is None else _df.iloc[_rows], _grouped_df)
+
+
+@st.cache_resource
+def _price_matrices():
+    """Price matrices of every version and location, bounded by their total bytes."""
+    return PriceMatrixCache()
+
+
+def get_price_matrix(version, location, grouped_df):
+    """Slab subtotals over the sq ft grid for one location (None: all) of an inventory version."""
+    matrices = _price_matrices()
+    matrix   = matrices.get((version, location))
+    if matrix is None:
+        _run.miss()
+        matrix = PriceMatrix(grouped_df)
+        matrices.put((version, location), matrix)
+    return matrix
+
+
+@st.cache_resource(max_entries=INVENTORY_VERSIONS_KEPT)
+def get_inventory_memory(version, _df, _partitions):
+    """(raw rows, grouped views) bytes for one inventory version."""
+    grouped = frame_bytes(_partitions.combined.grouped_df)
+    if len(_partitions.locations) > 1:
+        grouped += sum(frame_bytes(_partitions.view(location).grouped_df) for location in _partitions.locations)
+    return frame_bytes(_df), grouped
 
+
+@st.cache_resource
+def _quote_pdf_cache():
+    return QuotePdfCache()
+
+
+@st.cache_resource
+def _pdf_render_pool():
+    """Worker processes for batch quote export, started once and kept warm."""
+    return make_render_pool(PDF_EXPORT_WORKERS)
+
+
+@st.cache_resource
+def _quote_history():
+    """Every generated quote and tray item, written in the background. None if the database can't be opened."""
+    try:
+        return QuoteHistory(QUOTE_HISTORY_PATH)
+    except (OSError, sqlite3.Error):
+        history_log.exception("Quote history disabled: could not open %s", QUOTE_HISTORY_PATH)
+        return None
+
+
+@st.cache_resource
+def _stage_profiler():
+    """Rolling stage timings for the process. Each profiled rerun also logs one JSON line."""
+    if not profile_log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        profile_log.addHandler(handler)
+        profile_log.setLevel(logging.INFO)
+    return StageProfiler()
+
+
+def _profiled(stage, fn):
+    """
+    Wrap a deferred callable (download button data) so each call is recorded
+    under `stage`, with a cache miss whenever it had to render a PDF.
+    """
+    def call():
+        pdf_cache = _quote_pdf_cache()
+        misses    = pdf_cache.get_stats()['misses']
+        start     = time.perf_counter()
+        result    = fn()
+        cache     = "miss" if pdf_cache.get_stats()['misses'] > misses else "hit"
+        _stage_profiler().record(stage, (time.perf_counter() - start) * 1000, cache=cache)
+        return result
+    return call
+
+
+def _history_quote(kind, item):
+    """Quote history record for a comparison-tray item; the item itself is kept so it can be re-opened."""
     return {
-        "customer_mat_fab": customer_mat_fab_total,
-        "customer_ins":     customer_ins_cost,
-        "sink_price":       sink_price,
-        "slab_subtotal":    slab_subtotal,
-        "subtotal":         subtotal,
-        "ib_cost":          ib_cost,
-        "margin_pct":       margin_pct,
-        "total_with_tax":   subtotal * (1 + TAX_RATE),
+        'kind':              kind,
+        'variant':           item['variant'],
+        'slab_name':         f"{item['brand']} {item['color']} {item['thickness']}",
+        'location':          item.get('location'),
+        'sqft':              item['sqft'],
+        'total':             item['price'],
+        'customer':          item.get('customer', ""),
+        'rep':               item.get('rep', ""),
+        'inventory_version': item.get('inventory_version'),
+        'item':              item,
     }
 
 
-# --- 5. PARSING HELPER (unchanged) ---
-def parse_product_variant(variant_str):
-    """Parse Product Variant to extract Brand, Color, and Thickness."""
+def _history_writes():
+    """
+    This session's {'queued', 'flushed'} history write counts. A plain dict,
+    so deferred callables that run outside a script run can still count.
+    """
+    if 'history_writes' not in st.session_state:
+        st.session_state.history_writes = {'queued': 0, 'flushed': 0}
+    return st.session_state.history_writes
+
+
+def _record_quotes(quotes, writes):
+    """Queue quote history records, counted in `writes`; returns at once, the writer thread commits them."""
+    history = _quote_history()
+    if history is not None:
+        for quote in quotes:
+            history.record(quote)
+        writes['queued'] += len(quotes)
+
+
+def _recorded(quotes, fn):
+    """Wrap a deferred callable (download button data) so each call also records `quotes` in the history."""
+    writes = _history_writes()
+    def call():
+        result = fn()
+        _record_quotes(quotes, writes)
+        return result
+    return call
+
+
+def export_quotes_zip(quotes):
+    """
+    Render every quote dict (slab_name, sqft, sinks, pricing) to its own PDF
+    and return them zipped. Batches of PDF_EXPORT_POOL_MIN_BATCH or more
+    render on the process pool; smaller ones inline.
+    """
+    executor  = _pdf_render_pool() if len(quotes) >= PDF_EXPORT_POOL_MIN_BATCH else None
+    pdfs      = _quote_pdf_cache().get_many(quotes, executor)
+    return zip_quotes(
+        (f"quote_{idx:02d}_{quote['slab_name'].replace(' ', '_')}.pdf", pdf_bytes)
+        for idx, (quote, pdf_bytes) in enumerate(zip(quotes, pdfs), 1)
+    )
+
+
+# --- 4. INVENTORY SNAPSHOT  (persisted to disk, refreshed in the background) ---
+def _persist_snapshot(df, report, fetched_at):
+    """Save a newly published version to disk. Returns a report entry if that fails."""
     try:
-        cleaned = re.sub(r'^\d+\s*-\s*', '', str(variant_str))
-
-        brand_match = re.match(r'^([A-Za-z\s&]+)', cleaned)
-        brand = brand_match.group(1).strip() if brand_match else "Unknown"
-
-        thickness_match = re.search(r'(\d+\.?\d*cm)', cleaned, re.IGNORECASE)
-        thickness = thickness_match.group(1) if thickness_match else ""
-
-        color_str = re.sub(r'\([^)]*\)', '', cleaned)
-        color_str = re.sub(r'#\S+', '', color_str)
-        color_str = re.sub(r'\d+\.?\d*cm', '', color_str, flags=re.IGNORECASE)
-        color_str = re.sub(r'\s+', ' ', color_str).strip()
-        if brand in color_str:
-            color_str = color_str.replace(brand, '').strip()
-        color = color_str if color_str else "Unknown"
-
-        return brand, color, thickness
-    except (ValueError, AttributeError, TypeError):
-        return "Unknown", str(variant_str), ""
-
-
-# --- 6. DATA FETCHING  (cached for 60 s) ---
-@st.cache_data(ttl=60)
-def fetch_data():
-    """Fetch inventory data from Google Sheets. Cached for 60 seconds."""
-    all_dfs = []
-    for url in DATA_SOURCES:
-        try:
-            df = pd.read_csv(url)
-            df.columns = df.columns.str.strip()
-            if 'Product Variant' in df.columns:
-                df['On Hand Qty'] = pd.to_numeric(
-                    df['On Hand Qty'].astype(str).str.replace(r'[$,]', '', regex=True),
-                    errors='coerce'
-                )
-                df['Serialized On Hand Cost'] = pd.to_numeric(
-                    df['Serialized On Hand Cost'].astype(str).str.replace(r'[$,]', '', regex=True),
-                    errors='coerce'
-                )
-                all_dfs.append(df)
-        except Exception as exc:
-            st.warning(f"⚠️ Failed to load data source: `{url}`\n\nError: {exc}")
+        save_snapshot(df, report, fetched_at, SNAPSHOT_PATH)
+    except (OSError, pa.ArrowException) as exc:
+        return {"source": SNAPSHOT_PATH, "status": "error", "rows": 0,
+                "latency_ms": None, "error": f"Snapshot not saved: {exc}"}
+    return None
 
-    if not all_dfs:
-        return None
 
-    df = pd.concat(all_dfs, ignore_index=True)
-    df = df[df['On Hand Qty'] > 0].copy()
-    df['Unit_Cost'] = df['Serialized On Hand Cost'] / df['On Hand Qty']
+@st.cache_resource
+def _inventory_refresher():
+    """
+    The process-wide inventory store and its background refresher. Starts
+    from the on-disk snapshot, if any, so a restart serves data immediately.
+    """
+    cache, memo = _source_cache(), _variant_memo()   # Resolved here: the refresh thread is not a script run
+    refresher = InventoryRefresher(
+        fetch=lambda: fetch_data(cache=cache, memo=memo),
+        interval=INVENTORY_REFRESH_SECONDS,
+        jitter=INVENTORY_REFRESH_JITTER,
+        persist=_persist_snapshot,
+    )
+    df, meta = load_snapshot(SNAPSHOT_PATH)
+    if df is not None:
+        refresher.load(df, meta.get("sources", []), meta.get("fetched_at"))
+    refresher.start()
+    return refresher
 
-    parsed      = df['Product Variant'].apply(parse_product_variant)
-    df['Brand']     = parsed.apply(lambda x: x[0])
-    df['Color']     = parsed.apply(lambda x: x[1])
-    df['Thickness'] = parsed.apply(lambda x: x[2])
 
-    return df
+def load_inventory():
+    """
+    Latest inventory snapshot (or None) and the report of the last refresh
+    attempt. The background refresher keeps the data current, so requests
+    only wait on a fetch when a process has no data at all yet, and then
+    share that one fetch.
+    """
+    refresher = _inventory_refresher()
+    latest = refresher.store.latest()
+    if latest is None:
+        _run.miss()
+        latest = refresher.refresh()
+    with refresher.lock:
+        return latest, refresher.report
 
 
-# --- 7. PDF GENERATION ---
-def _pdf_safe(text: str) -> str:
+def session_inventory(latest):
     """
-    Strip characters outside latin-1 (e.g. emoji, em-dashes) so fpdf2's
-    built-in Helvetica font doesn't raise FPDFUnicodeEncodingException.
-    Replace common typographic chars with ASCII equivalents first, then
-    silently drop anything that still can't encode.
+    The inventory version this session is pinned to. A session keeps the
+    version it started with until it switches to the latest one (or that
+    version is dropped from the store), so a background refresh never
+    changes the data under a sales rep mid-quote.
     """
-    replacements = {
-        "\u2014": "-",   # em dash  —
-        "\u2013": "-",   # en dash  –
-        "\u00d7": "x",   # multiplication sign ×  (already latin-1, but keep explicit)
-    }
-    for orig, repl in replacements.items():
-        text = text.replace(orig, repl)
-    # Drop everything outside latin-1 (emoji, etc.)
-    return text.encode("latin-1", errors="ignore").decode("latin-1")
-
-
-def generate_quote_pdf(slab_name, sqft, sinks, pricing):
-    """Generate a basic quote PDF using fpdf2. Returns bytes."""
-    pdf = FPDF()
-    pdf.add_page()
-
-    # Header
-    pdf.set_font("Helvetica", "B", 20)
-    pdf.set_fill_color(79, 70, 229)   # Indigo brand colour
-    pdf.set_text_color(255, 255, 255)
-    pdf.cell(0, 14, "CounterPro - Customer Quote", new_x="LMARGIN", new_y="NEXT", align="C", fill=True)
-    pdf.ln(4)
-
-    # Reset colours for body
-    pdf.set_text_color(30, 41, 59)
-
-    # Date
-    pdf.set_font("Helvetica", size=9)
-    pdf.set_text_color(100, 116, 139)
-    pdf.cell(0, 6, f"Generated: {datetime.now().strftime('%B %d, %Y  %H:%M')}", new_x="LMARGIN", new_y="NEXT")
-    pdf.ln(4)
-
-    # Section: Slab
-    pdf.set_font("Helvetica", "B", 11)
-    pdf.set_text_color(30, 41, 59)
-    pdf.cell(0, 8, "SLAB DETAILS", new_x="LMARGIN", new_y="NEXT")
-    pdf.set_draw_color(226, 232, 240)
-    pdf.line(pdf.get_x(), pdf.get_y(), pdf.get_x() + 180, pdf.get_y())
-    pdf.ln(2)
-
-    pdf.set_font("Helvetica", size=10)
-    pdf.cell(50, 7, "Material:", new_x="RIGHT", new_y="TOP")
-    pdf.set_font("Helvetica", "B", 10)
-    pdf.multi_cell(0, 7, _pdf_safe(slab_name))
-    pdf.set_font("Helvetica", size=10)
-    pdf.cell(50, 7, "Square Footage:", new_x="RIGHT", new_y="TOP")
-    pdf.set_font("Helvetica", "B", 10)
-    pdf.cell(0, 7, f"{sqft:.1f} sq ft", new_x="LMARGIN", new_y="NEXT")
-    pdf.ln(4)
-
-    # Section: Sinks
-    if sinks:
-        pdf.set_font("Helvetica", "B", 11)
-        pdf.set_text_color(30, 41, 59)
-        pdf.cell(0, 8, "SINKS", new_x="LMARGIN", new_y="NEXT")
-        pdf.line(pdf.get_x(), pdf.get_y(), pdf.get_x() + 180, pdf.get_y())
-        pdf.ln(2)
-        pdf.set_font("Helvetica", size=10)
-        for sink in sinks:
-            line_total = sink['price'] * sink['quantity']
-            # _pdf_safe strips emoji prefixes and replaces em/en dashes
-            sink_label = _pdf_safe(sink['type'])
-            pdf.cell(0, 6,
-                     f"  {sink_label}  x{sink['quantity']}  -  ${line_total:,.2f}",
-                     new_x="LMARGIN", new_y="NEXT")
-        pdf.ln(4)
-
-    # Section: Pricing summary
-    pdf.set_font("Helvetica", "B", 11)
-    pdf.set_text_color(30, 41, 59)
-    pdf.cell(0, 8, "PRICING SUMMARY", new_x="LMARGIN", new_y="NEXT")
-    pdf.line(pdf.get_x(), pdf.get_y(), pdf.get_x() + 180, pdf.get_y())
-    pdf.ln(2)
-
-    pdf.set_font("Helvetica", size=10)
-    rows = [
-        ("Material & Fabrication",  f"${pricing['customer_mat_fab']:,.2f}"),
-        ("Installation",             f"${pricing['customer_ins']:,.2f}"),
-        ("Sinks",                    f"${pricing['sink_price']:,.2f}"),
-        ("Subtotal",                 f"${pricing['subtotal']:,.2f}"),
-        ("GST (5%)",                 f"${pricing['subtotal'] * TAX_RATE:,.2f}"),
+    pinned = _inventory_refresher().store.get(st.session_state.get("inventory_version"))
+    if pinned is None:
+        pinned = latest
+        st.session_state.inventory_version = latest.version if latest is not None else None
+    return pinned
+
+
+def _format_age(seconds):
+    """Human-readable age such as '45 s', '12 min' or '3 h'."""
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+# --- 5. UI CALLBACKS & FRAGMENTS ---
+# Buttons change session state in on_click callbacks, before the rerun they
+# trigger, so nothing has to call st.rerun() a second time. The comparison
+# tray and quote history are fragments: their own widgets re-run just the
+# fragment, not the groupby, filters and pricing above them. The sink editor
+# is one too, but only picking a model stays inside it; adding or changing a
+# sink changes every price, so it re-runs the page.
+def _timed_fragment(name):
+    """`st.fragment` that records each of its runs as stage "fragment:<name>" while stage timings are on."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            if not st.session_state.get("profile_stages", PROFILE_DEFAULT):
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _stage_profiler().record(f"fragment:{name}", (time.perf_counter() - start) * 1000)
+        return st.fragment(timed)
+    return decorate
+
+
+def _sink_total():
+    return sum(s['price'] * s['quantity'] for s in st.session_state.selected_sinks)
+
+
+def _sink_key():
+    """The selected sinks as a comparable tuple of (type, price, quantity)."""
+    return tuple((s['type'], s['price'], s['quantity']) for s in st.session_state.selected_sinks)
+
+
+def _add_sink():
+    sink_type = st.session_state.sink_selector
+    st.session_state.selected_sinks.append({
+        'type':     sink_type,
+        'price':    SINK_OPTIONS[sink_type],
+        'quantity': 1,
+    })
+
+
+def _change_sink_quantity(idx, delta):
+    """Change a sink's quantity by `delta`, removing the sink when it would drop below one."""
+    sinks = st.session_state.selected_sinks
+    if sinks[idx]['quantity'] + delta >= 1:
+        sinks[idx]['quantity'] += delta
+    else:
+        sinks.pop(idx)
+
+
+def _add_to_tray(item):
+    st.session_state.comparison_tray.append(item)
+    _record_quotes([_history_quote("tray", item)], _history_writes())
+
+
+def _remove_from_tray(idx):
+    st.session_state.comparison_tray.pop(idx)
+
+
+def _clear_tray():
+    st.session_state.comparison_tray = []
+
+
+def _refresh_inventory():
+    _inventory_refresher().refresh()            # Joins a refresh already in progress
+    st.session_state.inventory_version = None   # Move this session onto the new data
+
+
+def _switch_inventory(version):
+    st.session_state.inventory_version = version
+
+
+def _reopen_quote(quote_id, partitions, version):
+    """
+    Put a past quote back in the tray, at the price it was quoted at, and
+    restore its job on the page: sq ft, sinks, customer, location and slab.
+    """
+    quote = _quote_history().get(quote_id)
+    if quote is None:
+        return
+    item = quote['item']
+    st.session_state.comparison_tray.append(item)
+    st.session_state.sqft_input     = float(item['sqft'])
+    st.session_state.selected_sinks = [dict(sink) for sink in item['sinks']]
+    st.session_state.customer_name  = quote['customer']
+
+    # The slab is picked again only if its location is still in this inventory
+    location = item.get('location')
+    if location is None or location in partitions.locations:
+        if len(partitions.locations) > 1:
+            st.session_state.location = location or ALL_LOCATIONS
+        variants = partitions.view(location).grouped_df['Product Variant'].to_numpy()
+        rows     = np.flatnonzero(variants == item['variant'])
+        if len(rows):
+            st.session_state.selected_slab = (version, location, int(rows[0]))
+    st.session_state.quote_reopened = True
+
+
+def _select_slab(grid_key, view_key, page_rows):
+    """Remember the grid row just picked as (inventory version, location, row position in grouped_df)."""
+    picked = st.session_state[grid_key].selection.rows
+    if picked:
+        st.session_state.selected_slab = (*view_key, int(page_rows[picked[0]]))
+
+
+@_timed_fragment("sinks")
+def sink_editor():
+    """Sink picker and quantity controls; the page re-runs only when the sink list changes."""
+    st.markdown('<span class="card-sub">🚰 Sinks</span>', unsafe_allow_html=True)
+    col_dropdown, col_add = st.columns([4, 1])
+    with col_dropdown:
+        st.selectbox(
+            "Sink Model",
+            options=list(SINK_OPTIONS.keys()),
+            help="Choose a sink to add to the quote",
+            key="sink_selector",
+            label_visibility="collapsed",
+        )
+    with col_add:
+        st.button("➕ Add Sink", use_container_width=True, on_click=_add_sink)
+
+    # Display selected sinks with quantity controls
+    if st.session_state.selected_sinks:
+        for idx, sink in enumerate(st.session_state.selected_sinks):
+            col1, col2, col3, col4 = st.columns([4, 1, 1, 1])
+            with col1:
+                line_total = sink['price'] * sink['quantity']
+                label = sink['type'].split('-')[0].strip() or sink['type']
+                st.markdown(
+                    f'<div class="sink-row">{label}<br>'
+                    f'<small style="color:#64748b">${sink["price"]:,.0f} ea · ${line_total:,.2f} total</small></div>',
+                    unsafe_allow_html=True,
+                )
+            with col2:
+                st.button("➖", key=f"minus_sink_{idx}", use_container_width=True,
+                          on_click=_change_sink_quantity, args=(idx, -1))
+            with col3:
+                st.markdown(f"<div style='text-align:center;padding-top:8px;font-weight:700'>{sink['quantity']}</div>", unsafe_allow_html=True)
+            with col4:
+                st.button("➕", key=f"plus_sink_{idx}", use_container_width=True,
+                          on_click=_change_sink_quantity, args=(idx, 1))
+    else:
+        st.markdown('<div class="empty-state">No sinks added — select a model above and click ➕ Add Sink</div>', unsafe_allow_html=True)
+
+    total_sink_price = _sink_total()
+    if total_sink_price > 0:
+        st.markdown(f"**Sink subtotal: ${total_sink_price:,.2f}**")
+
+    # Prices, the quote PDF and the tray item all carry the sinks, so any change re-runs the page
+    if _sink_key() != st.session_state.get("priced_sinks"):
+        st.rerun()
+
+
+def results_card(slab_data, slab_label, sqft, pricing, serial_numbers, fit, price_curve, quote_item):
+    """Inventory context, customer price and quote download for the selected slab (`quote_item` is its tray entry)."""
+    c1, c2 = st.columns([1, 1])
+
+    with c1:
+        with st.container(border=True):
+            st.markdown('<span class="card-title">Inventory Context</span>', unsafe_allow_html=True)
+
+            # Display all serial numbers for this variant
+            if serial_numbers:
+                st.markdown("**Serial Numbers:**")
+                for serial in serial_numbers:
+                    st.write(f"• {serial}")
+
+            # The slabs this job would be cut from, with the least material left over
+            if fit is not None:
+                st.markdown(f"**Slabs to Pull ({len(fit.rows)}):**")
+                for label, qty in zip(fit.labels, fit.qty):
+                    st.write(f"• {label or 'Unlabelled slab'} · {qty:.1f} sf")
+                st.caption(f"{fit.total:.1f} sf pulled · {fit.leftover:.1f} sf left over"
+                           + ("" if fit.exact else " · best found within the search limit"))
+
+            st.metric("Available Qty", f"{slab_data['On Hand Qty']:.1f} sf")
+
+            search_query = (
+                f"{slab_data['Brand']} {slab_data['Color']} countertop installed"
+            ).replace(" ", "+")
+            st.link_button(
+                "🖼️ View Installed Photos",
+                f"https://www.google.com/search?tbm=isch&q={search_query}",
+                use_container_width=True,
+            )
+
+    with c2:
+        st.markdown(f"""
+        <div class="large-price">
+            <p>CUSTOMER TOTAL</p>
+            <h1>${pricing['total_with_tax']:,.2f}</h1>
+            <p>Incl. 5% GST</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+        with st.expander("💰 Cost Breakdown"):
+            margin_pct = pricing['margin_pct']
+            margin_class = "good-margin" if margin_pct >= 18 else "low-margin"
+            margin_label = "✅ Healthy" if margin_pct >= 18 else "⚠️ Low"
+            st.markdown(
+                f'Margin: <span class="{margin_class}">{margin_pct:.1f}% — {margin_label}</span>',
+                unsafe_allow_html=True,
+            )
+            st.divider()
+            col_a, col_b = st.columns(2)
+            with col_a:
+                st.metric("Internal Cost (IB)", f"${pricing['ib_cost']:,.2f}")
+            with col_b:
+                st.metric("Mat & Fab (Customer)", f"${pricing['customer_mat_fab']:,.2f}")
+            st.write(f"Installation: **${pricing['customer_ins']:,.2f}**")
+            if pricing['sink_price'] > 0:
+                st.write("**Sinks:**")
+                for sink in st.session_state.selected_sinks:
+                    st.write(
+                        f"  • {sink['type']}: ${sink['price']:,.2f}"
+                        f" × {sink['quantity']} = **${sink['price'] * sink['quantity']:,.2f}**"
+                    )
+                st.write(f"Sink total: **${pricing['sink_price']:,.2f}**")
+            st.write(f"Subtotal (excl. tax): **${pricing['subtotal']:,.2f}**")
+            st.write(f"GST (5%): **${pricing['subtotal'] * TAX_RATE:,.2f}**")
+
+        with st.expander("📈 Price vs. Sq Ft"):
+            grid_sqft, grid_totals = price_curve
+            st.line_chart(
+                pd.DataFrame({"Customer Total": grid_totals}, index=pd.Index(grid_sqft, name="Finished Sq Ft")),
+                y_label="Customer Total ($)",
+            )
+            st.caption(f"With the current sinks. This job: {sqft:,.0f} sf at ${pricing['total_with_tax']:,.2f}.")
+
+        # ── Download Quote as PDF (rendered only when clicked) ─────────────
+        quote_pdf = functools.partial(
+            _quote_pdf_cache().get,
+            slab_name=slab_label,
+            sqft=sqft,
+            sinks=[dict(s) for s in st.session_state.selected_sinks],
+            pricing=pricing,
+        )
+        quote_pdf = _recorded([_history_quote("pdf", quote_item)], quote_pdf)
+        if profiling:
+            quote_pdf = _profiled("quote_pdf", quote_pdf)
+        st.download_button(
+            label="📄 Download Quote as PDF",
+            data=quote_pdf,
+            file_name=f"quote_{slab_label.replace(' ', '_')}.pdf",
+            mime="application/pdf",
+            on_click="ignore",
+            use_container_width=True,
+        )
+
+
+@_timed_fragment("tray")
+def comparison_tray():
+    """Saved slabs side by side, with CSV and quote ZIP exports."""
+    if not st.session_state.comparison_tray:
+        return
+
+    st.markdown("---")
+    st.markdown("### 🔍 Comparison Tray")
+
+    col_clear, col_spacer = st.columns([1, 5])
+    with col_clear:
+        st.button("🗑️ Clear All", use_container_width=True, on_click=_clear_tray)
+
+    # Display comparison items in columns (up to MAX_COMPARISON_COLS per row)
+    num_items = len(st.session_state.comparison_tray)
+    cols = st.columns(min(num_items, MAX_COMPARISON_COLS))
+
+    for idx, item in enumerate(st.session_state.comparison_tray):
+        with cols[idx % MAX_COMPARISON_COLS]:
+            with st.container(border=True):
+                st.markdown(f"**{item['brand']} {item['color']}**")
+                st.write(f"{item['thickness']} • {item['sqft']:.0f} sf")
+                if item.get('location'):
+                    st.caption(f"📍 {item['location']}")
+
+                if item.get('sinks'):
+                    st.write("**Sinks:**")
+                    for sink in item['sinks']:
+                        label = sink['type'].split('-')[0].strip() or sink['type']
+                        st.write(f"• {label}: {sink['quantity']}x")
+
+                st.markdown(f"### ${item['price']:,.2f}")
+
+                search_query = (
+                    f"{item['brand']} {item['color']} countertop installed"
+                ).replace(" ", "+")
+                st.link_button(
+                    "🖼️ View Photos",
+                    f"https://www.google.com/search?tbm=isch&q={search_query}",
+                    use_container_width=True,
+                )
+
+                st.button("Remove", key=f"remove_{idx}", use_container_width=True,
+                          on_click=_remove_from_tray, args=(idx,))
+
+    # ── Export Comparison Tray as CSV ──────────────────────────────────────
+    tray_rows = []
+    for item in st.session_state.comparison_tray:
+        sink_summary = "; ".join(
+            f"{s['type']} ×{s['quantity']}" for s in item.get('sinks', [])
+        ) or "None"
+        tray_rows.append({
+            "Brand":      item['brand'],
+            "Color":      item['color'],
+            "Thickness":  item['thickness'],
+            "Location":   item.get('location') or ALL_LOCATIONS,
+            "Sq Ft":      item['sqft'],
+            "Sinks":      sink_summary,
+            "Subtotal":   item.get('subtotal', ""),
+            "Total (incl. GST)": item['price'],
+        })
+
+    tray_csv = pd.DataFrame(tray_rows).to_csv(index=False).encode("utf-8")
+    st.download_button(
+        label="📥 Export Comparison as CSV",
+        data=tray_csv,
+        file_name="comparison_tray.csv",
+        mime="text/csv",
+        on_click="ignore",
+        use_container_width=True,
+    )
+
+    # ── Export every tray item as its own quote PDF (zipped) ───────────────
+    tray_quotes = [
+        {
+            'slab_name': f"{item['brand']} {item['color']} {item['thickness']}",
+            'sqft':      item['sqft'],
+            'sinks':     item['sinks'],
+            'pricing':   item['pricing'],
+        }
+        for item in st.session_state.comparison_tray
     ]
-    col_w = 90
-    for label, value in rows:
-        pdf.cell(col_w, 7, label, new_x="RIGHT", new_y="TOP")
-        pdf.cell(0, 7, value, new_x="LMARGIN", new_y="NEXT", align="R")
-
-    # Total — highlighted row
-    pdf.ln(2)
-    pdf.set_fill_color(79, 70, 229)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Helvetica", "B", 12)
-    pdf.cell(col_w, 9, "TOTAL (incl. GST)", fill=True, new_x="RIGHT", new_y="TOP")
-    pdf.cell(0,    9, f"${pricing['total_with_tax']:,.2f}", fill=True,
-             align="R", new_x="LMARGIN", new_y="NEXT")
-
-    # Footer
-    pdf.ln(10)
-    pdf.set_text_color(148, 163, 184)
-    pdf.set_font("Helvetica", "I", 8)
-    pdf.cell(0, 5, f"This quote is valid for {QUOTE_VALIDITY_DAYS} days. Prices exclude installation site preparation.",
-             new_x="LMARGIN", new_y="NEXT", align="C")
-
-    return bytes(pdf.output())
+    export_zip = functools.partial(export_quotes_zip, tray_quotes)
+    export_zip = _recorded([_history_quote("pdf", item) for item in st.session_state.comparison_tray], export_zip)
+    if profiling:
+        export_zip = _profiled("quotes_zip", export_zip)
+    st.download_button(
+        label="📦 Download All Quotes (ZIP)",
+        data=export_zip,
+        file_name="comparison_quotes.zip",
+        mime="application/zip",
+        on_click="ignore",
+        use_container_width=True,
+    )
+
+
+@_timed_fragment("history")
+def quote_history_panel(partitions, version, selected_variant):
+    """Search past quotes and tray items by customer, rep, date or slab, and re-open one."""
+    # A re-opened quote changes the job, so the whole page has to pick it up
+    if st.session_state.pop("quote_reopened", False):
+        st.rerun()
+
+    st.markdown("---")
+    with st.expander("🗂️ Quote History"):
+        history = _quote_history()
+        if history is None:
+            st.caption("Quote history is unavailable: its database could not be opened.")
+            return
+
+        col_text, col_dates, col_slab = st.columns([2, 2, 1])
+        with col_text:
+            text = st.text_input("Customer or rep", key="history_text", placeholder="Name starts with…")
+        with col_dates:
+            dates = st.date_input("Quoted between", value=(), key="history_dates")
+        with col_slab:
+            this_slab = st.toggle("Selected slab only", key="history_this_slab",
+                                  disabled=selected_variant is None)
+
+        since = until = None
+        if dates:
+            since = datetime.datetime.combine(dates[0], datetime.time.min).timestamp()
+            until = datetime.datetime.combine(dates[-1] + datetime.timedelta(days=1), datetime.time.min).timestamp()
+        # Include quotes this session recorded moments ago; other reruns read without waiting
+        writes = _history_writes()
+        queued = writes['queued']
+        if queued > writes['flushed'] and history.flush(timeout=1.0):
+            writes['flushed'] = queued
+        quotes = history.search(
+            text, variant=selected_variant if this_slab and selected_variant else None, since=since, until=until,
+        )
+        if not quotes:
+            st.caption("No saved quotes match.")
+            return
+
+        grid_key = f"history_grid_{hash(tuple(quote['id'] for quote in quotes))}"
+        event = st.dataframe(
+            pd.DataFrame({
+                "Quoted":   pd.to_datetime([quote['created_at'] for quote in quotes], unit="s", utc=True)
+                              .tz_convert(datetime.datetime.now().astimezone().tzinfo),
+                "Customer": [quote['customer'] for quote in quotes],
+                "Rep":      [quote['rep'] for quote in quotes],
+                "Slab":     [quote['slab_name'] for quote in quotes],
+                "Location": [quote['location'] or ALL_LOCATIONS for quote in quotes],
+                "Sq Ft":    [quote['sqft'] for quote in quotes],
+                "Total":    [quote['total'] for quote in quotes],
+                "Saved As": ["PDF" if quote['kind'] == "pdf" else "Tray" for quote in quotes],
+            }),
+            key=grid_key,
+            on_select="rerun",
+            selection_mode="single-row",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Quoted": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm"),
+                "Sq Ft":  st.column_config.NumberColumn(format="%.0f"),
+                "Total":  st.column_config.NumberColumn(format="dollar"),
+            },
+        )
+        picked = event.selection.rows
+        st.button(
+            "↩️ Re-open Quote",
+            disabled=not picked,
+            use_container_width=True,
+            on_click=_reopen_quote,
+            args=(quotes[picked[0]]['id'] if picked else None, partitions, version),
+            help="Restore this job on the page and add the quote, at its saved price, to the comparison tray",
+        )
+        st.caption(f"Newest {len(quotes)} matching quotes.")
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # UI EXECUTION
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# ── Stage profiler (opt-in from the sidebar) ───────────────────────────────────
+profiling = st.session_state.get("profile_stages", PROFILE_DEFAULT)
+_run = _stage_profiler().run() if profiling else NULL_RUN
+
 # ── Sidebar: manual cache refresh ──────────────────────────────────────────────
 with st.sidebar:
     st.markdown("### ⚙️ Data Controls")
-    if st.button("🔄 Refresh Inventory", use_container_width=True, type="primary"):
-        st.cache_data.clear()
-        st.rerun()
-    st.caption("Inventory data is cached for 60 seconds. Click above to force an immediate refresh.")
+    st.button("🔄 Refresh Inventory", use_container_width=True, type="primary", on_click=_refresh_inventory)
+    st.caption(
+        f"Inventory is refreshed in the background about every {INVENTORY_REFRESH_SECONDS:.0f} seconds. "
+        f"Click above to force an immediate refresh."
+    )
+    st.toggle("⏱️ Stage timings", value=PROFILE_DEFAULT, key="profile_stages",
+              help="Time each step of the page and show rolling p50 / p95 below")
 
 # ── Header ─────────────────────────────────────────────────────────────────────
 col_logo, col_title = st.columns([1, 4])
@@ -459,107 +903,127 @@ if 'comparison_tray' not in st.session_state:
     st.session_state.comparison_tray = []
 if 'selected_sinks' not in st.session_state:
     st.session_state.selected_sinks = []
+if 'sqft_input' not in st.session_state:
+    st.session_state.sqft_input = DEFAULT_JOB_SQFT   # Set here, not as the widget default, so a re-opened quote can change it
 
 # ── Fetch Data ─────────────────────────────────────────────────────────────────
-df = fetch_data()
+with _run.stage("load_inventory", cached=True) as stage:
+    latest_inventory, source_report = load_inventory()
+    inventory = session_inventory(latest_inventory)
+    df, fetched_at, inventory_ver = (
+        (inventory.df, inventory.fetched_at, inventory.version) if inventory is not None else (None, None, None)
+    )
+    stage["rows"] = None if df is None else len(df)
+
+with st.sidebar:
+    st.markdown("#### 📡 Data Sources")
+    if fetched_at is not None:
+        st.caption(f"🕒 Snapshot age: {_format_age(time.time() - fetched_at)}")
+    if inventory is not None and latest_inventory.version != inventory_ver:
+        st.info("🆕 Newer inventory is available. This page keeps the data it started with until you switch.")
+        st.button("⤴️ Switch to Latest Inventory", use_container_width=True,
+                  on_click=_switch_inventory, args=(latest_inventory.version,))
+    for idx, entry in enumerate(source_report, 1):
+        latency = f" · {entry['latency_ms']:,.0f} ms" if entry['latency_ms'] is not None else ""
+        if entry['status'] == "ok":
+            outcome = f" · {entry['cache']}" if entry.get('cache') else ""
+            st.caption(f"✅ Sheet {idx} · {entry['rows']:,} rows{latency}{outcome}")
+        else:
+            st.caption(f"⚠️ Sheet {idx} · {entry['status']}{latency} — {entry['error']}")
+    refresh_stats = _source_cache().get_stats()
+    st.caption(
+        f"♻️ Refresh cache: {refresh_stats['hits']} hits · {refresh_stats['misses']} misses · "
+        f"{refresh_stats['bytes_saved'] / 1024:,.0f} KB saved"
+    )
+    refresher = _inventory_refresher()
+    st.caption(
+        f"🔁 Refresher: {refresher.stats['fetches']} fetches · "
+        f"{refresher.stats['collapsed']} duplicate requests joined"
+        + (" · refreshing now…" if refresher.refreshing else "")
+    )
+    pdf_stats = _quote_pdf_cache().get_stats()
+    if pdf_stats['hit_rate'] is not None:
+        st.caption(
+            f"📄 Quote PDFs: {pdf_stats['misses']} rendered · {pdf_stats['hit_rate']:.0%} cache hits · "
+            f"{pdf_stats['avg_render_ms']:,.0f} ms avg render"
+        )
+
+for entry in source_report:
+    if entry['status'] in ("error", "timeout"):
+        st.warning(f"⚠️ Failed to load data source: `{entry['source']}`\n\nError: {entry['error']}")
 
 if df is not None:
-    # Group by Product Variant and calculate totals
-    grouped_df = df.groupby('Product Variant').agg({
-        'On Hand Qty':              'sum',
-        'Serialized On Hand Cost':  'sum',
-        'Brand':                    'first',
-        'Color':                    'first',
-        'Thickness':                'first',
-    }).reset_index()
-    grouped_df['Unit_Cost'] = grouped_df['Serialized On Hand Cost'] / grouped_df['On Hand Qty']
+    # Per-location variant totals and price indexes, built once per inventory version
+    with _run.stage("partitions", cached=True) as stage:
+        partitions = get_location_partitions(inventory_ver, df)
+        stage["rows"] = len(partitions.combined.grouped_df)
 
     # ── Configure Project (sqft + sinks in one card) ───────────────────────────
     with st.container(border=True):
         st.markdown('<span class="card-title"><span class="step-badge">1</span> Configure Project</span>', unsafe_allow_html=True)
 
+        # Who the quote is for; saved with every quote in the history
+        col_customer, col_rep = st.columns(2)
+        with col_customer:
+            customer_name = st.text_input("👤 Customer", key="customer_name", placeholder="Name or company")
+        with col_rep:
+            rep_name = st.text_input("🧑‍💼 Sales Rep", key="rep_name", placeholder="Who is quoting")
+
         # Square footage row
         col_sqft, col_waste = st.columns([2, 1])
         with col_sqft:
-            sqft = st.number_input("Finished Sq Ft", 1.0, 500.0, 35.0, step=1.0, key="sqft_input")
+            sqft = st.number_input("Finished Sq Ft", 1.0, 500.0, step=1.0, key="sqft_input")
         with col_waste:
             st.metric(
                 "Material Needed",
                 f"{sqft * WASTE_FACTOR:.1f} sf",
-                help=f"Includes {int((WASTE_FACTOR - 1) * 100)}% waste factor",
+                help=f"Includes {int((WASTE_FACTOR - 1) * 100)}% waste factor. "
+                     + (f"Slabs are listed only if at most {FIT_MAX_PIECES} of their serialized pieces cover it."
+                        if FIT_MAX_PIECES else "Slabs are listed if their stock covers it in total."),
             )
 
         st.divider()
 
-        # Sink sub-section
-        st.markdown('<span class="card-sub">🚰 Sinks</span>', unsafe_allow_html=True)
-        col_dropdown, col_add = st.columns([4, 1])
-        with col_dropdown:
-            sink_to_add = st.selectbox(
-                "Sink Model",
-                options=list(SINK_OPTIONS.keys()),
-                help="Choose a sink to add to the quote",
-                key="sink_selector",
-                label_visibility="collapsed",
-            )
-        with col_add:
-            if st.button("➕ Add Sink", use_container_width=True):
-                st.session_state.selected_sinks.append({
-                    'type':     sink_to_add,
-                    'price':    SINK_OPTIONS[sink_to_add],
-                    'quantity': 1,
-                })
-                st.rerun()
-
-        # Display selected sinks with quantity controls
-        if st.session_state.selected_sinks:
-            for idx, sink in enumerate(st.session_state.selected_sinks):
-                col1, col2, col3, col4 = st.columns([4, 1, 1, 1])
-                with col1:
-                    line_total = sink['price'] * sink['quantity']
-                    label = sink['type'].split('-')[0].strip() or sink['type']
-                    st.markdown(
-                        f'<div class="sink-row">{label}<br>'
-                        f'<small style="color:#64748b">${sink["price"]:,.0f} ea · ${line_total:,.2f} total</small></div>',
-                        unsafe_allow_html=True,
-                    )
-                with col2:
-                    if st.button("➖", key=f"minus_sink_{idx}", use_container_width=True):
-                        if sink['quantity'] > 1:
-                            st.session_state.selected_sinks[idx]['quantity'] -= 1
-                        else:
-                            st.session_state.selected_sinks.pop(idx)
-                        st.rerun()
-                with col3:
-                    st.markdown(f"<div style='text-align:center;padding-top:8px;font-weight:700'>{sink['quantity']}</div>", unsafe_allow_html=True)
-                with col4:
-                    if st.button("➕", key=f"plus_sink_{idx}", use_container_width=True):
-                        st.session_state.selected_sinks[idx]['quantity'] += 1
-                        st.rerun()
-        else:
-            st.markdown('<div class="empty-state">No sinks added — select a model above and click ➕ Add Sink</div>', unsafe_allow_html=True)
-
-        total_sink_price = sum(
-            s['price'] * s['quantity'] for s in st.session_state.selected_sinks
-        )
-        if total_sink_price > 0:
-            st.markdown(f"**Sink subtotal: ${total_sink_price:,.2f}**")
+        st.session_state.priced_sinks = _sink_key()   # What this run prices; sink_editor re-runs the page on a change
+        sink_editor()
+        total_sink_price = _sink_total()
 
     # ── Filters ────────────────────────────────────────────────────────────────
     with st.container(border=True):
         st.markdown('<span class="card-title"><span class="step-badge">2</span> Browse & Filter</span>', unsafe_allow_html=True)
 
-        # Compute dynamic price range based on slabs that have sufficient stock
-        temp_filtered = grouped_df[
-            grouped_df['On Hand Qty'] >= (sqft * WASTE_FACTOR)
-        ].copy()
-
-        if len(temp_filtered) > 0:
-            temp_filtered['_calc_price'] = temp_filtered['Unit_Cost'].apply(
-                lambda uc: calculate_cost(uc, sqft, total_sink_price)['total_with_tax']
+        # Everything below reads only the chosen location's partition
+        location = None
+        if len(partitions.locations) > 1:
+            location_choice = st.selectbox(
+                "📍 Location",
+                options=[ALL_LOCATIONS, *partitions.locations],
+                key="location",
+                help="Show only the slabs held at one yard or store",
             )
-            min_price = (int(temp_filtered['_calc_price'].min()) // 100) * 100
-            max_price = ((int(temp_filtered['_calc_price'].max()) // 100) + 1) * 100
+            location = None if location_choice == ALL_LOCATIONS else location_choice
+        view       = partitions.view(location)
+        grouped_df = view.grouped_df
+        view_key   = (inventory_ver, location)
+
+        # Slab subtotals at every grid sq ft; prices in the grid and chart are lookups into it
+        with _run.stage("price_matrix", cached=True):
+            price_matrix = get_price_matrix(inventory_ver, location, grouped_df)
+
+        # Slabs the job can be cut from: at most FIT_MAX_PIECES serialized pieces cover it
+        with _run.stage("fit", cached=True):
+            fit_index = get_fit_index(inventory_ver, location, df, view.rows, grouped_df)
+            fits      = fit_index.reach(sqft * WASTE_FACTOR)
+
+        # Compute dynamic price range based on the slabs the job can be cut from
+        with _run.stage("price_bounds") as stage:
+            price_index  = view.price_index
+            price_bounds = price_index.price_bounds(fits, sqft, total_sink_price)
+            stage["rows"] = len(grouped_df)
+
+        if price_bounds is not None:
+            min_price = (int(price_bounds[0]) // 100) * 100
+            max_price = ((int(price_bounds[1]) // 100) + 1) * 100
         else:
             min_price, max_price = 500, 10000
 
@@ -608,53 +1072,63 @@ if df is not None:
                     "Price (Low to High)",
                     "Price (High to Low)",
                     "Available Size (Largest First)",
+                    "Best Fit (Least Leftover)",
                 ],
                 help="Order the material list",
             )
 
     # ── Apply Filters ──────────────────────────────────────────────────────────
-    filtered_df = grouped_df.copy()
-
-    # 1. Sufficient stock
-    filtered_df = filtered_df[filtered_df['On Hand Qty'] >= sqft * WASTE_FACTOR]
-
-    # 2. Brand — empty selection means "show all"
-    if selected_brands:
-        filtered_df = filtered_df[filtered_df['Brand'].isin(selected_brands)]
-
-    # 3. Thickness
-    if selected_thickness:
-        filtered_df = filtered_df[filtered_df['Thickness'].isin(selected_thickness)]
-
-    # 4. Color search — escape user input to prevent regex injection
-    if search_term:
-        safe_term = re.escape(search_term)
-        filtered_df = filtered_df[
-            filtered_df['Color'].str.contains(safe_term, case=False, na=False)
-            | filtered_df['Brand'].str.contains(safe_term, case=False, na=False)
-            | filtered_df['Product Variant'].str.contains(safe_term, case=False, na=False)
-        ]
-
-    # 5. Compute price once — reused for both budget filtering and sorting
-    filtered_df = filtered_df.copy()
-    filtered_df['_price'] = filtered_df['Unit_Cost'].apply(
-        lambda uc: calculate_cost(uc, sqft, total_sink_price)['total_with_tax']
-    )
-    filtered_df = filtered_df[
-        (filtered_df['_price'] >= budget_min)
-        & (filtered_df['_price'] <= budget_max)
-    ]
-
-    if sort_by in ("Price (Low to High)", "Price (High to Low)"):
-        ascending = sort_by == "Price (Low to High)"
-        filtered_df = filtered_df.sort_values('_price', ascending=ascending)
-    elif sort_by == "Available Size (Largest First)":
-        filtered_df = filtered_df.sort_values('On Hand Qty', ascending=False)
-
-    filtered_df = filtered_df.drop(columns=['_price'])
+    # Each step narrows one boolean mask over grouped_df; rows are only taken once, at the end
+    with _run.stage("filter") as stage:
+        # 1. Sufficient stock — in at most FIT_MAX_PIECES serialized slabs, not just in total (unless it is None)
+        passed_filters = fits.copy()
+
+        # 2. Brand — empty selection means "show all"
+        if selected_brands:
+            passed_filters &= grouped_df['Brand'].isin(selected_brands).to_numpy()
+
+        # 3. Thickness
+        if selected_thickness:
+            passed_filters &= grouped_df['Thickness'].isin(selected_thickness).to_numpy()
+
+        # 4. Color search — token index lookup, same matches as a substring scan
+        if search_term:
+            with _run.stage("search", cached=True) as search_stage:
+                search_rows = get_search_index(inventory_ver, location, grouped_df).search(search_term)
+                search_stage["rows"] = len(search_rows)
+            search_hits = np.zeros(len(grouped_df), dtype=bool)
+            search_hits[search_rows] = True
+            passed_filters &= search_hits
+
+        # 5. Budget — binary search on the unit-cost index; rows come back in price order
+        budget_rows = price_index.budget_rows(budget_min, budget_max, sqft, total_sink_price)
+        budget_rows = budget_rows[passed_filters[budget_rows]]
+
+        # Sorting reorders row positions; no rows are taken until the visible page
+        if sort_by == "Price (High to Low)":
+            budget_rows = budget_rows[::-1]
+        elif sort_by == "Available Size (Largest First)":
+            on_hand = grouped_df['On Hand Qty'].to_numpy()
+            budget_rows = budget_rows[np.argsort(-on_hand[budget_rows], kind="stable")]
+        elif sort_by == "Best Fit (Least Leftover)":
+            with _run.stage("best_fit") as fit_stage:
+                leftover = fit_index.leftovers(budget_rows, sqft * WASTE_FACTOR)
+                fit_stage["rows"] = len(budget_rows)
+            budget_rows = budget_rows[np.argsort(leftover, kind="stable")]
+        result_rows = budget_rows
+        stage["rows"] = len(result_rows)
+
+    # Snapshot memory is shared by every session; the result rows and masks are per rerun
+    snapshot_bytes, grouped_bytes = get_inventory_memory(inventory_ver, df, partitions)
+    rerun_bytes = result_rows.nbytes + passed_filters.nbytes
+    with st.sidebar:
+        st.caption(
+            f"🧠 Memory: {snapshot_bytes / 2**20:,.1f} MB snapshot · {grouped_bytes / 2**20:,.1f} MB grouped · "
+            f"{rerun_bytes / 1024:,.0f} KB this view"
+        )
 
     # ── Slab Selection ─────────────────────────────────────────────────────────
-    mat_count = len(filtered_df)
+    mat_count = len(result_rows)
     if mat_count > 0:
         badge = f'<span class="count-badge">{mat_count} available</span>'
     else:
@@ -666,16 +1140,51 @@ if df is not None:
             unsafe_allow_html=True,
         )
 
-        filtered_df['display_name'] = filtered_df.apply(
-            lambda row: f"{row['Brand']} {row['Color']} {row['Thickness']} ({row['On Hand Qty']:.1f} sf)",
-            axis=1,
-        )
-        display_to_variant = dict(zip(filtered_df['display_name'], filtered_df['Product Variant']))
-
         if mat_count > 0:
-            ordered_display_names = list(filtered_df['display_name'])
-            selected_display = st.selectbox("Select Slab", ordered_display_names, label_visibility="collapsed")
-            selected_variant = display_to_variant[selected_display]
+            # Only the visible page is taken from grouped_df, labelled and priced
+            page_count = -(-mat_count // RESULTS_PAGE_SIZE)
+            if st.session_state.get("results_page", 1) > page_count:
+                st.session_state.results_page = page_count
+            page = st.session_state.get("results_page", 1)
+            with _run.stage("results_page") as stage:
+                page_rows = result_rows[(page - 1) * RESULTS_PAGE_SIZE:page * RESULTS_PAGE_SIZE]
+                page_df   = grouped_df.iloc[page_rows]
+                page_grid = pd.DataFrame({
+                    "Slab":           display_names(page_df).to_numpy(),
+                    "Available":      page_df['On Hand Qty'].to_numpy(),
+                    "Customer Total": price_matrix.totals(page_rows, sqft, total_sink_price),
+                })
+                stage["rows"] = len(page_rows)
+
+            # A new key whenever the page's rows change, so a stale highlight never carries over
+            grid_key = f"results_grid_{hash(page_rows.tobytes())}"
+            st.dataframe(
+                page_grid,
+                key=grid_key,
+                on_select=functools.partial(_select_slab, grid_key, view_key, page_rows),
+                selection_mode="single-row",
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "Available":      st.column_config.NumberColumn(format="%.1f sf"),
+                    "Customer Total": st.column_config.NumberColumn(format="dollar"),
+                },
+            )
+            col_page, col_range = st.columns([1, 3])
+            with col_page:
+                st.number_input("Page", min_value=1, max_value=page_count, step=1, key="results_page")
+            with col_range:
+                first = (page - 1) * RESULTS_PAGE_SIZE + 1
+                st.caption(f"Showing {first:,}–{first + len(page_rows) - 1:,} of {mat_count:,} · click a row to price it")
+
+            # The picked slab stays selected across pages until it drops out of the results
+            picked = st.session_state.get("selected_slab")
+            if picked is not None and picked[:2] == view_key and (result_rows == picked[2]).any():
+                selected_row = picked[2]
+            else:
+                selected_row = int(result_rows[0])
+            selected_variant = grouped_df['Product Variant'].iat[selected_row]
+            st.markdown(f"**Selected:** {display_names(grouped_df.iloc[[selected_row]]).iat[0]}")
         else:
             active_filters = []
             if selected_brands:
@@ -691,181 +1200,67 @@ if df is not None:
 
     # ── Results ────────────────────────────────────────────────────────────────
     if selected_variant:
-        slab_data  = grouped_df[grouped_df['Product Variant'] == selected_variant].iloc[0]
-        all_slabs  = df[df['Product Variant'] == selected_variant]
-        pricing    = calculate_cost(slab_data['Unit_Cost'], sqft, total_sink_price)
+        slab_data  = grouped_df.iloc[selected_row]
+        with _run.stage("pricing"):
+            pricing = calculate_cost(slab_data['Unit_Cost'], sqft, total_sink_price)
         slab_label = f"{slab_data['Brand']} {slab_data['Color']} {slab_data['Thickness']}"
 
-        c1, c2 = st.columns([1, 1])
-
-        with c1:
-            with st.container(border=True):
-                st.markdown('<span class="card-title">Inventory Context</span>', unsafe_allow_html=True)
-
-                # Display all serial numbers for this variant
-                serial_num_cols = [
-                    'Serial Number', 'SKU', 'Item Code', 'Product SKU', 'Serialized Inventory'
-                ]
-                serial_numbers = []
-                for col in serial_num_cols:
-                    if col in all_slabs.columns:
-                        for serial in all_slabs[col]:
-                            if pd.notna(serial) and serial not in serial_numbers:
-                                serial_numbers.append(str(serial))
-                        if serial_numbers:
-                            break
-
-                if serial_numbers:
-                    st.markdown("**Serial Numbers:**")
-                    for serial in serial_numbers:
-                        st.write(f"• {serial}")
-
-                st.metric("Available Qty", f"{slab_data['On Hand Qty']:.1f} sf")
-
-                search_query = (
-                    f"{slab_data['Brand']} {slab_data['Color']} countertop installed"
-                ).replace(" ", "+")
-                st.link_button(
-                    "🖼️ View Installed Photos",
-                    f"https://www.google.com/search?tbm=isch&q={search_query}",
-                    use_container_width=True,
-                )
-
-        with c2:
-            st.markdown(f"""
-            <div class="large-price">
-                <p>CUSTOMER TOTAL</p>
-                <h1>${pricing['total_with_tax']:,.2f}</h1>
-                <p>Incl. 5% GST</p>
-            </div>
-            """, unsafe_allow_html=True)
-
-            with st.expander("💰 Cost Breakdown"):
-                margin_pct = pricing['margin_pct']
-                margin_class = "good-margin" if margin_pct >= 18 else "low-margin"
-                margin_label = "✅ Healthy" if margin_pct >= 18 else "⚠️ Low"
-                st.markdown(
-                    f'Margin: <span class="{margin_class}">{margin_pct:.1f}% — {margin_label}</span>',
-                    unsafe_allow_html=True,
-                )
-                st.divider()
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    st.metric("Internal Cost (IB)", f"${pricing['ib_cost']:,.2f}")
-                with col_b:
-                    st.metric("Mat & Fab (Customer)", f"${pricing['customer_mat_fab']:,.2f}")
-                st.write(f"Installation: **${pricing['customer_ins']:,.2f}**")
-                if pricing['sink_price'] > 0:
-                    st.write("**Sinks:**")
-                    for sink in st.session_state.selected_sinks:
-                        st.write(
-                            f"  • {sink['type']}: ${sink['price']:,.2f}"
-                            f" × {sink['quantity']} = **${sink['price'] * sink['quantity']:,.2f}**"
-                        )
-                    st.write(f"Sink total: **${pricing['sink_price']:,.2f}**")
-                st.write(f"Subtotal (excl. tax): **${pricing['subtotal']:,.2f}**")
-                st.write(f"GST (5%): **${pricing['subtotal'] * TAX_RATE:,.2f}**")
-
-            # ── Download Quote as PDF ──────────────────────────────────────────
-            pdf_bytes = generate_quote_pdf(
-                slab_name=slab_label,
-                sqft=sqft,
-                sinks=st.session_state.selected_sinks,
-                pricing=pricing,
-            )
-            st.download_button(
-                label="📄 Download Quote as PDF",
-                data=pdf_bytes,
-                file_name=f"quote_{slab_label.replace(' ', '_')}.pdf",
-                mime="application/pdf",
-                use_container_width=True,
-            )
+        # Serial numbers are looked up here, in the full run, where the index is cached per version
+        with _run.stage("serials", cached=True) as stage:
+            serial_numbers = get_serial_index(inventory_ver, location, df, view.rows).serials(selected_variant)
+            stage["rows"] = len(serial_numbers)
+        with _run.stage("slab_fit"):   # The selected slab's pieces; "best_fit" is the list sort
+            fit = fit_index.best_fit(selected_row, sqft * WASTE_FACTOR)
+        price_curve = price_matrix.curve(selected_row, total_sink_price)
+
+        comparison_item = {
+            'variant':   selected_variant,
+            'brand':     slab_data['Brand'],
+            'color':     slab_data['Color'],
+            'thickness': slab_data['Thickness'],
+            'price':     pricing['total_with_tax'],
+            'subtotal':  pricing['subtotal'],
+            'pricing':   pricing,
+            'sqft':      sqft,
+            'location':  location,
+            'sinks': [
+                {'type': s['type'], 'quantity': s['quantity'], 'price': s['price']}
+                for s in st.session_state.selected_sinks
+            ],
+            'customer':  customer_name,
+            'rep':       rep_name,
+            'inventory_version': inventory_ver,
+        }
+        results_card(slab_data, slab_label, sqft, pricing, serial_numbers, fit, price_curve, comparison_item)
 
         # ── Add to Comparison ──────────────────────────────────────────────────
         st.markdown("---")
-        if st.button("➕ Add to Comparison", use_container_width=True, type="primary"):
-            comparison_item = {
-                'variant':   selected_variant,
-                'brand':     slab_data['Brand'],
-                'color':     slab_data['Color'],
-                'thickness': slab_data['Thickness'],
-                'price':     pricing['total_with_tax'],
-                'subtotal':  pricing['subtotal'],
-                'sqft':      sqft,
-                'sinks': [
-                    {'type': s['type'], 'quantity': s['quantity'], 'price': s['price']}
-                    for s in st.session_state.selected_sinks
-                ],
-            }
-            st.session_state.comparison_tray.append(comparison_item)
+        if st.button("➕ Add to Comparison", use_container_width=True, type="primary",
+                     on_click=_add_to_tray, args=(comparison_item,)):
             st.success("Added to comparison tray!")
 
     # ── Comparison Tray ────────────────────────────────────────────────────────
-    if st.session_state.comparison_tray:
-        st.markdown("---")
-        st.markdown("### 🔍 Comparison Tray")
-
-        col_clear, col_spacer = st.columns([1, 5])
-        with col_clear:
-            if st.button("🗑️ Clear All", use_container_width=True):
-                st.session_state.comparison_tray = []
-                st.rerun()
-
-        # Display comparison items in columns (up to MAX_COMPARISON_COLS per row)
-        num_items = len(st.session_state.comparison_tray)
-        cols = st.columns(min(num_items, MAX_COMPARISON_COLS))
-
-        for idx, item in enumerate(st.session_state.comparison_tray):
-            with cols[idx % MAX_COMPARISON_COLS]:
-                with st.container(border=True):
-                    st.markdown(f"**{item['brand']} {item['color']}**")
-                    st.write(f"{item['thickness']} • {item['sqft']:.0f} sf")
-
-                    if item.get('sinks'):
-                        st.write("**Sinks:**")
-                        for sink in item['sinks']:
-                            label = sink['type'].split('-')[0].strip() or sink['type']
-                            st.write(f"• {label}: {sink['quantity']}x")
-
-                    st.markdown(f"### ${item['price']:,.2f}")
-
-                    search_query = (
-                        f"{item['brand']} {item['color']} countertop installed"
-                    ).replace(" ", "+")
-                    st.link_button(
-                        "🖼️ View Photos",
-                        f"https://www.google.com/search?tbm=isch&q={search_query}",
-                        use_container_width=True,
-                    )
+    comparison_tray()
 
-                    if st.button("Remove", key=f"remove_{idx}", use_container_width=True):
-                        st.session_state.comparison_tray.pop(idx)
-                        st.rerun()
-
-        # ── Export Comparison Tray as CSV ──────────────────────────────────────
-        tray_rows = []
-        for item in st.session_state.comparison_tray:
-            sink_summary = "; ".join(
-                f"{s['type']} ×{s['quantity']}" for s in item.get('sinks', [])
-            ) or "None"
-            tray_rows.append({
-                "Brand":      item['brand'],
-                "Color":      item['color'],
-                "Thickness":  item['thickness'],
-                "Sq Ft":      item['sqft'],
-                "Sinks":      sink_summary,
-                "Subtotal":   item.get('subtotal', ""),
-                "Total (incl. GST)": item['price'],
-            })
-
-        tray_csv = pd.DataFrame(tray_rows).to_csv(index=False).encode("utf-8")
-        st.download_button(
-            label="📥 Export Comparison as CSV",
-            data=tray_csv,
-            file_name="comparison_tray.csv",
-            mime="text/csv",
-            use_container_width=True,
-        )
+    # ── Quote History ──────────────────────────────────────────────────────────
+    quote_history_panel(partitions, inventory_ver, selected_variant)
 
 else:
     st.error("Unable to load inventory data. Check your network connection or data source URLs.")
+
+# ── Stage timings panel ────────────────────────────────────────────────────────
+_run.finish()
+if _run.enabled:
+    with st.sidebar:
+        st.markdown("#### ⏱️ Stage Timings")
+        timings = pd.DataFrame(_stage_profiler().summary())
+        st.dataframe(
+            timings.rename(columns={
+                "stage": "Stage", "runs": "Runs", "p50_ms": "p50 ms", "p95_ms": "p95 ms",
+                "last_rows": "Rows", "hits": "Hits", "misses": "Misses",
+            }),
+            hide_index=True,
+            column_config={"p50 ms": st.column_config.NumberColumn(format="%.1f"),
+                           "p95 ms": st.column_config.NumberColumn(format="%.1f")},
+        )
+        st.caption("Rolling window per stage; each timed rerun is also logged as a JSON line.")
@@ -0,0 +1,223 @@
+"""
+Load test for the JSON pricing API (`python -m counterpro serve`).
+
+    python -m benchmarks.loadtest                              # local server on 100k synthetic rows
+    python -m benchmarks.loadtest --rows 1000000 --concurrency 32 --duration 20
+    python -m benchmarks.loadtest --url http://127.0.0.1:8765  # an instance that is already running
+
+Without `--url`, a server is started on a free port against a synthetic
+inventory export and stopped afterwards. `--concurrency` client threads,
+each on its own keep-alive connection, send a weighted mix of /price,
+/inventory and /batch requests for `--duration` seconds. Throughput and
+p50 / p95 / p99 latency are printed per endpoint and written to a JSON
+file with `-o`.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_csv
+
+DEFAULT_ROWS        = 100_000
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DURATION    = 10.0    # Seconds of load after warm-up
+DEFAULT_MIX         = "price=6,inventory=3,batch=1"
+DEFAULT_BATCH_JOBS  = 100     # Jobs per /batch request
+SERVER_START_TIMEOUT = 120.0  # Seconds to wait for a started server to load its inventory
+
+SEARCH_TERMS = ["cal", "white", "ice white", "caesarstone 3cm", "tempal", "#l4", ""]
+SORTS        = ["price", "price", "price_desc", "size", "fit"]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get_json(host, port, path, timeout=5.0):
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def start_server(rows, seed):
+    """Serve a synthetic export of `rows` rows on a free port. Returns (process, host, port, csv path)."""
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix="counterpro-load-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(synthetic_csv(rows, seed))
+    port    = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "counterpro", "serve", "--inventory", path, "--port", str(port)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            status, health = _get_json("127.0.0.1", port, "/health", timeout=1.0)
+            if status == 200 and health["status"] == "ok":
+                return process, "127.0.0.1", port, path
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"server not ready after {SERVER_START_TIMEOUT:.0f} s")
+
+
+def _parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("price", "inventory", "batch"):
+            raise ValueError(f"unknown endpoint {name!r} in --mix")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class RequestFactory:
+    """Random but realistic requests, drawn from variants the server actually holds."""
+
+    def __init__(self, variants, batch_jobs):
+        self.variants   = variants
+        self.batch_jobs = batch_jobs
+
+    def make(self, endpoint, rng):
+        """(method, path, body) for one request to `endpoint`."""
+        sqft = float(rng.randint(10, 120))
+        if endpoint == "price":
+            query = {"variant": rng.choice(self.variants), "sqft": sqft, "sinks": rng.choice([0, 89, 450])}
+            return "GET", "/price?" + urllib.parse.urlencode(query), None
+        if endpoint == "inventory":
+            query = {"sqft": sqft, "q": rng.choice(SEARCH_TERMS), "sort": rng.choice(SORTS),
+                     "max_total": rng.choice(["", 5000, 10000])}
+            return "GET", "/inventory?" + urllib.parse.urlencode(query), None
+        jobs = [{"variant": rng.choice(self.variants), "sqft": float(rng.randint(10, 120)), "job_id": idx}
+                for idx in range(self.batch_jobs)]
+        return "POST", "/batch", json.dumps({"jobs": jobs}).encode("utf-8")
+
+
+def _client(host, port, factory, weights, stop, results, seed):
+    """One client thread: requests back to back on one keep-alive connection until `stop` is set."""
+    rng       = random.Random(seed)
+    endpoints = list(weights)
+    shares    = list(weights.values())
+    conn      = http.client.HTTPConnection(host, port, timeout=30)
+    while not stop.is_set():
+        endpoint = rng.choices(endpoints, shares)[0]
+        method, path, body = factory.make(endpoint, rng)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        start   = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        results.append((endpoint, (time.perf_counter() - start) * 1000, ok))
+    conn.close()
+
+
+def run_load(host, port, concurrency, duration, weights, batch_jobs, seed=0, warmup=2.0):
+    """Drive the server for `warmup` + `duration` seconds; returns the report dict."""
+    status, page = _get_json(host, port, "/inventory?sqft=1&limit=500&sort=size")
+    if status != 200 or not page["items"]:
+        raise RuntimeError(f"server returned no inventory ({status})")
+    factory = RequestFactory([item["variant"] for item in page["items"]], batch_jobs)
+
+    def phase(seconds):
+        stop, results = threading.Event(), []
+        threads = [
+            threading.Thread(target=_client, args=(host, port, factory, weights, stop, results, seed + idx),
+                             daemon=True)
+            for idx in range(concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - start
+
+    phase(warmup)   # Builds the per-version indexes and fills the memos before anything is timed
+    results, elapsed = phase(duration)
+
+    report = {"concurrency": concurrency, "duration_s": round(elapsed, 2), "endpoints": {}}
+    for endpoint in [*weights, "all"]:
+        picked = [r for r in results if endpoint in ("all", r[0])]
+        if not picked:
+            continue
+        ms = np.array([r[1] for r in picked])
+        report["endpoints"][endpoint] = {
+            "requests":   len(picked),
+            "errors":     sum(not r[2] for r in picked),
+            "throughput": round(len(picked) / elapsed, 1),
+            "p50_ms":     round(float(np.percentile(ms, 50)), 2),
+            "p95_ms":     round(float(np.percentile(ms, 95)), 2),
+            "p99_ms":     round(float(np.percentile(ms, 99)), 2),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Running server to test (default: start one on synthetic data).")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Synthetic inventory rows for a started server.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Client threads / connections.")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Seconds of measured load.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX}).")
+    parser.add_argument("--batch-jobs", type=int, default=DEFAULT_BATCH_JOBS, help="Jobs per /batch request.")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic data and request seed.")
+    parser.add_argument("-o", "--output", help="Also write the report as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    weights = _parse_mix(args.mix)
+    server  = None
+    if args.url:
+        parsed = urllib.parse.urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        print(f"starting a server on {args.rows:,} synthetic rows ...", file=sys.stderr)
+        server, host, port, csv_path = start_server(args.rows, args.seed)
+    try:
+        report = run_load(host, port, args.concurrency, args.duration, weights, args.batch_jobs, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            os.remove(csv_path)
+
+    report["rows"] = None if args.url else args.rows
+    print(f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<10} {stats['requests']:>9,} {stats['errors']:>7,} {stats['throughput']:>9,.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(stats["errors"] == 0 for stats in report["endpoints"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Stage-by-stage timings of the inventory pipeline on synthetic data.
+
+    python -m benchmarks.run                          # 1k, 10k, 100k, 1M rows
+    python -m benchmarks.run --scales 1000,10000 --repeat 5
+    python -m benchmarks.run --baseline benchmarks/results/<old-commit>.json
+
+Each stage is timed on its own, with its inputs built beforehand, and the
+min / median of `--repeat` runs is written to a JSON file named after the
+current commit. `--baseline` prints each stage's time relative to an
+earlier results file.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_csv
+from counterpro.data import _clean_source, read_inventory_csv
+from counterpro.fit import FitIndex
+from counterpro.history import QuoteHistory
+from counterpro.inventory import LocationPartitions, PriceIndex, PriceMatrix, SearchIndex, SerialIndex, display_names, group_inventory
+from counterpro.parsing import parse_product_variants
+from counterpro.pdf import generate_quote_pdf
+from counterpro.pricing import SINK_OPTIONS, WASTE_FACTOR, calculate_cost, calculate_cost_batch
+
+DEFAULT_SCALES  = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_REPEAT  = 3
+RESULTS_DIR     = os.path.join(os.path.dirname(__file__), "results")
+
+SQFT         = 35.0                                  # Job size used for filter / pricing stages
+SINK_TYPE    = "🥣 50/50 Undermount Standard Radius - SKU 83742 (16 ga)"
+SINK_PRICE   = SINK_OPTIONS[SINK_TYPE]
+SEARCH_TERMS = ["cal", "white", "ice white", "caesarstone 3cm", "tempal", "#l4", "zzz"]
+PDF_QUOTES   = 10                                    # PDFs rendered per pdf_render run
+HISTORY_MAX_QUOTES = 300_000                         # Quote history rows written per history_write run (capped scale)
+
+
+def _time(fn, repeat):
+    """Run `fn` `repeat` times; returns (seconds per run, last result)."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return runs, result
+
+
+def _summary(runs, **extra):
+    return {
+        "min_ms":    round(min(runs) * 1000, 3),
+        "median_ms": round(statistics.median(runs) * 1000, 3),
+        "runs":      len(runs),
+        **extra,
+    }
+
+
+def _filter(grouped_df, fit_index, search_index, price_index, brands, thicknesses, budget):
+    """
+    The app's filter chain for one rerun: one boolean mask over grouped_df
+    narrowed by fit, brand, thickness and search, then the budget rows it
+    lets through. Returns row positions in ascending price order.
+    """
+    passed_filters  = fit_index.reach(SQFT * WASTE_FACTOR)
+    passed_filters &= grouped_df['Brand'].isin(brands).to_numpy()
+    passed_filters &= grouped_df['Thickness'].isin(thicknesses).to_numpy()
+    search_hits = np.zeros(len(grouped_df), dtype=bool)
+    search_hits[search_index.search("cal")] = True
+    passed_filters &= search_hits
+
+    rows = price_index.budget_rows(budget[0], budget[1], SQFT, SINK_PRICE)
+    return rows[passed_filters[rows]]
+
+
+def bench_scale(rows, repeat, seed=0):
+    """Timings for every stage at one inventory size."""
+    payload = synthetic_csv(rows, seed)
+    stages = {}
+
+    runs, raw = _time(lambda: _clean_source(pd.read_csv(io.BytesIO(payload))), repeat)
+    stages["csv_parse"] = _summary(runs, bytes=len(payload))
+
+    # The ingest path the app uses: pruned columns, pyarrow parsing, variants parsed too
+    runs, _ = _time(lambda: read_inventory_csv(payload), repeat)
+    stages["csv_ingest"] = _summary(runs)
+
+    # The in-stock rows _prepare_source hands to the variant parser
+    inventory = raw[raw['On Hand Qty'] > 0].copy()
+    inventory['Unit_Cost'] = inventory['Serialized On Hand Cost'] / inventory['On Hand Qty']
+    variants = inventory['Product Variant']
+    runs, parsed = _time(lambda: parse_product_variants(variants), repeat)
+    stages["variant_parse"] = _summary(runs, distinct=int(variants.nunique()))
+
+    memo = {}
+    parse_product_variants(variants, memo=memo)
+    runs, _ = _time(lambda: parse_product_variants(variants, memo=memo), repeat)
+    stages["variant_parse_memo"] = _summary(runs)
+
+    inventory[['Brand', 'Color', 'Thickness']] = parsed
+    runs, grouped_df = _time(lambda: group_inventory(inventory), repeat)
+    stages["groupby"] = _summary(runs, variants=len(grouped_df))
+
+    runs, partitions = _time(lambda: LocationPartitions(inventory), repeat)
+    stages["partitions"] = _summary(runs, locations=len(partitions.locations))
+
+    runs, _ = _time(lambda: display_names(grouped_df), repeat)
+    stages["display_names"] = _summary(runs)
+
+    runs, serial_index = _time(lambda: SerialIndex(inventory), repeat)
+    stages["serial_index"] = _summary(runs)
+
+    def select_all():
+        return [serial_index.serials(variant) for variant in grouped_df['Product Variant']]
+    runs, _ = _time(select_all, repeat)
+    stages["serial_lookup"] = _summary(runs, lookups=len(grouped_df))
+
+    runs, fit_index = _time(lambda: FitIndex(inventory, grouped_df), repeat)
+    stages["fit_index"] = _summary(runs)
+
+    runs, fits = _time(lambda: fit_index.reach(SQFT * WASTE_FACTOR), repeat)
+    stages["fit_reach"] = _summary(runs, fits=int(fits.sum()))
+
+    def best_fit_all():
+        fit_index._memo.clear()   # time the search, not the per-need memo
+        return fit_index.leftovers(np.flatnonzero(fits), SQFT * WASTE_FACTOR)
+    runs, _ = _time(best_fit_all, repeat)
+    stages["best_fit"] = _summary(runs, variants=int(fits.sum()))
+
+    runs, pricing = _time(
+        lambda: calculate_cost_batch(grouped_df['Unit_Cost'].to_numpy(), SQFT, SINK_PRICE), repeat)
+    stages["pricing"] = _summary(runs)
+
+    runs, price_index = _time(lambda: PriceIndex(grouped_df), repeat)
+    stages["price_index"] = _summary(runs)
+
+    runs, price_matrix = _time(lambda: PriceMatrix(grouped_df), repeat)
+    stages["price_matrix"] = _summary(runs, columns=len(price_matrix.sqft),
+                                      mb=round(price_matrix.slab_subtotal.nbytes / 1e6, 1))
+
+    all_rows = np.arange(len(grouped_df))
+    runs, _ = _time(lambda: price_matrix.totals(all_rows, SQFT, SINK_PRICE), repeat)
+    stages["price_lookup"] = _summary(runs)
+
+    runs, search_index = _time(lambda: SearchIndex(grouped_df), repeat)
+    stages["search_index"] = _summary(runs)
+
+    def search_all():
+        search_index._memo.clear()   # time lookups, not the per-term memo
+        return [search_index.search(term) for term in SEARCH_TERMS]
+    runs, _ = _time(search_all, repeat)
+    stages["search"] = _summary(runs, terms=len(SEARCH_TERMS))
+
+    brands      = sorted(grouped_df['Brand'].unique())[:4]
+    thicknesses = [t for t in grouped_df['Thickness'].unique() if t]
+    totals      = pricing["total_with_tax"]
+    budget      = (float(np.nanpercentile(totals, 10)), float(np.nanpercentile(totals, 90)))
+    runs, filtered_rows = _time(
+        lambda: _filter(grouped_df, fit_index, search_index, price_index, brands, thicknesses, budget), repeat)
+    stages["filter"] = _summary(runs, matches=len(filtered_rows))
+
+    sample = grouped_df.dropna(subset=['Unit_Cost']).head(PDF_QUOTES)
+    sinks  = [{"type": SINK_TYPE, "price": SINK_PRICE, "quantity": 1}]
+    quotes = [
+        (row['Product Variant'], SQFT, sinks, calculate_cost(row['Unit_Cost'], SQFT, SINK_PRICE))
+        for _, row in sample.iterrows()
+    ]
+    runs, _ = _time(lambda: [generate_quote_pdf(*quote) for quote in quotes], repeat)
+    stages["pdf_render"] = _summary(runs, pdfs=len(quotes))
+
+    history_quotes = _history_quotes(grouped_df, min(rows, HISTORY_MAX_QUOTES), seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        def write_history():
+            history = QuoteHistory(os.path.join(tmp, f"quotes_{time.perf_counter_ns()}.sqlite"))
+            for quote in history_quotes:
+                history.record(quote)
+            history.close()
+            return history
+        runs, history = _time(write_history, repeat)
+        stages["history_write"] = _summary(runs, quotes=len(history_quotes))
+
+        history  = QuoteHistory(history.path)
+        searches = [
+            {"text": "cust 12"},
+            {"text": "rep 3"},
+            {"variant": history_quotes[0]["variant"]},
+            {"since": history_quotes[len(history_quotes) // 2]["created_at"],
+             "until": history_quotes[len(history_quotes) // 2]["created_at"] + 86400},
+        ]
+        runs, _ = _time(lambda: [history.search(**search) for search in searches], repeat)
+        stages["history_search"] = _summary(runs, searches=len(searches))
+        history.close()
+
+    return stages
+
+
+def _history_quotes(grouped_df, count, seed):
+    """`count` tray-style quotes spread over a year, for random variants, customers and reps."""
+    rng      = np.random.default_rng(seed)
+    variants = grouped_df['Product Variant'].to_numpy()[rng.integers(0, len(grouped_df), count)]
+    start    = time.time() - 365 * 86400
+    return [
+        {"kind": "tray", "variant": variant, "slab_name": variant, "sqft": SQFT, "total": 1000.0,
+         "customer": f"Cust {idx % 20_000}", "rep": f"Rep {idx % 40}",
+         "created_at": start + idx * 365 * 86400 / count, "sinks": [], "pricing": {}}
+        for idx, variant in enumerate(variants.tolist())
+    ]
+
+
+def _commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=os.path.dirname(__file__), check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline):
+    """Print each stage's best time against `baseline` (ratio > 1 is slower)."""
+    print(f"\nvs {baseline['commit']}:")
+    for scale, stages in results["scales"].items():
+        old = baseline["scales"].get(scale, {})
+        for stage, timing in stages.items():
+            if stage in old and old[stage]["min_ms"] > 0:
+                ratio = timing["min_ms"] / old[stage]["min_ms"]
+                flag  = "  <-- slower" if ratio > 1.2 else ""
+                print(f"  {scale:>9} {stage:<20} {old[stage]['min_ms']:>10.2f} -> "
+                      f"{timing['min_ms']:>10.2f} ms  x{ratio:.2f}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="Comma-separated row counts.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per stage.")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic data seed.")
+    parser.add_argument("-o", "--output", help="Results file (default: benchmarks/results/<commit>.json).")
+    parser.add_argument("--baseline", help="Earlier results file to compare against.")
+    args = parser.parse_args(argv)
+
+    commit  = _commit()
+    results = {
+        "commit":   commit,
+        "created":  time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "seed":     args.seed,
+        "repeat":   args.repeat,
+        "python":   platform.python_version(),
+        "pandas":   pd.__version__,
+        "numpy":    np.__version__,
+        "machine":  platform.machine(),
+        "scales":   {},
+    }
+    for rows in (int(s) for s in args.scales.split(",")):
+        print(f"{rows:,} rows ...", file=sys.stderr)
+        stages = bench_scale(rows, args.repeat, args.seed)
+        results["scales"][str(rows)] = stages
+        for stage, timing in stages.items():
+            print(f"  {stage:<20} {timing['median_ms']:>10.2f} ms", file=sys.stderr)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Deterministic synthetic inventory shaped like the live sheet export.
+
+Variant strings cover the formats seen in the sheet (numeric id prefixes,
+parenthesised codes, #lot tags, stray whitespace, missing thickness), and
+quantities / costs are written as the sheet writes them: thousands
+separators, `$` signs, the odd blank or `n/a`. The same `rows` and `seed`
+always give the same bytes, so timings are comparable between commits.
+"""
+import numpy as np
+import pandas as pd
+
+BRANDS = [
+    "Caesarstone", "Silestone", "Cambria", "MSI Q", "Hanstone", "Dekton",
+    "Vicostone", "LG Viatera", "Corian & Co", "Wilsonart", "Pental", "Technistone",
+]
+COLORS = [
+    "Calacatta Nuvo", "Statuario", "Carrara Mist", "Frosty Carrina", "Black Tempal",
+    "Eternal Marquina", "Brittanicca", "Ice White", "Mont Blanc", "Cafe Noir",
+    "Empira White", "Pure White", "Raw Concrete", "Ethereal Glow", "Taj Royale",
+    "Calacatta Gold", "Desert Silver", "Montauk", "Bianco Drift", "Oyster",
+]
+THICKNESSES = ["2cm", "3cm", "1.2cm", "3CM", ""]
+LOCATIONS   = ["Yard A", "Yard B", "Showroom"]
+ROWS_PER_VARIANT = 10   # Average serialized slabs per Product Variant
+
+
+def _variant_names(count, rng):
+    """`count` variant strings in a mix of the sheet's naming formats."""
+    brand = rng.choice(BRANDS, count)
+    color = rng.choice(COLORS, count)
+    thick = rng.choice(THICKNESSES, count)
+    code  = rng.integers(100, 99_999, count)
+    fmt   = rng.integers(0, 5, count)
+    names = np.empty(count, dtype=object)
+    for i in range(count):
+        b, c, t, n = brand[i], color[i], thick[i], code[i]
+        if fmt[i] == 0:
+            names[i] = f"{n} - {b} {c} {t}"
+        elif fmt[i] == 1:
+            names[i] = f"{b} {c} ({n}) {t} #L{n % 97}"
+        elif fmt[i] == 2:
+            names[i] = f"{n % 90 + 10}-{b} {c} {t} Polished"
+        elif fmt[i] == 3:
+            names[i] = f"{c} {t}"
+        else:
+            names[i] = f"  {b}   {c}  #{n % 9 + 1}x {t}"
+    return names
+
+
+def synthetic_inventory(rows, seed=0):
+    """Raw inventory rows (all text columns, as read from the sheet) as a DataFrame."""
+    rng = np.random.default_rng(seed)
+    variants = _variant_names(max(1, rows // ROWS_PER_VARIANT), rng)
+
+    qty  = np.round(rng.uniform(-5.0, 70.0, rows), 2)
+    cost = qty * rng.uniform(8.0, 60.0, rows)
+    qty_text  = pd.Series(qty).map("{:,.2f}".format)
+    cost_text = "$" + pd.Series(cost).map("{:,.2f}".format)
+    qty_text[rng.random(rows) < 0.05]   = ""
+    cost_text[rng.random(rows) < 0.03]  = "n/a"
+    serials = pd.Series(rng.integers(10_000, 9_999_999, rows)).map("SN{:07d}".format)
+
+    return pd.DataFrame({
+        "Product Variant":         variants[rng.integers(0, len(variants), rows)],
+        " On Hand Qty ":           qty_text,
+        "Serialized On Hand Cost": cost_text,
+        "Serial Number":           serials,
+        "Location":                rng.choice(LOCATIONS, rows),
+    })
+
+
+def synthetic_csv(rows, seed=0):
+    """The synthetic inventory encoded as CSV bytes, like a sheet download."""
+    return synthetic_inventory(rows, seed).to_csv(index=False).encode("utf-8")
@@ -0,0 +1 @@
+"""Headless building blocks for the CounterPro dead-stock sales tool."""
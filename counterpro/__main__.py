@@ -0,0 +1,5 @@
+import sys
+
+from counterpro.cli import main
+
+sys.exit(main())
@@ -0,0 +1,390 @@
+"""
+Local JSON pricing API: the app's prices and slab filters over HTTP, for
+tools (CRM, estimator sheets) that need the same numbers as a quote.
+
+    python -m counterpro serve                               # live sheets, refreshed in the background
+    python -m counterpro serve --inventory inventory.csv --port 8765
+
+    GET  /health      inventory version, rows and age
+    GET  /price       ?variant=...&sqft=35[&sinks=450][&location=Yard+A]
+    GET  /inventory   ?sqft=35[&q=cal][&brand=..][&thickness=..][&min_total=..][&max_total=..]
+                      [&sinks=..][&location=..][&sort=price|price_desc|size|fit][&limit=25][&offset=0]
+    POST /batch       {"jobs": [{"variant": ..., "sqft": 35, "sinks": 0, "job_id": ...}, ...], "location": ...}
+
+Prices come from `calculate_cost` / `calculate_cost_batch`, and `/inventory`
+runs the app's filter chain (stock in at most FIT_MAX_PIECES slabs, brand,
+thickness, search, budget) on the same indexes. Inventory comes from an
+`InventoryRefresher`, as in the app; indexes are built once per inventory
+version and location. Handlers are async; anything that touches the
+inventory runs on the thread pool so the event loop keeps accepting
+requests.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from counterpro.data import SourceCache, fetch_data, read_inventory_csv
+from counterpro.fit import FitIndex
+from counterpro.inventory import LocationPartitions, SearchIndex
+from counterpro.pricing import WASTE_FACTOR, calculate_cost, calculate_cost_batch
+from counterpro.snapshot import load_snapshot
+from counterpro.store import INVENTORY_VERSIONS_KEPT, InventoryRefresher
+
+API_DEFAULT_PORT    = 8765
+API_PAGE_SIZE       = 25       # /inventory items per page unless `limit` is given
+API_MAX_PAGE_SIZE   = 500      # Largest /inventory page
+API_MAX_BATCH_JOBS  = 10_000   # Jobs priced by one /batch request
+SORTS = ("price", "price_desc", "size", "fit")
+
+SLAB_FIELDS = {   # Grouped column -> response key
+    'Product Variant': "variant",
+    'Brand':           "brand",
+    'Color':           "color",
+    'Thickness':       "thickness",
+    'On Hand Qty':     "on_hand_sqft",
+}
+
+
+def _json_value(value):
+    """A NumPy / pandas scalar as plain JSON (NaN and NA become null)."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _slabs(grouped_df, rows):
+    """SLAB_FIELDS of grouped rows `rows`, one dict per row, taken a column at a time."""
+    columns = [grouped_df[col].iloc[rows].tolist() for col in SLAB_FIELDS]
+    return [
+        {key: _json_value(value) for key, value in zip(SLAB_FIELDS.values(), values)}
+        for values in zip(*columns)
+    ]
+
+
+def _pricing_rows(pricing):
+    """`calculate_cost_batch` output as one plain dict per priced row."""
+    columns = {key: values.tolist() for key, values in pricing.items()}
+    return [
+        {key: _json_value(value) for key, value in zip(columns, values)}
+        for values in zip(*columns.values())
+    ]
+
+
+def _number(params, name, default=None, minimum=None):
+    """Query / body value `name` as a float; 400 if it is missing (with no default) or not a finite number."""
+    raw = params.get(name)
+    if raw is None or raw == "":
+        if default is None:
+            raise HTTPException(400, f"'{name}' is required")
+        return default
+    try:
+        value = float(raw)
+    except (TypeError, ValueError):
+        raise HTTPException(400, f"'{name}' must be a number, got {raw!r}") from None
+    if not math.isfinite(value):
+        raise HTTPException(400, f"'{name}' must be a finite number, got {raw!r}")
+    if minimum is not None and value < minimum:
+        raise HTTPException(400, f"'{name}' must be at least {minimum}")
+    return value
+
+
+def _integer(params, name, default, minimum, maximum):
+    value = _number(params, name, float(default), minimum)
+    if value != int(value):
+        raise HTTPException(400, f"'{name}' must be a whole number")
+    return min(int(value), maximum)
+
+
+def read_file_source(path, memo=None):
+    """
+    `fetch` for an InventoryRefresher serving a local CSV export: the typed
+    inventory and a one-entry source report, versioned by the file's hash.
+    """
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        payload = f.read()
+    df    = read_inventory_csv(payload, memo)
+    entry = {"source": path, "status": "ok", "rows": 0, "error": "", "cache": None,
+             "sha256": hashlib.sha256(payload).hexdigest(),
+             "latency_ms": (time.perf_counter() - started) * 1000}
+    if df is None:
+        entry["status"] = "skipped"
+        entry["error"]  = "No 'Product Variant' column"
+    else:
+        entry["rows"] = len(df)
+    return df, [entry]
+
+
+class _ViewIndexes:
+    """Lookup and filter indexes for one location view of one inventory version, built on first use."""
+
+    def __init__(self, df, view):
+        self.lock       = threading.Lock()
+        self.view       = view
+        self.grouped_df = view.grouped_df
+        self._df        = df
+        self._search    = None
+        self._fit       = None
+        self._variants  = None
+
+    @property
+    def search(self):
+        with self.lock:
+            if self._search is None:
+                self._search = SearchIndex(self.grouped_df)
+            return self._search
+
+    @property
+    def fit(self):
+        with self.lock:
+            if self._fit is None:
+                df = self._df if self.view.rows is None else self._df.iloc[self.view.rows]
+                self._fit = FitIndex(df, self.grouped_df)
+            return self._fit
+
+    @property
+    def variants(self):
+        """Product Variant -> grouped row position."""
+        with self.lock:
+            if self._variants is None:
+                names = self.grouped_df['Product Variant'].astype(object).tolist()
+                self._variants = dict(zip(names, range(len(names))))
+            return self._variants
+
+
+class PricingService:
+    """
+    The inventory behind the API: the refresher's latest snapshot, its
+    location partitions and, per location, the indexes requests need.
+    The newest INVENTORY_VERSIONS_KEPT versions are kept.
+    """
+
+    def __init__(self, refresher):
+        self.refresher = refresher
+        self.lock      = threading.Lock()
+        self._versions = OrderedDict()   # version -> (partitions, {location: _ViewIndexes})
+
+    def snapshot(self):
+        """Latest inventory snapshot; fetched now only if there is none yet. 503 if that fails."""
+        latest = self.refresher.store.latest()
+        if latest is None:
+            latest = self.refresher.refresh()
+        if latest is None:
+            raise HTTPException(503, "No inventory loaded yet")
+        return latest
+
+    def indexes(self, snapshot, location=None):
+        """_ViewIndexes for `location` (None: all) of `snapshot`; 404 for a location it doesn't hold."""
+        with self.lock:
+            entry = self._versions.get(snapshot.version)
+            if entry is None:
+                entry = self._versions[snapshot.version] = (LocationPartitions(snapshot.df), {})
+                while len(self._versions) > INVENTORY_VERSIONS_KEPT:
+                    self._versions.popitem(last=False)
+            partitions, views = entry
+            if location is not None and location not in partitions.locations:
+                raise HTTPException(404, f"Unknown location {location!r}")
+            if location not in views:
+                views[location] = _ViewIndexes(snapshot.df, partitions.view(location))
+            return views[location]
+
+    # ── Endpoints (blocking; run on the thread pool) ───────────────────────
+    def price(self, params):
+        sqft     = _number(params, "sqft", minimum=0)
+        sinks    = _number(params, "sinks", 0.0, minimum=0)
+        location = params.get("location") or None
+        variant  = params.get("variant")
+        if not variant:
+            raise HTTPException(400, "'variant' is required")
+
+        snapshot = self.snapshot()
+        indexes  = self.indexes(snapshot, location)
+        row      = indexes.variants.get(variant, -1)
+        if row < 0:
+            raise HTTPException(404, f"Variant {variant!r} not in inventory")
+        grouped_df = indexes.grouped_df
+        return {
+            "inventory_version": snapshot.version,
+            "location":          location,
+            **_slabs(grouped_df, [row])[0],
+            "sqft":              sqft,
+            "fits":              bool(indexes.fit.reach(sqft * WASTE_FACTOR)[row]),
+            "pricing":           {key: _json_value(value) for key, value in
+                                  calculate_cost(grouped_df['Unit_Cost'].iat[row], sqft, sinks).items()},
+        }
+
+    def inventory(self, params, brands=(), thicknesses=()):
+        sqft      = _number(params, "sqft", minimum=0)
+        sinks     = _number(params, "sinks", 0.0, minimum=0)
+        min_total = _number(params, "min_total", -math.inf)
+        max_total = _number(params, "max_total", math.inf)
+        limit     = _integer(params, "limit", API_PAGE_SIZE, 0, API_MAX_PAGE_SIZE)
+        offset    = _integer(params, "offset", 0, 0, math.inf)
+        location  = params.get("location") or None
+        query     = params.get("q", "")
+        sort      = params.get("sort") or "price"
+        if sort not in SORTS:
+            raise HTTPException(400, f"'sort' must be one of {', '.join(SORTS)}")
+
+        snapshot   = self.snapshot()
+        indexes    = self.indexes(snapshot, location)
+        grouped_df = indexes.grouped_df
+
+        # The app's filter chain: stock in few enough slabs, brand, thickness, search, budget
+        passed = indexes.fit.reach(sqft * WASTE_FACTOR)
+        if brands:
+            passed &= grouped_df['Brand'].isin(brands).to_numpy()
+        if thicknesses:
+            passed &= grouped_df['Thickness'].isin(thicknesses).to_numpy()
+        if query:
+            hits = np.zeros(len(grouped_df), dtype=bool)
+            hits[indexes.search.search(query)] = True
+            passed &= hits
+        rows = indexes.view.price_index.budget_rows(min_total, max_total, sqft, sinks)
+        rows = rows[passed[rows]]
+
+        if sort == "price_desc":
+            rows = rows[::-1]
+        elif sort == "size":
+            rows = rows[np.argsort(-grouped_df['On Hand Qty'].to_numpy()[rows], kind="stable")]
+        elif sort == "fit":
+            rows = rows[np.argsort(indexes.fit.leftovers(rows, sqft * WASTE_FACTOR), kind="stable")]
+
+        page    = rows[offset:offset + limit]
+        pricing = calculate_cost_batch(grouped_df['Unit_Cost'].to_numpy()[page], sqft, sinks)
+        return {
+            "inventory_version": snapshot.version,
+            "location":          location,
+            "count":             len(rows),
+            "offset":            offset,
+            "limit":             limit,
+            "items": [
+                {**slab, "pricing": quote}
+                for slab, quote in zip(_slabs(grouped_df, page), _pricing_rows(pricing))
+            ],
+        }
+
+    def batch(self, body):
+        if not isinstance(body, dict) or not isinstance(body.get("jobs"), list):
+            raise HTTPException(400, "Body must be a JSON object with a 'jobs' list")
+        jobs = body["jobs"]
+        if len(jobs) > API_MAX_BATCH_JOBS:
+            raise HTTPException(413, f"At most {API_MAX_BATCH_JOBS:,} jobs per batch")
+        for idx, job in enumerate(jobs):
+            if not isinstance(job, dict) or not job.get("variant"):
+                raise HTTPException(400, f"Job {idx} needs a 'variant'")
+            if not isinstance(job["variant"], str):
+                raise HTTPException(400, f"Job {idx}: 'variant' must be a string")
+        location = body.get("location") or None
+        if location is not None and not isinstance(location, str):
+            raise HTTPException(400, "'location' must be a string")
+        sqft  = np.array([_number(job, "sqft", minimum=0) for job in jobs], dtype=np.float64)
+        sinks = np.array([_number(job, "sinks", 0.0, minimum=0) for job in jobs], dtype=np.float64)
+
+        snapshot   = self.snapshot()
+        indexes    = self.indexes(snapshot, location)
+        grouped_df = indexes.grouped_df
+        rows       = np.array([indexes.variants.get(job["variant"], -1) for job in jobs], dtype=np.int64)
+        found      = rows >= 0
+        pricing    = calculate_cost_batch(grouped_df['Unit_Cost'].to_numpy()[rows[found]], sqft[found], sinks[found])
+
+        quotes, priced = [], iter(_pricing_rows(pricing))
+        for idx, job in enumerate(jobs):
+            quote = {"job_id": job.get("job_id", idx + 1), "variant": job["variant"],
+                     "sqft": float(sqft[idx]), "sinks": float(sinks[idx])}
+            if found[idx]:
+                quote["pricing"] = next(priced)
+            else:
+                quote["error"] = "Variant not in inventory"
+            quotes.append(quote)
+        return {"inventory_version": snapshot.version, "location": location, "quotes": quotes}
+
+    def health(self):
+        latest = self.refresher.store.latest()
+        return {
+            "status":            "ok" if latest is not None else "loading",
+            "inventory_version": latest.version if latest is not None else None,
+            "rows":              len(latest.df) if latest is not None else 0,
+            "age_seconds":       time.time() - latest.fetched_at if latest is not None and latest.fetched_at else None,
+            "refreshing":        self.refresher.refreshing,
+        }
+
+
+def create_app(service):
+    """The Starlette app serving `service`."""
+
+    async def health(request: Request):
+        return JSONResponse(service.health())
+
+    async def price(request: Request):
+        params = dict(request.query_params)
+        return JSONResponse(await run_in_threadpool(service.price, params))
+
+    async def inventory(request: Request):
+        params = dict(request.query_params)
+        return JSONResponse(await run_in_threadpool(
+            service.inventory, params,
+            request.query_params.getlist("brand"), request.query_params.getlist("thickness"),
+        ))
+
+    async def batch(request: Request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(400, "Body is not valid JSON") from None
+        return JSONResponse(await run_in_threadpool(service.batch, body))
+
+    async def http_error(request: Request, exc: HTTPException):
+        return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+    return Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/price", price),
+            Route("/inventory", inventory),
+            Route("/batch", batch, methods=["POST"]),
+        ],
+        exception_handlers={HTTPException: http_error},
+    )
+
+
+def make_refresher(inventory=None, interval=60.0, snapshot_path=None):
+    """
+    An InventoryRefresher for the API: re-reading a local CSV export, or
+    fetching the live sheets like the app (starting from its on-disk
+    snapshot, if there is one).
+    """
+    memo = {}
+    if inventory is not None:
+        return InventoryRefresher(fetch=lambda: read_file_source(inventory, memo), interval=interval)
+    cache     = SourceCache()
+    refresher = InventoryRefresher(fetch=lambda: fetch_data(cache=cache, memo=memo),
+                                   interval=interval, jitter=interval / 6)
+    df, meta = load_snapshot(snapshot_path) if snapshot_path and os.path.exists(snapshot_path) else (None, None)
+    if df is not None:
+        refresher.load(df, meta.get("sources", []), meta.get("fetched_at"))
+    return refresher
+
+
+def serve(refresher, host="127.0.0.1", port=API_DEFAULT_PORT):
+    """Load the inventory, start its background refresh and serve the API until interrupted."""
+    if refresher.store.latest() is None:
+        refresher.refresh()
+    refresher.start()
+    uvicorn.run(create_app(PricingService(refresher)), host=host, port=port,
+                log_level="warning", access_log=False)
@@ -0,0 +1,187 @@
+"""
+Command-line quoting: price a file of jobs against an inventory export
+without starting Streamlit.
+
+    python -m counterpro quote inventory.csv jobs.csv > quotes.csv
+    python -m counterpro quote inventory.csv jobs.csv --format json -o quotes.jsonl
+    python -m counterpro serve --inventory inventory.csv --port 8765
+
+The inventory CSV is the same export the app reads from Google Sheets.
+The jobs CSV needs a `sqft` column (finished square feet) and may add
+`sinks` (total sink price in $), `job_id` and `variant` (a Product
+Variant to quote). Jobs with a variant get one quote; jobs without one
+are quoted against every variant the job can be cut from (at most
+FIT_MAX_PIECES serialized slabs), like the app's slab list. Both files
+are read in chunks and quotes are written as each chunk is priced, so
+memory stays flat however long the files are.
+
+`serve` runs the JSON pricing API (see `counterpro.api`) against the live
+sheets, or against a local export with `--inventory`. It is imported
+only when `serve` runs, so quoting never loads the web server.
+"""
+import argparse
+import itertools
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from counterpro.data import iter_inventory_csv
+from counterpro.fit import FitIndex, largest_pieces
+from counterpro.inventory import group_inventory_chunks
+from counterpro.pricing import WASTE_FACTOR, calculate_cost_batch
+
+DEFAULT_CHUNKSIZE = 10_000     # Rows read per chunk from each input file
+QUOTE_FIELDS = [
+    "customer_mat_fab", "customer_ins", "sink_price", "subtotal",
+    "ib_cost", "margin_pct", "total_with_tax",
+]
+SLAB_FIELDS = ["Product Variant", "Brand", "Color", "Thickness", "On Hand Qty"]
+
+
+def _quote_frame(grouped_df, rows, job_ids, sqft, sinks):
+    """Quotes for grouped rows `rows` paired element-wise with the job columns."""
+    pricing = calculate_cost_batch(grouped_df['Unit_Cost'].to_numpy()[rows], sqft, sinks)
+    quotes = grouped_df[SLAB_FIELDS].iloc[rows].reset_index(drop=True)
+    quotes.insert(0, "job_id", job_ids)
+    quotes.insert(len(quotes.columns), "sqft", sqft)
+    for field in QUOTE_FIELDS:
+        quotes[field] = np.round(pricing[field], 2)
+    return quotes
+
+
+def iter_quotes(grouped_df, fit_index, jobs):
+    """
+    Price one chunk of jobs against the grouped inventory. Yields DataFrames
+    of quotes in job order: one per run of jobs naming a variant (priced
+    together), and one per open job, so the output does not depend on
+    where the chunks split.
+    """
+    job_ids = jobs["job_id"].to_numpy()
+    sqft    = jobs["sqft"].to_numpy(dtype=np.float64)
+    sinks   = jobs["sinks"].to_numpy(dtype=np.float64)
+    named   = jobs["variant"].notna().to_numpy()
+
+    rows = np.full(len(jobs), -1)
+    if named.any():
+        rows[named] = pd.Index(grouped_df['Product Variant']).get_indexer(jobs["variant"][named])
+        for job_id in job_ids[named & (rows < 0)]:
+            print(f"counterpro: job {job_id}: variant not in inventory, skipped", file=sys.stderr)
+    found  = rows >= 0
+    quotes = _quote_frame(grouped_df, rows[found], job_ids[found], sqft[found], sinks[found])
+    ends   = np.cumsum(found)   # Quotes for named jobs up to and including each job
+
+    for is_named, run in itertools.groupby(range(len(jobs)), key=lambda idx: named[idx]):
+        run = list(run)
+        if is_named:
+            yield quotes.iloc[ends[run[0]] - found[run[0]]:ends[run[-1]]]
+            continue
+        for idx in run:
+            open_rows = np.flatnonzero(fit_index.reach(sqft[idx] * WASTE_FACTOR))
+            yield _quote_frame(grouped_df, open_rows, job_ids[idx], sqft[idx], sinks[idx])
+
+
+def _read_jobs(source, chunksize):
+    """Jobs CSV in chunks, with optional columns filled in and job ids numbered from 1."""
+    start = 1
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        chunk.columns = chunk.columns.str.strip()
+        if "sqft" not in chunk.columns:
+            raise ValueError("jobs file needs a 'sqft' column")
+        if "job_id" not in chunk.columns:
+            chunk["job_id"] = np.arange(start, start + len(chunk))
+        if "sinks" not in chunk.columns:
+            chunk["sinks"] = 0.0
+        if "variant" not in chunk.columns:
+            chunk["variant"] = None
+        chunk["sinks"] = chunk["sinks"].fillna(0.0)
+        start += len(chunk)
+        yield chunk
+
+
+def write_quotes(frames, out, fmt):
+    """Stream quote frames to `out` as CSV (one header) or JSON Lines. Returns rows written."""
+    written = 0
+    for frame in frames:
+        if frame.empty:
+            continue
+        if fmt == "csv":
+            frame.to_csv(out, index=False, header=written == 0)
+        else:
+            out.write(frame.to_json(orient="records", lines=True))
+        written += len(frame)
+    return written
+
+
+def _keeping_largest_pieces(chunks, pieces):
+    """Pass `chunks` through, folding each one's largest pieces per variant into `pieces[0]`."""
+    for chunk in chunks:
+        found = largest_pieces(chunk)
+        pieces[0] = found if pieces[0] is None else largest_pieces(pd.concat([pieces[0], found]))
+        yield chunk
+
+
+def quote_command(args):
+    pieces     = [None]
+    chunks     = iter_inventory_csv(args.inventory, chunksize=args.chunksize)
+    grouped_df = group_inventory_chunks(_keeping_largest_pieces(chunks, pieces))
+    if grouped_df is None:
+        print("counterpro: inventory file has no 'Product Variant' rows", file=sys.stderr)
+        return 2
+
+    fit_index = FitIndex(pieces[0].reset_index(drop=True), grouped_df)
+    frames = (
+        quotes
+        for jobs in _read_jobs(args.jobs, args.chunksize)
+        for quotes in iter_quotes(grouped_df, fit_index, jobs)
+    )
+    if args.output == "-":
+        write_quotes(frames, sys.stdout, args.format)
+    else:
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            write_quotes(frames, out, args.format)
+    return 0
+
+
+def serve_command(args):
+    from counterpro.api import API_DEFAULT_PORT, make_refresher, serve   # Starlette / uvicorn only when serving
+
+    port      = API_DEFAULT_PORT if args.port is None else args.port
+    refresher = make_refresher(args.inventory, interval=args.refresh, snapshot_path=args.snapshot)
+    print(f"counterpro: serving the pricing API on http://{args.host}:{port}", file=sys.stderr)
+    serve(refresher, host=args.host, port=port)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="counterpro", description="CounterPro pricing tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    quote = commands.add_parser("quote", help="Price a jobs CSV against an inventory CSV.")
+    quote.add_argument("inventory", help="Inventory CSV export (Product Variant, On Hand Qty, ...).")
+    quote.add_argument("jobs", help="Jobs CSV with sqft and optional sinks, job_id, variant.")
+    quote.add_argument("--format", choices=("csv", "json"), default="csv",
+                       help="csv, or json for JSON Lines (one quote per line).")
+    quote.add_argument("-o", "--output", default="-", help="Output file (default: stdout).")
+    quote.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                       help=f"Rows read per chunk (default: {DEFAULT_CHUNKSIZE}).")
+    quote.set_defaults(handler=quote_command)
+
+    server = commands.add_parser("serve", help="Serve prices and inventory search as a local JSON API.")
+    server.add_argument("--inventory", help="Inventory CSV export to serve (default: the live sheets).")
+    server.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1).")
+    server.add_argument("--port", type=int, help="Port (default: 8765).")
+    server.add_argument("--refresh", type=float, default=float(os.environ.get("COUNTERPRO_REFRESH_SECONDS", 60)),
+                        help="Seconds between inventory reloads (default: 60, or COUNTERPRO_REFRESH_SECONDS).")
+    server.add_argument("--snapshot",
+                        default=os.environ.get("COUNTERPRO_SNAPSHOT_PATH", os.path.join(".cache", "inventory.parquet")),
+                        help="App snapshot to start from when serving the live sheets.")
+    server.set_defaults(handler=serve_command)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as exc:
+        print(f"counterpro: {exc}", file=sys.stderr)
+        return 2
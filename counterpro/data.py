@@ -0,0 +1,403 @@
+"""
+Inventory ingestion: download the CSV sources, coerce their numbers and
+parse variants into typed inventory rows.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+import hashlib
+import io
+import re
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import requests
+
+from counterpro.inventory import LOCATION_COLUMN, SERIAL_COLUMNS, UNASSIGNED_LOCATION
+from counterpro.parsing import parse_product_variants
+
+FETCH_MAX_WORKERS     = 4      # Max sheets downloaded in parallel
+FETCH_CONNECT_TIMEOUT = 5.0    # Seconds to establish a connection to one sheet
+FETCH_READ_TIMEOUT    = 20.0   # Seconds to wait for data from one sheet
+FETCH_DEADLINE        = 30.0   # Overall seconds allowed for a full inventory load
+CATEGORY_MAX_RATIO    = 0.5    # Text columns with at most this share of distinct values become categorical
+CSV_BLOCK_SIZE        = 1 << 20  # Bytes pyarrow parses per block when streaming a CSV
+
+NUMERIC_COLUMNS = ['On Hand Qty', 'Serialized On Hand Cost']
+INGEST_COLUMNS  = ['Product Variant', *NUMERIC_COLUMNS, *SERIAL_COLUMNS]   # Plus the location column; nothing else is read
+LOCATION_KEYWORDS = ['location', 'warehouse', 'store', 'site']   # A header with one of these words names the location
+
+# Cells pandas reads as missing; the pyarrow reader is given the same list
+_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+# What pd.to_numeric accepts once '$' and ',' are gone; anything else becomes NaN
+_NUMBER_PATTERN = r'(?i)^\s*[-+]?(?:(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?|inf|infinity|nan)\s*$'
+
+# One of LOCATION_KEYWORDS as a whole word (optionally plural): 'Store ID', 'warehouse_name', not 'Website'
+_LOCATION_WORD_RE = re.compile(rf"(?<![a-z0-9])(?:{'|'.join(LOCATION_KEYWORDS)})s?(?![a-z0-9])", re.IGNORECASE)
+
+DATA_SOURCES = [
+    "https://docs.google.com/spreadsheets/d/e/2PACX-1vSkoSeMuPGqr5-JEBhHO5l0fFYlkfmbMUW-VU8UZEpR0pd4lSeyK74WHE47m1zYMg/pub?output=csv"
+]
+
+
+def _clean_source(df):
+    """Normalise one sheet's columns and coerce its numeric columns. Returns None if unusable."""
+    df.columns = df.columns.str.strip()
+    if 'Product Variant' not in df.columns:
+        return None
+    df['On Hand Qty'] = pd.to_numeric(
+        df['On Hand Qty'].astype(str).str.replace(r'[$,]', '', regex=True),
+        errors='coerce'
+    )
+    df['Serialized On Hand Cost'] = pd.to_numeric(
+        df['Serialized On Hand Cost'].astype(str).str.replace(r'[$,]', '', regex=True),
+        errors='coerce'
+    )
+    return df
+
+
+def location_column(names):
+    """
+    The header (as written) that holds each row's location: 'Location' if
+    present, else the first one that is exactly a LOCATION_KEYWORDS word
+    (any case), else the first one with such a word in it. None if the
+    sheet has no location column.
+    """
+    stripped = [name.strip() for name in names]
+    if LOCATION_COLUMN in stripped:
+        return names[stripped.index(LOCATION_COLUMN)]
+    candidates = [(name, clean) for name, clean in zip(names, stripped) if clean not in INGEST_COLUMNS]
+    for name, clean in candidates:
+        if clean.lower() in LOCATION_KEYWORDS:
+            return name
+    for name, clean in candidates:
+        if _LOCATION_WORD_RE.search(clean):
+            return name
+    return None
+
+
+def _label_locations(df):
+    """Rename the location column to LOCATION_COLUMN and fill it in; sheets without one are UNASSIGNED_LOCATION."""
+    found = location_column(list(df.columns))
+    if found is None:
+        df[LOCATION_COLUMN] = UNASSIGNED_LOCATION
+        return df
+    if found != LOCATION_COLUMN:
+        df = df.rename(columns={found: LOCATION_COLUMN})
+    locations = df[LOCATION_COLUMN].astype("string").str.strip().fillna("")
+    df[LOCATION_COLUMN] = locations.where(locations != "", UNASSIGNED_LOCATION)
+    return df
+
+
+def _parse_numbers(column):
+    """Arrow text column such as '$1,234.50' / '12' / 'n/a' -> float64; unparseable cells are null."""
+    text  = pc.utf8_trim_whitespace(pc.replace_substring_regex(column, pattern=r"[$,]", replacement=""))
+    valid = pc.match_substring_regex(text, _NUMBER_PATTERN)
+    return pc.cast(pc.if_else(valid, text, pa.scalar(None, pa.string())), pa.float64())
+
+
+def _arrow_csv_options(names):
+    """pyarrow read / convert options for an inventory CSV whose header is `names`."""
+    location = location_column(names)
+    wanted   = [name for name in names if name.strip() in INGEST_COLUMNS or name == location]
+    convert = pacsv.ConvertOptions(
+        include_columns=wanted,
+        column_types={name: pa.string() for name in wanted},
+        null_values=_NA_VALUES,
+        strings_can_be_null=True,
+    )
+    return pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE), convert
+
+
+def _typed_frame(table):
+    """Arrow table of text columns -> DataFrame with stripped names and numeric columns parsed."""
+    table = table.rename_columns([name.strip() for name in table.column_names])
+    for name in NUMERIC_COLUMNS:
+        if name in table.column_names:
+            idx   = table.column_names.index(name)
+            table = table.set_column(idx, name, _parse_numbers(table.column(name)))
+    return table.to_pandas()
+
+
+def _csv_header(source):
+    """Column names of a CSV (path, bytes or binary file), without reading the body."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with pacsv.open_csv(source, read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE)) as reader:
+        return reader.schema.names
+
+
+def read_inventory_csv(source, memo=None):
+    """
+    Typed inventory rows from a CSV (path, bytes or binary file). Only
+    INGEST_COLUMNS and the location column are read, with pyarrow, and
+    currency text is parsed straight to float64. Falls back to pandas for
+    files pyarrow rejects.
+    Returns None if there is no 'Product Variant' column.
+    """
+    data = source
+    if not isinstance(source, (bytes, str)):
+        data = source.read()   # pyarrow and the fallback both need to start from the top
+    try:
+        read_options, convert_options = _arrow_csv_options(_csv_header(data))
+        table = pacsv.read_csv(io.BytesIO(data) if isinstance(data, bytes) else data,
+                               read_options=read_options, convert_options=convert_options)
+    except pa.ArrowInvalid:
+        frame = pd.read_csv(io.BytesIO(data) if isinstance(data, bytes) else data,
+                            usecols=lambda name: name.strip() in INGEST_COLUMNS
+                            or _LOCATION_WORD_RE.search(name) is not None)
+        return _prepare_source(frame, memo)
+    return _prepare_typed(_typed_frame(table), memo)
+
+
+def compact_inventory(df):
+    """
+    Shrink a typed inventory in place: repetitive text columns become
+    categoricals and integer columns take the smallest integer dtype.
+    Float columns stay float64 so every price is computed exactly as before.
+    Returns `df`.
+    """
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_integer_dtype(values.dtype):
+            df[col] = pd.to_numeric(values, downcast="integer")
+        elif (
+            (values.dtype == object or pd.api.types.is_string_dtype(values.dtype))
+            and pd.api.types.infer_dtype(values, skipna=True) == "string"
+            and values.nunique() <= CATEGORY_MAX_RATIO * len(values)
+        ):
+            df[col] = values.astype("category")
+    return df
+
+
+def frame_bytes(df, deep=True):
+    """Memory held by `df` in bytes. `deep=False` leaves out categories shared with a parent frame."""
+    return int(df.memory_usage(index=True, deep=deep).sum())
+
+
+def _prepare_source(df, memo=None):
+    """Clean one sheet and turn it into typed, compacted inventory rows. Returns None if unusable."""
+    df = _clean_source(df)
+    if df is None:
+        return None
+    return _prepare_typed(df, memo)
+
+
+def _prepare_typed(df, memo=None):
+    """Inventory rows from a sheet whose numeric columns are already parsed. Returns None if unusable."""
+    if 'Product Variant' not in df.columns:
+        return None
+    df = _label_locations(df[df['On Hand Qty'] > 0].reset_index(drop=True))
+    df['Unit_Cost'] = df['Serialized On Hand Cost'] / df['On Hand Qty']
+    df[['Brand', 'Color', 'Thickness']] = parse_product_variants(df['Product Variant'], memo=memo)
+    return compact_inventory(df)
+
+
+class SourceCache:
+    """
+    Per-source state remembered between refreshes: HTTP validators (ETag /
+    Last-Modified), a SHA-256 of the last payload and the frame built from
+    it. Also counts how often a refresh could skip work.
+    """
+
+    def __init__(self):
+        self.lock     = threading.Lock()
+        self.entries  = {}     # url -> {"etag", "last_modified", "sha256", "size", "frame"}
+        self.combined = None   # (source hashes, concatenated frame) from the last fetch
+        self.stats    = {
+            "not_modified":     0,   # Server answered 304, nothing downloaded
+            "unchanged":        0,   # Downloaded, but bytes hashed the same, nothing parsed
+            "changed":          0,   # Downloaded and re-processed
+            "bytes_downloaded": 0,
+            "bytes_saved":      0,   # Payload bytes a 304 let us skip
+        }
+
+    def count(self, **deltas):
+        with self.lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def get_stats(self):
+        """Copy of the refresh counters, plus hits/misses totals."""
+        with self.lock:
+            stats = dict(self.stats)
+        stats["hits"]   = stats["not_modified"] + stats["unchanged"]
+        stats["misses"] = stats["changed"]
+        return stats
+
+
+def _fetch_source(url, timeout, cache=None, memo=None):
+    """
+    Download and prepare a single CSV source. Runs on a worker thread.
+
+    With a `cache`, sends a conditional request and skips all parsing when
+    the server answers 304 or the payload hashes the same as last time.
+    Returns (frame, payload sha256, cache outcome).
+    """
+    entry   = cache.entries.get(url) if cache is not None else None
+    headers = {}
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = requests.get(url, timeout=timeout, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        cache.count(not_modified=1, bytes_saved=entry["size"])
+        return entry["frame"], entry["sha256"], "not modified"
+    response.raise_for_status()
+
+    payload = response.content
+    digest  = hashlib.sha256(payload).hexdigest()
+    if cache is None:
+        return read_inventory_csv(payload, memo), digest, "fetched"
+
+    cache.count(bytes_downloaded=len(payload))
+    if entry is not None and entry["sha256"] == digest:
+        cache.count(unchanged=1)
+        frame, outcome = entry["frame"], "unchanged"
+    else:
+        cache.count(changed=1)
+        frame, outcome = read_inventory_csv(payload, memo), "changed"
+
+    cache.entries[url] = {
+        "etag":          response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256":        digest,
+        "size":          len(payload),
+        "frame":         frame,
+    }
+    return frame, digest, outcome
+
+
+def fetch_sources(urls, max_workers=FETCH_MAX_WORKERS,
+                  timeout=(FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT),
+                  deadline=FETCH_DEADLINE, cache=None, memo=None):
+    """
+    Fetch every CSV source in parallel on a bounded thread pool.
+
+    Each download gets its own (connect, read) timeout and the whole batch
+    is cut off after `deadline` seconds. Returns the prepared frames that
+    arrived in time (in source order) and a per-source report of dicts with
+    `source`, `status` (ok / skipped / error / timeout), `rows`,
+    `latency_ms`, `error`, `sha256` and `cache` (the conditional-refresh
+    outcome).
+    """
+    if not urls:
+        return [], []
+
+    latencies = {}
+
+    def run(url):
+        started = time.perf_counter()
+        try:
+            result = _fetch_source(url, timeout, cache, memo)
+        except Exception as exc:
+            result = exc
+        latencies[url] = (time.perf_counter() - started) * 1000
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)),
+                                  thread_name_prefix="fetch-source")
+    futures  = [executor.submit(run, url) for url in urls]
+    wait(futures, timeout=deadline)
+    # Don't block on stragglers; their own read timeout will end them
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    frames, report = [], []
+    for url, future in zip(urls, futures):
+        entry = {"source": url, "status": "ok", "rows": 0, "latency_ms": None,
+                 "error": "", "sha256": None, "cache": None}
+        if not future.done():
+            entry["status"] = "timeout"
+            entry["error"]  = f"No response within {deadline:.0f} s"
+        else:
+            entry["latency_ms"] = latencies.get(url)
+            result = future.result()
+            if isinstance(result, Exception):
+                entry["status"] = "error"
+                entry["error"]  = str(result)
+            else:
+                frame, entry["sha256"], entry["cache"] = result
+                if frame is None:
+                    entry["status"] = "skipped"
+                    entry["error"]  = "No 'Product Variant' column"
+                else:
+                    entry["rows"] = len(frame)
+                    frames.append(frame)
+        report.append(entry)
+    return frames, report
+
+
+def fetch_data(urls=None, cache=None, memo=None):
+    """
+    Fetch inventory data from Google Sheets (or `urls`) and build the typed
+    inventory.
+
+    With a `SourceCache`, only sources whose payload changed are re-parsed;
+    if every source is unchanged the previous combined frame is returned
+    as-is. `memo` is the variant parse memo (see `parse_product_variants`).
+    Returns the combined inventory (or None) and the per-source load report.
+    """
+    all_dfs, report = fetch_sources(DATA_SOURCES if urls is None else urls, cache=cache, memo=memo)
+
+    if not all_dfs:
+        return None, report
+
+    key = tuple(entry["sha256"] for entry in report if entry["status"] == "ok")
+    if cache is not None:
+        with cache.lock:
+            if cache.combined is not None and cache.combined[0] == key:
+                return cache.combined[1], report
+
+    if len(all_dfs) == 1:
+        df = all_dfs[0]
+    else:
+        # Categories differ between sources, so the concatenated text comes back as plain strings
+        df = compact_inventory(pd.concat(all_dfs, ignore_index=True))
+    if cache is not None:
+        with cache.lock:
+            cache.combined = (key, df)
+    return df, report
+
+
+def iter_inventory_csv(source, chunksize=50_000, memo=None):
+    """
+    Read a local CSV export (path or binary file) in chunks of about
+    `chunksize` rows and yield each chunk as typed inventory rows. pyarrow
+    streams the file block by block, reading only the ingested columns, so
+    large exports are never held in memory at once, as text or otherwise.
+    Yields nothing if the file has no 'Product Variant' column.
+    """
+    if not isinstance(source, str) and not source.seekable():
+        source = io.BytesIO(source.read())   # The header is read first, so the file must rewind
+    start = None if isinstance(source, str) else source.tell()
+    read_options, convert_options = _arrow_csv_options(_csv_header(source))
+    if start is not None:
+        source.seek(start)
+
+    pending, pending_rows = [], 0
+    with pacsv.open_csv(source, read_options=read_options, convert_options=convert_options) as reader:
+        for batch in reader:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows < chunksize:
+                continue
+            table = pa.Table.from_batches(pending)
+            for offset in range(0, table.num_rows - chunksize + 1, chunksize):
+                prepared = _prepare_typed(_typed_frame(table.slice(offset, chunksize)), memo)
+                if prepared is None:
+                    return
+                yield prepared
+            rest = table.slice(table.num_rows - table.num_rows % chunksize)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows:
+        prepared = _prepare_typed(_typed_frame(pa.Table.from_batches(pending)), memo)
+        if prepared is not None:
+            yield prepared
@@ -0,0 +1,205 @@
+"""
+Slab fitting: which serialized pieces of a variant to pull for a job.
+
+A variant's stock is split over individually serialized slabs, and a job
+can only be cut from a few of them. `FitIndex` answers, for every grouped
+variant at once, whether FIT_MAX_PIECES pieces can cover the material a
+job needs, and for one variant at a time which pieces cover it with the
+least leftover. Set COUNTERPRO_FIT_MAX_PIECES to change the limit; 0 lifts
+it, so a variant is listed whenever its summed stock covers the job and
+the fit only says which pieces to pull. Areas are handled in whole hundredths of a square foot, so
+the search compares integers.
+"""
+import bisect
+import itertools
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from counterpro.inventory import SERIAL_COLUMNS
+
+FIT_MAX_PIECES = int(os.environ.get("COUNTERPRO_FIT_MAX_PIECES", 3)) or None   # Most slabs one job may be cut from (each extra slab adds a seam); None: no limit
+FIT_MAX_NODES  = 20_000   # Search states per (variant, need); past this the best fit found so far is kept
+FIT_MEMO_SIZE  = 100_000  # Solved (variant, need) pairs remembered before the memo is cleared
+
+
+def need_hundredths(min_qty):
+    """Square feet of material -> whole hundredths, rounded up so a fit never falls short."""
+    return math.ceil(round(min_qty * 100, 6))
+
+
+def largest_pieces(df, keep=FIT_MAX_PIECES):
+    """
+    The `keep` largest in-stock pieces of each variant in `df` (Product
+    Variant and On Hand Qty only; every piece if `keep` is None). That is
+    all `FitIndex.reach` looks at, so a streamed inventory can be folded
+    into it chunk by chunk.
+    """
+    pieces = df.loc[df['On Hand Qty'] > 0, ['Product Variant', 'On Hand Qty']]
+    pieces = pieces.sort_values('On Hand Qty', ascending=False, kind="stable")
+    if keep is None:
+        return pieces
+    return pieces.groupby('Product Variant', observed=True, sort=False).head(keep)
+
+
+class Fit:
+    """The pieces chosen for one job: raw row positions, labels, areas and the leftover (sq ft)."""
+
+    __slots__ = ("rows", "labels", "qty", "total", "leftover", "exact")
+
+    def __init__(self, rows, labels, qty, total, leftover, exact):
+        self.rows     = rows
+        self.labels   = labels
+        self.qty      = qty
+        self.total    = total
+        self.leftover = leftover
+        self.exact    = exact   # False if the search budget ran out before it was proven best
+
+
+def _best_subset(pieces, need, max_pieces, max_nodes):
+    """
+    Smallest sum >= `need` of at most `max_pieces` of `pieces` (ints, sorted
+    descending), with fewer pieces breaking ties. Branch and bound over
+    "largest piece taken next", memoised on (first index, picks left,
+    remaining need). Returns ((total, indexes) or None, whether the search
+    finished within `max_nodes` states).
+    """
+    count   = len(pieces)
+    prefix  = list(itertools.accumulate(pieces, initial=0))
+    negated = [-piece for piece in pieces]   # ascending, for bisect
+    memo    = {}
+    nodes   = 0
+
+    def reach(start, left):
+        """Most area `left` pieces from `start` on can cover (the largest ones)."""
+        return prefix[min(start + left, count)] - prefix[start]
+
+    def best(start, left, remaining):
+        nonlocal nodes
+        key = (start, left, remaining)
+        if key in memo:
+            return memo[key]
+        nodes += 1
+        result = None
+        if reach(start, left) >= remaining:
+            # Any set holding a piece >= remaining is no better than the smallest such piece alone
+            covering = bisect.bisect_right(negated, -remaining)
+            if covering - 1 >= start:
+                result = (pieces[covering - 1], (covering - 1,))
+            # Otherwise every piece taken is smaller than what remains; branch on the largest
+            idx, previous, limit = max(start, covering), None, left
+            while idx < count and nodes <= max_nodes:
+                if result is not None and result[0] == remaining:
+                    limit = min(limit, len(result[1]) - 1)   # Only fewer pieces beat an exact cover
+                if limit < 2:
+                    break
+                piece = pieces[idx]
+                if reach(idx, limit) < remaining:
+                    break   # Later pieces are smaller still
+                if piece != previous:   # Equal pieces lead to the same sets
+                    rest = best(idx + 1, limit - 1, remaining - piece)
+                    if rest is not None:
+                        candidate = (piece + rest[0], (idx, *rest[1]))
+                        if result is None or (candidate[0], len(candidate[1])) < (result[0], len(result[1])):
+                            result = candidate
+                previous = piece
+                idx += 1
+        memo[key] = result
+        return result
+
+    found = best(0, max_pieces, need)
+    return found, nodes <= max_nodes
+
+
+class FitIndex:
+    """
+    Serialized pieces per grouped variant, sorted largest first, built once
+    per inventory view. Row positions in its results refer to `grouped_df`
+    (variants) and to `df` (pieces).
+
+    `reach(need)` is vectorized over every variant: the top `max_pieces`
+    pieces (all of them if it is None) decide whether any allowed set covers the need. `best_fit` runs
+    the bounded search for one variant, and `leftovers` runs it for many;
+    both remember each (variant, need) they solve.
+    """
+
+    def __init__(self, df, grouped_df, max_pieces=FIT_MAX_PIECES, max_nodes=FIT_MAX_NODES):
+        self.max_pieces = max_pieces
+        self.max_nodes  = max_nodes
+        self.lock       = threading.Lock()
+        self._memo      = {}   # (grouped row, need) -> (total, piece indexes) or None, exact
+        self._df        = df
+
+        variants = pd.Index(grouped_df['Product Variant'].astype(object))
+        codes    = variants.get_indexer(df['Product Variant'].astype(object))
+        qty      = np.round(df['On Hand Qty'].to_numpy(dtype=np.float64) * 100)
+        usable   = (codes >= 0) & (qty > 0)
+        rows     = np.flatnonzero(usable)
+        order    = np.lexsort((-qty[rows], codes[rows]))
+
+        self._rows   = rows[order]                                  # Raw row of each piece
+        self._qty    = qty[self._rows].astype(np.int64)             # Hundredths of a sq ft, largest first per variant
+        self._indptr = np.searchsorted(codes[self._rows], np.arange(len(variants) + 1))
+
+        # Area the largest max_pieces pieces of each variant cover together
+        starts, counts = self._indptr[:-1], np.diff(self._indptr)
+        self._reach = np.zeros(len(variants), dtype=np.int64)
+        for rank in range(counts.max(initial=0) if max_pieces is None else max_pieces):
+            has = counts > rank
+            self._reach[has] += self._qty[starts[has] + rank]
+
+    def reach(self, min_qty):
+        """Boolean per grouped row: can at most `max_pieces` pieces cover `min_qty` sq ft?"""
+        return self._reach >= need_hundredths(min_qty)
+
+    def _label(self, row):
+        """First serial-like value of raw row `row`, as a string; '' if it has none."""
+        for col in SERIAL_COLUMNS:
+            if col in self._df.columns:
+                value = self._df[col].iat[row]
+                if not pd.isna(value):
+                    return str(value)
+        return ""
+
+    def _solve(self, row, need):
+        key = (row, need)
+        with self.lock:
+            if key in self._memo:
+                return self._memo[key]
+        pieces = self._qty[self._indptr[row]:self._indptr[row + 1]].tolist()
+        solved = _best_subset(pieces, need, self.max_pieces or len(pieces), self.max_nodes)
+        with self.lock:
+            if len(self._memo) >= FIT_MEMO_SIZE:
+                self._memo.clear()
+            self._memo[key] = solved
+        return solved
+
+    def best_fit(self, row, min_qty):
+        """The `Fit` with the least leftover for grouped row `row`, or None if no allowed set covers `min_qty`."""
+        need = need_hundredths(min_qty)
+        found, exact = self._solve(row, need)
+        if found is None:
+            return None
+        total, picks = found
+        pieces = [self._indptr[row] + pick for pick in picks]
+        return Fit(
+            rows=self._rows[pieces].tolist(),
+            labels=[self._label(piece_row) for piece_row in self._rows[pieces].tolist()],
+            qty=(self._qty[pieces] / 100).tolist(),
+            total=total / 100,
+            leftover=(total - need) / 100,
+            exact=exact,
+        )
+
+    def leftovers(self, rows, min_qty):
+        """Best-fit leftover (sq ft) for each grouped row in `rows`; NaN where nothing fits."""
+        need = need_hundredths(min_qty)
+        out  = np.full(len(rows), np.nan)
+        for idx, row in enumerate(np.asarray(rows).tolist()):
+            found, _ = self._solve(row, need)
+            if found is not None:
+                out[idx] = (found[0] - need) / 100
+        return out
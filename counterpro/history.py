@@ -0,0 +1,213 @@
+"""
+Quote history: every generated quote and comparison-tray item, kept in a
+local SQLite database.
+
+Callers never wait on the disk. `QuoteHistory.record` queues the quote and
+a writer thread commits whatever has queued up in one transaction. The
+database runs in WAL mode, so searches read alongside that writer rather
+than behind it. Variant, date, customer and rep are indexed (each paired
+with the date), so searches and re-opening a quote stay index lookups
+however long the history grows.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+HISTORY_BATCH_SIZE  = 500    # Most queued quotes committed in one transaction
+HISTORY_PAGE_SIZE   = 50     # Quotes returned by one search
+HISTORY_BUSY_MS     = 5000   # How long a connection waits on a lock held by another process
+
+log = logging.getLogger("counterpro.history")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id                INTEGER PRIMARY KEY,
+    created_at        REAL NOT NULL,
+    kind              TEXT NOT NULL,
+    variant           TEXT,
+    slab_name         TEXT NOT NULL,
+    location          TEXT,
+    sqft              REAL NOT NULL,
+    total             REAL NOT NULL,
+    customer          TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    rep               TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    inventory_version TEXT,
+    payload           TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quotes_created  ON quotes (created_at);
+CREATE INDEX IF NOT EXISTS quotes_variant  ON quotes (variant, created_at);
+CREATE INDEX IF NOT EXISTS quotes_customer ON quotes (customer, created_at);
+CREATE INDEX IF NOT EXISTS quotes_rep      ON quotes (rep, created_at);
+"""
+
+# Columns stored as-is; everything else in a quote (sinks, pricing) goes into the JSON payload
+_COLUMNS = ("created_at", "kind", "variant", "slab_name", "location", "sqft", "total",
+            "customer", "rep", "inventory_version")
+
+_INSERT = (f"INSERT INTO quotes ({', '.join(_COLUMNS)}, payload) "
+           f"VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})")
+
+_STOP = object()
+
+
+def _like_prefix(text):
+    """LIKE pattern matching values that start with `text` (wildcards in it matched literally)."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _row(quote):
+    """Insert parameters for one quote dict."""
+    payload = {key: value for key, value in quote.items() if key not in _COLUMNS}
+    return (
+        quote.get("created_at") or time.time(),
+        quote["kind"],
+        quote.get("variant"),
+        quote["slab_name"],
+        quote.get("location"),
+        float(quote["sqft"]),
+        float(quote["total"]),
+        (quote.get("customer") or "").strip(),
+        (quote.get("rep") or "").strip(),
+        quote.get("inventory_version"),
+        json.dumps(payload, default=float),
+    )
+
+
+class QuoteHistory:
+    """
+    A quote history database at `path`. A quote is a dict with `kind`
+    ("pdf" or "tray"), `slab_name`, `sqft` and `total`, optionally
+    `variant`, `location`, `customer`, `rep`, `inventory_version` and
+    `created_at`. Any other keys (sinks, pricing) are stored as JSON and
+    come back unchanged from `get`.
+    """
+
+    def __init__(self, path, batch_size=HISTORY_BATCH_SIZE):
+        self.path       = path
+        self.batch_size = batch_size
+        self.lock       = threading.Lock()
+        self.stats      = {"written": 0, "batches": 0, "failed": 0}
+        self._queue     = queue.Queue()
+        self._local     = threading.local()   # One reader connection per thread
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+        self._thread = threading.Thread(target=self._writer, name="quote-history-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=HISTORY_BUSY_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")   # Safe in WAL mode; commits skip the fsync
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ── Writes (queued; committed by the writer thread) ────────────────────
+    def record(self, quote):
+        """Queue one quote for writing and return at once."""
+        self._queue.put(_row(quote))
+
+    def flush(self, timeout=None):
+        """Wait until every quote queued so far is committed. Returns False on timeout."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Commit what is queued and stop the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _writer(self):
+        conn = self._connect()
+        stop = False
+        while not stop:
+            batch, flushes = [], []
+            item = self._queue.get()
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    flushes.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()   # Take whatever else queued up meanwhile
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(conn, batch)
+            for done in flushes:
+                done.set()
+        conn.close()
+
+    def _write(self, conn, batch):
+        try:
+            with conn:
+                conn.executemany(_INSERT, batch)
+        except sqlite3.Error:
+            log.exception("Dropped %d quotes that could not be written to %s", len(batch), self.path)
+            with self.lock:
+                self.stats["failed"] += len(batch)
+            return
+        with self.lock:
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+
+    # ── Reads ──────────────────────────────────────────────────────────────
+    def search(self, text="", variant=None, since=None, until=None, limit=HISTORY_PAGE_SIZE):
+        """
+        Newest quotes first, as dicts without their payload. `text` matches
+        the start of the customer or rep name (any case), `variant` is exact,
+        and `since` / `until` bound `created_at` (Unix seconds, until
+        exclusive).
+        """
+        clauses, params = [], []
+        if text.strip():
+            pattern = _like_prefix(text.strip())
+            clauses.append("(customer LIKE ? ESCAPE '\\' OR rep LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+        if variant is not None:
+            clauses.append("variant = ?")
+            params.append(variant)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows  = self._reader().execute(
+            f"SELECT id, {', '.join(_COLUMNS)} FROM quotes {where} ORDER BY created_at DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, quote_id):
+        """One quote as it was recorded (payload keys merged back in), or None."""
+        row = self._reader().execute("SELECT * FROM quotes WHERE id = ?", (quote_id,)).fetchone()
+        if row is None:
+            return None
+        quote = dict(row)
+        quote.update(json.loads(quote.pop("payload")))
+        return quote
+
+    def count(self):
+        return self._reader().execute("SELECT COUNT(*) FROM quotes").fetchone()[0]
@@ -0,0 +1,465 @@
+"""
+Read-only views over a typed inventory: the per-variant aggregate, the
+search / price / serial indexes built from it, and its per-location
+partitions.
+"""
+import bisect
+import itertools
+import math
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from counterpro.pricing import TAX_RATE, calculate_cost, calculate_cost_batch, unit_cost_range_for_budget
+
+
+SERIAL_COLUMNS = ['Serial Number', 'SKU', 'Item Code', 'Product SKU', 'Serialized Inventory']
+
+LOCATION_COLUMN     = 'Location'     # Where each slab is held; named this way at ingest
+UNASSIGNED_LOCATION = 'Unassigned'   # Location of rows from sheets with no location column, or a blank one
+
+PRICE_GRID_SQFT        = (1, 500)      # Whole finished sq ft covered by a PriceMatrix (the sqft input's range)
+DEFAULT_JOB_SQFT       = 35.0          # Sq ft a new quote starts at; on every PriceMatrix grid, however coarse
+PRICE_MATRIX_MAX_CELLS = 2_000_000     # Variants x sqft steps per matrix (16 MB); bigger catalogs get a coarser grid
+PRICE_MATRIX_CACHE_BYTES = 64_000_000  # Subtotal grids a PriceMatrixCache holds across versions and locations
+_PRICE_MATRIX_BLOCK    = 64            # Grid columns priced per pass, to bound temporary arrays
+GROUP_DECIMALS         = 2             # Sq ft and dollars are exported to the hundredth; summed totals are rounded back to it
+
+_GROUP_AGGREGATES = {
+    'On Hand Qty':              'sum',
+    'Serialized On Hand Cost':  'sum',
+    'Brand':                    'first',
+    'Color':                    'first',
+    'Thickness':                'first',
+}
+
+
+def _grouped_frame(totals):
+    """
+    Per-variant totals indexed by Product Variant -> the grouped inventory
+    frame. Sums are rounded to GROUP_DECIMALS, so float noise from the order
+    they were added in (whole frame or chunk by chunk) never reaches a price.
+    """
+    grouped_df = totals.reset_index()
+    for col in ('On Hand Qty', 'Serialized On Hand Cost'):
+        grouped_df[col] = grouped_df[col].round(GROUP_DECIMALS)
+    grouped_df['Unit_Cost'] = grouped_df['Serialized On Hand Cost'] / grouped_df['On Hand Qty']
+    return grouped_df
+
+
+def group_inventory(df):
+    """Aggregate raw inventory rows into one row per Product Variant."""
+    return _grouped_frame(df.groupby('Product Variant', observed=True).agg(_GROUP_AGGREGATES))
+
+
+def group_inventory_chunks(chunks):
+    """
+    `group_inventory` over an iterable of row chunks, folding each chunk into
+    a running per-variant total so memory depends on the number of variants,
+    not the number of rows.
+    """
+    running = None
+    for chunk in chunks:
+        partial = chunk.groupby('Product Variant', observed=True).agg(_GROUP_AGGREGATES)
+        if running is not None:
+            partial = pd.concat([running, partial]).groupby(level=0).agg(_GROUP_AGGREGATES)
+        running = partial
+    if running is None:
+        return None
+    return _grouped_frame(running)
+
+
+def display_names(grouped_df):
+    """'Brand Color Thickness (qty sf)' labels for grouped rows, built a column at a time."""
+    qty = pd.Series(np.char.mod("%.1f", grouped_df['On Hand Qty'].to_numpy(dtype=np.float64)),
+                    index=grouped_df.index)
+    return (grouped_df['Brand'].astype(str) + " " + grouped_df['Color'].astype(str) + " "
+            + grouped_df['Thickness'].astype(str) + " (" + qty + " sf)")
+
+
+class SearchIndex:
+    """
+    Token / prefix index over the searchable fields of a grouped inventory.
+
+    Each field is lower-cased and split into alphanumeric tokens; postings
+    are stored CSR-style (sorted vocabulary, row offsets) so a prefix query
+    is one binary search and one contiguous slice. Matches inside a token
+    come from a sorted list of token suffixes. `search` returns the row
+    positions whose Color, Brand or Product Variant contains the term,
+    case-insensitively — the same rows as the `str.contains` filter.
+
+    A one-word term is answered by the index alone. Terms with several
+    words or punctuation intersect the postings of their tokens, and the
+    rows left are confirmed with a plain substring check on the lower-cased
+    fields, since the index doesn't record what separates the tokens.
+    """
+
+    FIELDS = ('Color', 'Brand', 'Product Variant')
+    _TOKEN_RE = re.compile(r'[^\W_]+')
+    _MEMO_SIZE = 64
+    _FIELD_SEP = "\x00"   # Between fields in the lower-cased text, so no match spans two
+
+    def __init__(self, grouped_df):
+        self.n_rows  = len(grouped_df)
+        self._fields = [grouped_df[col].reset_index(drop=True) for col in self.FIELDS]
+
+        # Lower-casing only mirrors case-insensitive regex matching for ASCII,
+        # so rows with other text are always checked with a real scan.
+        texts = [field.astype(object).where(field.map(type) == str) for field in self._fields]
+        ascii_ok = np.ones(self.n_rows, dtype=bool)
+        for text in texts:
+            ascii_ok &= text.fillna("").map(str.isascii).to_numpy(dtype=bool)
+        self._other_rows = np.flatnonzero(~ascii_ok)
+        self._ascii_rows = np.flatnonzero(ascii_ok)
+
+        # Every row's fields lower-cased into one string (empty for rows the scan handles);
+        # row r is self._text[self._starts[r]:self._starts[r + 1]]
+        fields  = [text[ascii_ok].fillna("").str.lower() for text in texts]
+        lowered = np.full(self.n_rows, "", dtype=object)
+        lowered[ascii_ok] = [self._FIELD_SEP.join(parts) for parts in zip(*(field.tolist() for field in fields))]
+        lowered = lowered.tolist()
+        self._text   = "".join(lowered)
+        self._starts = [0, *itertools.accumulate(map(len, lowered))]
+
+        tokens = pd.concat([field.str.findall(self._TOKEN_RE).explode().dropna() for field in fields])
+        pairs = (
+            pd.DataFrame({"token": tokens.to_numpy(dtype=object), "row": tokens.index.to_numpy()})
+              .drop_duplicates()
+              .sort_values(["token", "row"], kind="stable")
+        )
+        vocab, starts = np.unique(pairs["token"].to_numpy(dtype=object), return_index=True)
+        self._vocab    = list(vocab)
+        self._indptr   = np.append(starts, len(pairs)).astype(np.int64)
+        self._postings = pairs["row"].to_numpy(dtype=np.int64)
+
+        # Every proper suffix of every token -> token id, for matches inside a token
+        suffixes = sorted(
+            (token[i:], token_id)
+            for token_id, token in enumerate(self._vocab)
+            for i in range(1, len(token))
+        )
+        self._suffixes       = [suffix for suffix, _ in suffixes]
+        self._suffix_tokens  = np.array([token_id for _, token_id in suffixes], dtype=np.int64)
+        self._memo = {}
+
+    @staticmethod
+    def _prefix_range(sorted_keys, prefix):
+        lo = bisect.bisect_left(sorted_keys, prefix)
+        hi = bisect.bisect_left(sorted_keys, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        return lo, hi
+
+    def _rows_mask(self, token_ids):
+        """Boolean row mask for the union of the postings of `token_ids`."""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        starts  = self._indptr[token_ids]
+        lengths = self._indptr[np.asarray(token_ids) + 1] - starts
+        total   = int(lengths.sum())
+        if total:
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            mask[self._postings[offsets + np.arange(total)]] = True
+        return mask
+
+    def _prefix_mask(self, token):
+        """Rows with a token starting with `token`."""
+        lo, hi = self._prefix_range(self._vocab, token)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self._postings[self._indptr[lo]:self._indptr[hi]]] = True
+        return mask
+
+    def _contains_mask(self, token):
+        """Rows with a token containing `token` anywhere."""
+        lo, hi = self._prefix_range(self._suffixes, token)
+        mask = self._prefix_mask(token)
+        if hi > lo:
+            mask |= self._rows_mask(np.unique(self._suffix_tokens[lo:hi]))
+        return mask
+
+    def _scan(self, term, rows):
+        """The original substring filter, applied to the given rows only."""
+        safe_term = re.escape(term)
+        hits = np.zeros(len(rows), dtype=bool)
+        for field in self._fields:
+            hits |= field.iloc[rows].str.contains(safe_term, case=False, na=False).to_numpy(dtype=bool)
+        return rows[hits]
+
+    def _confirm(self, query, rows):
+        """The rows of `rows` (all ASCII) whose lower-cased fields contain lower-case ASCII `query`."""
+        find, starts = self._text.find, self._starts
+        return np.array([row for row in rows.tolist() if find(query, starts[row], starts[row + 1]) >= 0],
+                        dtype=np.int64)
+
+    def search(self, term):
+        """Sorted row positions matching `term`."""
+        rows = self._memo.get(term)   # One lookup: another thread may clear the memo at any time
+        if rows is not None:
+            return rows
+
+        query  = term.lower()
+        tokens = self._TOKEN_RE.findall(query)
+        if not query or not query.isascii() or self._FIELD_SEP in query:
+            rows = self._scan(term, np.arange(self.n_rows))
+        else:
+            if tokens == [query]:
+                # Plain keyword: any token containing it is an exact match
+                rows = np.flatnonzero(self._contains_mask(query))
+            elif not tokens:
+                # Only punctuation / spaces: nothing to look up
+                rows = self._confirm(query, self._ascii_rows)
+            else:
+                # Several tokens or punctuation: narrow with the index, then confirm.
+                # Only the first token can start mid-token; the rest start a token.
+                starts_mid_token = query[0] == tokens[0][0]
+                mask = self._contains_mask(tokens[0]) if starts_mid_token else self._prefix_mask(tokens[0])
+                for token in tokens[1:]:
+                    mask &= self._prefix_mask(token)
+                rows = self._confirm(query, np.flatnonzero(mask))
+            if len(self._other_rows):
+                rows = np.union1d(rows, self._scan(term, self._other_rows))
+
+        if len(self._memo) >= self._MEMO_SIZE:
+            self._memo.clear()
+        self._memo[term] = rows
+        return rows
+
+
+class PriceIndex:
+    """
+    Grouped inventory rows sorted by Unit_Cost, for O(log n) budget queries.
+
+    Because the customer total is monotonic in unit cost, the rows inside a
+    budget form one contiguous run of the sorted order; `budget_rows` finds
+    it with `unit_cost_range_for_budget` plus a binary search and confirms
+    the edges with forward pricing. The slider bounds for the rows a job
+    can be cut from are the first and last of them in that same order.
+    """
+
+    def __init__(self, grouped_df):
+        unit_cost = grouped_df['Unit_Cost'].to_numpy(dtype=np.float64)
+
+        priced = np.flatnonzero(~np.isnan(unit_cost))
+        self.order     = priced[np.argsort(unit_cost[priced], kind="stable")]
+        self.sorted_uc = unit_cost[self.order]
+
+    @staticmethod
+    def _total(unit_cost, sqft, sink_price):
+        return calculate_cost(unit_cost, sqft, sink_price)['total_with_tax']
+
+    def budget_rows(self, budget_min, budget_max, sqft, sink_price=0.0):
+        """Row positions whose total (incl. tax) is within the budget, in ascending price order."""
+        sorted_uc, n = self.sorted_uc, len(self.sorted_uc)
+        if sqft <= 0:
+            totals = calculate_cost_batch(sorted_uc, sqft, sink_price)['total_with_tax']
+            return self.order[(totals >= budget_min) & (totals <= budget_max)]
+
+        uc_lo, uc_hi = unit_cost_range_for_budget(budget_min, budget_max, sqft, sink_price)
+        lo = int(np.searchsorted(sorted_uc, uc_lo, side="left"))
+        hi = int(np.searchsorted(sorted_uc, uc_hi, side="right"))
+
+        # Nudge each edge until forward pricing agrees; steps jump over equal unit costs
+        while lo > 0 and self._total(sorted_uc[lo - 1], sqft, sink_price) >= budget_min:
+            lo = int(np.searchsorted(sorted_uc, sorted_uc[lo - 1], side="left"))
+        while lo < n and self._total(sorted_uc[lo], sqft, sink_price) < budget_min:
+            lo = int(np.searchsorted(sorted_uc, sorted_uc[lo], side="right"))
+        while hi < n and self._total(sorted_uc[hi], sqft, sink_price) <= budget_max:
+            hi = int(np.searchsorted(sorted_uc, sorted_uc[hi], side="right"))
+        while hi > lo and self._total(sorted_uc[hi - 1], sqft, sink_price) > budget_max:
+            hi = int(np.searchsorted(sorted_uc, sorted_uc[hi - 1], side="left"))
+        return self.order[lo:max(lo, hi)]
+
+    def price_bounds(self, passed, sqft, sink_price=0.0):
+        """
+        (lowest, highest) total among the rows where boolean `passed` (one
+        entry per grouped row, e.g. `FitIndex.reach`) is set, or None if no
+        such row has a price.
+        """
+        hits = np.flatnonzero(passed[self.order])
+        if not len(hits):
+            return None
+        return (self._total(self.sorted_uc[hits[0]], sqft, sink_price),
+                self._total(self.sorted_uc[hits[-1]], sqft, sink_price))
+
+
+class PriceMatrix:
+    """
+    Slab subtotal (before sinks and tax) of every grouped row at every whole
+    sq ft in PRICE_GRID_SQFT, priced once with `calculate_cost_batch`.
+
+    A customer total is then one lookup plus the sink add and tax multiply
+    `calculate_cost` itself does, so it is bit-for-bit the same number.
+    Catalogs too big for PRICE_MATRIX_MAX_CELLS get every k-th sq ft,
+    counted from `anchor` so the default job size stays on the grid; any
+    sq ft off the grid is priced directly.
+    """
+
+    def __init__(self, grouped_df, sqft_range=PRICE_GRID_SQFT, max_cells=PRICE_MATRIX_MAX_CELLS,
+                 anchor=DEFAULT_JOB_SQFT):
+        first, last = sqft_range
+        stride      = max(1, math.ceil(len(grouped_df) * (last - first + 1) / max_cells))
+        start       = first + (int(anchor) - first) % stride
+        self.sqft   = np.arange(start, last + 1, stride, dtype=np.float64)
+        self._unit_cost = grouped_df['Unit_Cost'].to_numpy(dtype=np.float64)
+        self._column    = {sqft: idx for idx, sqft in enumerate(self.sqft.tolist())}
+
+        self.slab_subtotal = np.empty((len(self._unit_cost), len(self.sqft)))
+        for start in range(0, len(self.sqft), _PRICE_MATRIX_BLOCK):
+            block = self.sqft[start:start + _PRICE_MATRIX_BLOCK]
+            self.slab_subtotal[:, start:start + len(block)] = calculate_cost_batch(
+                self._unit_cost[:, None], block[None, :])['slab_subtotal']
+
+    def column(self, sqft):
+        """Grid column of `sqft`, or None if it is off the grid."""
+        return self._column.get(float(sqft))
+
+    def totals(self, rows, sqft, sink_price=0.0):
+        """Customer totals (incl. tax) of grouped `rows` at `sqft`, as `calculate_cost` would give them."""
+        col = self.column(sqft)
+        if col is None:
+            return calculate_cost_batch(self._unit_cost[rows], sqft, sink_price)['total_with_tax']
+        return (self.slab_subtotal[rows, col] + np.float64(sink_price)) * (1 + TAX_RATE)
+
+    def curve(self, row, sink_price=0.0):
+        """(grid sq ft, customer totals) for one grouped row, for a price vs. sq ft chart."""
+        return self.sqft, (self.slab_subtotal[row] + np.float64(sink_price)) * (1 + TAX_RATE)
+
+
+class PriceMatrixCache:
+    """
+    LRU of PriceMatrix objects bounded by the bytes of their subtotal grids
+    rather than by count, so a few large catalogs viewed at several
+    locations cannot pin hundreds of MB. The most recent matrix is always
+    kept, even if it alone is over `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=PRICE_MATRIX_CACHE_BYTES):
+        self.lock      = threading.Lock()
+        self.max_bytes = max_bytes
+        self.entries   = OrderedDict()
+        self.nbytes    = 0
+
+    def get(self, key):
+        """The matrix stored under `key`, or None."""
+        with self.lock:
+            matrix = self.entries.get(key)
+            if matrix is not None:
+                self.entries.move_to_end(key)
+            return matrix
+
+    def put(self, key, matrix):
+        """Store `matrix` under `key`, dropping the least recently used ones over `max_bytes`."""
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.slab_subtotal.nbytes
+            self.entries[key] = matrix
+            self.nbytes += matrix.slab_subtotal.nbytes
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, dropped = self.entries.popitem(last=False)
+                self.nbytes -= dropped.slab_subtotal.nbytes
+
+
+class SerialIndex:
+    """
+    Serial numbers and raw row positions per Product Variant, built once per
+    inventory so selecting a slab is a dictionary lookup.
+
+    Each variant takes its serials from the first of SERIAL_COLUMNS that
+    holds any value for it, in row order with duplicates dropped.
+    """
+
+    def __init__(self, df, columns=SERIAL_COLUMNS):
+        codes, variants = pd.factorize(df['Product Variant'])
+        variants = variants.tolist()
+        order  = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(variants) + 1))
+        self._order  = order
+        self._slices = dict(zip(variants, zip(bounds[:-1].tolist(), bounds[1:].tolist())))
+
+        # Serial column per variant: first candidate with any value for it
+        self.columns = [col for col in columns if col in df.columns]
+        chosen = np.full(len(variants), -1)
+        for col_idx in reversed(range(len(self.columns))):
+            present = df[self.columns[col_idx]].notna().to_numpy() & (codes >= 0)
+            has_any = np.bincount(codes[present], minlength=len(variants)) > 0
+            chosen[has_any] = col_idx
+
+        parts = []
+        for col_idx, col in enumerate(self.columns):
+            values = df[col]
+            keep   = values.notna().to_numpy() & (codes >= 0)
+            keep[keep] = chosen[codes[keep]] == col_idx
+            if keep.any():
+                parts.append(pd.DataFrame({"code": codes[keep], "serial": values[keep].astype(object).map(str).to_numpy(dtype=object)}))
+        self._serials = {}
+        if parts:
+            serials = pd.concat(parts, ignore_index=True).drop_duplicates()
+            serials = serials.sort_values("code", kind="stable")
+            code    = serials["code"].to_numpy()
+            values  = serials["serial"].tolist()
+            starts  = np.flatnonzero(np.r_[True, code[1:] != code[:-1]])
+            stops   = np.r_[starts[1:], len(code)]
+            for first, start, stop in zip(code[starts].tolist(), starts.tolist(), stops.tolist()):
+                self._serials[variants[first]] = values[start:stop]
+
+    def serials(self, variant):
+        """Serial numbers (as strings) for `variant`; empty if it has none."""
+        return self._serials.get(variant, [])
+
+    def rows(self, variant):
+        """Positions of `variant`'s raw rows in the indexed frame, in order."""
+        start, stop = self._slices.get(variant, (0, 0))
+        return self._order[start:stop]
+
+
+class InventoryView:
+    """
+    The grouped rows of one location (or of every location) with their
+    price index, and the positions of the raw rows they were grouped from.
+    """
+
+    def __init__(self, grouped_df, rows=None):
+        self.grouped_df  = grouped_df
+        self.rows        = rows   # Positions in the version's raw rows; None for all of them
+        self.price_index = PriceIndex(grouped_df)
+
+
+class LocationPartitions:
+    """
+    An inventory version split by LOCATION_COLUMN, with an InventoryView per
+    location plus a combined view of every location.
+
+    Raw rows are aggregated once, by (location, variant). Each location's
+    grouped rows are a slice of that, and the combined view folds the
+    per-location totals together (at most one row per location and
+    variant) instead of going back to the raw rows. Frames without a
+    location column form a single UNASSIGNED_LOCATION partition.
+    """
+
+    def __init__(self, df):
+        if LOCATION_COLUMN in df.columns:
+            codes, names = pd.factorize(df[LOCATION_COLUMN], sort=True)
+        else:
+            codes, names = np.zeros(len(df), dtype=np.intp), [UNASSIGNED_LOCATION]
+        self.locations = [str(name) for name in names]
+
+        totals = df.groupby([codes, 'Product Variant'], observed=True).agg(_GROUP_AGGREGATES)
+        order  = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(self.locations) + 1))
+
+        if len(self.locations) == 1:
+            self.combined = InventoryView(_grouped_frame(totals.droplevel(0)))
+            self._views   = {self.locations[0]: self.combined}
+            return
+
+        self._views = {
+            location: InventoryView(_grouped_frame(totals.xs(code, level=0)), order[bounds[code]:bounds[code + 1]])
+            for code, location in enumerate(self.locations)
+        }
+        per_variant   = totals.droplevel(0).groupby(level=0, observed=True).agg(_GROUP_AGGREGATES)
+        self.combined = InventoryView(_grouped_frame(per_variant))
+
+    def view(self, location=None):
+        """The InventoryView for `location`, or the combined view for None."""
+        return self.combined if location is None else self._views[location]
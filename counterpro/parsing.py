@@ -0,0 +1,98 @@
+"""
+Product Variant parsing: split a raw variant string into Brand, Color and
+Thickness, one string at a time or a whole column at once.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+_VARIANT_ID_PREFIX_RE = re.compile(r'^\d+\s*-\s*')
+_VARIANT_BRAND_RE     = re.compile(r'^([A-Za-z\s&]+)')
+_VARIANT_THICKNESS_RE = re.compile(r'(\d+\.?\d*cm)', re.IGNORECASE)
+_VARIANT_PARENS_RE    = re.compile(r'\([^)]*\)')
+_VARIANT_HASHTAG_RE   = re.compile(r'#\S+')
+_VARIANT_CM_RE        = re.compile(r'\d+\.?\d*cm', re.IGNORECASE)
+_WHITESPACE_RE        = re.compile(r'\s+')
+
+VARIANT_MEMO_MAX_ENTRIES = 100_000   # Reset the parse memo past this many distinct variants
+
+
+def parse_product_variant(variant_str):
+    """Parse Product Variant to extract Brand, Color, and Thickness."""
+    try:
+        cleaned = _VARIANT_ID_PREFIX_RE.sub('', str(variant_str))
+
+        brand_match = _VARIANT_BRAND_RE.match(cleaned)
+        brand = brand_match.group(1).strip() if brand_match else "Unknown"
+
+        thickness_match = _VARIANT_THICKNESS_RE.search(cleaned)
+        thickness = thickness_match.group(1) if thickness_match else ""
+
+        color_str = _VARIANT_PARENS_RE.sub('', cleaned)
+        color_str = _VARIANT_HASHTAG_RE.sub('', color_str)
+        color_str = _VARIANT_CM_RE.sub('', color_str)
+        color_str = _WHITESPACE_RE.sub(' ', color_str).strip()
+        if brand in color_str:
+            color_str = color_str.replace(brand, '').strip()
+        color = color_str if color_str else "Unknown"
+
+        return brand, color, thickness
+    except (ValueError, AttributeError, TypeError):
+        return "Unknown", str(variant_str), ""
+
+
+def _parse_variant_strings(variants):
+    """
+    Vectorized equivalent of `parse_product_variant` over a list of strings.
+    Returns a list of (brand, color, thickness) tuples in input order.
+    """
+    cleaned = pd.Series(variants, dtype=object).str.replace(_VARIANT_ID_PREFIX_RE, '', regex=True)
+
+    brands      = cleaned.str.extract(_VARIANT_BRAND_RE, expand=False).str.strip().fillna("Unknown")
+    thicknesses = cleaned.str.extract(_VARIANT_THICKNESS_RE, expand=False).fillna("")
+    colors      = (
+        cleaned.str.replace(_VARIANT_PARENS_RE, '', regex=True)
+               .str.replace(_VARIANT_HASHTAG_RE, '', regex=True)
+               .str.replace(_VARIANT_CM_RE, '', regex=True)
+               .str.replace(_WHITESPACE_RE, ' ', regex=True)
+               .str.strip()
+    )
+
+    # Brand removal compares two columns row by row, so it stays a comprehension
+    parsed = []
+    for brand, color, thickness in zip(brands, colors, thicknesses):
+        if brand in color:
+            color = color.replace(brand, '').strip()
+        parsed.append((brand, color if color else "Unknown", thickness))
+    return parsed
+
+
+def parse_product_variants(variants, memo=None):
+    """
+    Parse a whole Product Variant column into Brand / Color / Thickness.
+
+    Each distinct variant string is parsed once; results are kept in `memo`
+    (a dict keyed by the variant string) so later calls only parse variants
+    they have not seen before. Output matches `parse_product_variant` row
+    for row.
+    """
+    if memo is None:
+        memo = {}
+    elif len(memo) > VARIANT_MEMO_MAX_ENTRIES:
+        memo.clear()
+
+    codes, uniques = pd.factorize(variants)
+    keys = [str(value) for value in uniques]
+    missing_values = codes < 0
+    if missing_values.any():
+        # factorize folds None / NaN / NA together, but the row parser sees each one's own str()
+        na_keys, na_codes = np.unique([str(value) for value in variants[missing_values]], return_inverse=True)
+        codes[missing_values] = len(keys) + na_codes
+        keys += na_keys.tolist()
+    missing = [key for key in keys if key not in memo]
+    if missing:
+        memo.update(zip(missing, _parse_variant_strings(missing)))
+
+    parsed = pd.DataFrame([memo[key] for key in keys], columns=['Brand', 'Color', 'Thickness'])
+    return parsed.take(codes).set_axis(variants.index)
@@ -0,0 +1,248 @@
+"""
+Quote PDF rendering.
+
+Lives outside `app.py` so it can be imported by worker processes: the
+Streamlit script can't be pickled or re-imported, but this module can.
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import io
+import multiprocessing
+import threading
+import time
+import zipfile
+
+from fpdf import FPDF
+
+from counterpro.pricing import TAX_RATE
+
+QUOTE_VALIDITY_DAYS  = 30      # Number of days a generated quote is valid
+QUOTE_PDF_CACHE_SIZE = 128     # Rendered quote PDFs kept in memory (LRU)
+
+
+def _pdf_safe(text: str) -> str:
+    """
+    Strip characters outside latin-1 (e.g. emoji, em-dashes) so fpdf2's
+    built-in Helvetica font doesn't raise FPDFUnicodeEncodingException.
+    Replace common typographic chars with ASCII equivalents first, then
+    silently drop anything that still can't encode.
+    """
+    replacements = {
+        "\u2014": "-",   # em dash  —
+        "\u2013": "-",   # en dash  –
+        "\u00d7": "x",   # multiplication sign ×  (already latin-1, but keep explicit)
+    }
+    for orig, repl in replacements.items():
+        text = text.replace(orig, repl)
+    # Drop everything outside latin-1 (emoji, etc.)
+    return text.encode("latin-1", errors="ignore").decode("latin-1")
+
+
+def generate_quote_pdf(slab_name, sqft, sinks, pricing, quote_date=None,
+                       tax_rate=TAX_RATE, validity_days=QUOTE_VALIDITY_DAYS):
+    """Generate a basic quote PDF using fpdf2, dated `quote_date` (default: today). Returns bytes."""
+    quote_date = quote_date or date.today()
+    pdf = FPDF()
+    pdf.add_page()
+
+    # Header
+    pdf.set_font("Helvetica", "B", 20)
+    pdf.set_fill_color(79, 70, 229)   # Indigo brand colour
+    pdf.set_text_color(255, 255, 255)
+    pdf.cell(0, 14, "CounterPro - Customer Quote", new_x="LMARGIN", new_y="NEXT", align="C", fill=True)
+    pdf.ln(4)
+
+    # Reset colours for body
+    pdf.set_text_color(30, 41, 59)
+
+    # Date
+    pdf.set_font("Helvetica", size=9)
+    pdf.set_text_color(100, 116, 139)
+    pdf.cell(0, 6, f"Generated: {quote_date.strftime('%B %d, %Y')}", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(4)
+
+    # Section: Slab
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.set_text_color(30, 41, 59)
+    pdf.cell(0, 8, "SLAB DETAILS", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_draw_color(226, 232, 240)
+    pdf.line(pdf.get_x(), pdf.get_y(), pdf.get_x() + 180, pdf.get_y())
+    pdf.ln(2)
+
+    pdf.set_font("Helvetica", size=10)
+    pdf.cell(50, 7, "Material:", new_x="RIGHT", new_y="TOP")
+    pdf.set_font("Helvetica", "B", 10)
+    pdf.multi_cell(0, 7, _pdf_safe(slab_name))
+    pdf.set_font("Helvetica", size=10)
+    pdf.cell(50, 7, "Square Footage:", new_x="RIGHT", new_y="TOP")
+    pdf.set_font("Helvetica", "B", 10)
+    pdf.cell(0, 7, f"{sqft:.1f} sq ft", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(4)
+
+    # Section: Sinks
+    if sinks:
+        pdf.set_font("Helvetica", "B", 11)
+        pdf.set_text_color(30, 41, 59)
+        pdf.cell(0, 8, "SINKS", new_x="LMARGIN", new_y="NEXT")
+        pdf.line(pdf.get_x(), pdf.get_y(), pdf.get_x() + 180, pdf.get_y())
+        pdf.ln(2)
+        pdf.set_font("Helvetica", size=10)
+        for sink in sinks:
+            line_total = sink['price'] * sink['quantity']
+            # _pdf_safe strips emoji prefixes and replaces em/en dashes
+            sink_label = _pdf_safe(sink['type'])
+            pdf.cell(0, 6,
+                     f"  {sink_label}  x{sink['quantity']}  -  ${line_total:,.2f}",
+                     new_x="LMARGIN", new_y="NEXT")
+        pdf.ln(4)
+
+    # Section: Pricing summary
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.set_text_color(30, 41, 59)
+    pdf.cell(0, 8, "PRICING SUMMARY", new_x="LMARGIN", new_y="NEXT")
+    pdf.line(pdf.get_x(), pdf.get_y(), pdf.get_x() + 180, pdf.get_y())
+    pdf.ln(2)
+
+    pdf.set_font("Helvetica", size=10)
+    tax_label = f"GST ({tax_rate * 100:g}%)"
+    rows = [
+        ("Material & Fabrication",  f"${pricing['customer_mat_fab']:,.2f}"),
+        ("Installation",             f"${pricing['customer_ins']:,.2f}"),
+        ("Sinks",                    f"${pricing['sink_price']:,.2f}"),
+        ("Subtotal",                 f"${pricing['subtotal']:,.2f}"),
+        (tax_label,                  f"${pricing['subtotal'] * tax_rate:,.2f}"),
+    ]
+    col_w = 90
+    for label, value in rows:
+        pdf.cell(col_w, 7, label, new_x="RIGHT", new_y="TOP")
+        pdf.cell(0, 7, value, new_x="LMARGIN", new_y="NEXT", align="R")
+
+    # Total — highlighted row
+    pdf.ln(2)
+    pdf.set_fill_color(79, 70, 229)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Helvetica", "B", 12)
+    pdf.cell(col_w, 9, "TOTAL (incl. GST)", fill=True, new_x="RIGHT", new_y="TOP")
+    pdf.cell(0,    9, f"${pricing['total_with_tax']:,.2f}", fill=True,
+             align="R", new_x="LMARGIN", new_y="NEXT")
+
+    # Footer
+    pdf.ln(10)
+    pdf.set_text_color(148, 163, 184)
+    pdf.set_font("Helvetica", "I", 8)
+    pdf.cell(0, 5, f"This quote is valid for {validity_days} days. Prices exclude installation site preparation.",
+             new_x="LMARGIN", new_y="NEXT", align="C")
+
+    return bytes(pdf.output())
+
+
+def _render_quote(quote):
+    """Process-pool entry point: render one quote dict with `generate_quote_pdf`'s arguments."""
+    return generate_quote_pdf(**quote)
+
+
+def make_render_pool(max_workers):
+    """
+    Process pool for batch rendering. Uses the spawn start method so workers
+    never inherit the web server's threads or locks.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def render_quotes(quotes, executor=None):
+    """
+    Render a batch of quote dicts (keyword arguments for `generate_quote_pdf`).
+    Uses `executor` when given, otherwise renders inline. Returns PDF bytes
+    in input order.
+    """
+    quotes = list(quotes)
+    if executor is None:
+        return [_render_quote(quote) for quote in quotes]
+    return list(executor.map(_render_quote, quotes))
+
+
+def zip_quotes(named_pdfs):
+    """Pack (file name, PDF bytes) pairs into one zip archive. Returns bytes."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_name, pdf_bytes in named_pdfs:
+            archive.writestr(file_name, pdf_bytes)
+    return buffer.getvalue()
+
+
+class QuotePdfCache:
+    """
+    Bounded LRU of rendered quote PDFs keyed on (slab label, sqft, sinks,
+    pricing, quote date), with hit/miss and render-time counters. A quote
+    without a `quote_date` is dated today, so yesterday's PDF is never
+    served with yesterday's date.
+    """
+
+    def __init__(self, max_entries=QUOTE_PDF_CACHE_SIZE):
+        self.lock        = threading.Lock()
+        self.max_entries = max_entries
+        self.entries     = OrderedDict()
+        self.stats       = {"hits": 0, "misses": 0, "render_ms_total": 0.0, "last_render_ms": None}
+
+    @staticmethod
+    def _key(slab_name, sqft, sinks, pricing, quote_date):
+        return (
+            slab_name,
+            float(sqft),
+            tuple((s['type'], s['price'], s['quantity']) for s in sinks),
+            tuple(sorted(pricing.items())),
+            quote_date,
+        )
+
+    def get(self, slab_name, sqft, sinks, pricing, quote_date=None):
+        """Quote PDF bytes, rendered with `generate_quote_pdf` only on a cache miss."""
+        quote = {"slab_name": slab_name, "sqft": sqft, "sinks": sinks, "pricing": pricing, "quote_date": quote_date}
+        return self.get_many([quote])[0]
+
+    def get_many(self, quotes, executor=None):
+        """
+        PDF bytes for each quote dict (slab_name, sqft, sinks, pricing and
+        optionally quote_date), in order. Cache misses are rendered as one
+        batch, on `executor` if given.
+        """
+        today   = date.today()   # One date for the whole batch, used for the key and the render alike
+        quotes  = [{**quote, "quote_date": quote.get("quote_date") or today} for quote in quotes]
+        keys    = [self._key(**quote) for quote in quotes]
+        results = [None] * len(quotes)
+        missing = []
+        with self.lock:
+            for idx, key in enumerate(keys):
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    results[idx] = self.entries[key]
+                else:
+                    missing.append(idx)
+        if not missing:
+            return results
+
+        jobs = [quotes[idx] for idx in missing]
+        started   = time.perf_counter()
+        rendered  = render_quotes(jobs, executor)
+        render_ms = (time.perf_counter() - started) * 1000
+
+        with self.lock:
+            self.stats["misses"] += len(missing)
+            self.stats["render_ms_total"] += render_ms
+            self.stats["last_render_ms"] = render_ms / len(missing)
+            for idx, pdf_bytes in zip(missing, rendered):
+                results[idx] = pdf_bytes
+                self.entries[keys[idx]] = pdf_bytes
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return results
+
+    def get_stats(self):
+        """Copy of the counters, plus hit rate and mean render time."""
+        with self.lock:
+            stats = dict(self.stats, size=len(self.entries))
+        requests_made = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / requests_made if requests_made else None
+        stats["avg_render_ms"] = stats["render_ms_total"] / stats["misses"] if stats["misses"] else None
+        return stats
@@ -0,0 +1,129 @@
+"""
+Customer pricing: the cost constants, sink price list and the scalar /
+column-wise / inverse pricing functions.
+"""
+import numpy as np
+
+INSTALL_COST_PER_SQFT    = 21.0
+FABRICATION_COST_PER_SQFT = 16.0
+WASTE_FACTOR  = 1.20
+TAX_RATE      = 0.05
+
+# Pricing Controls
+IB_MATERIAL_MARKUP    = 1.05   # 5 % markup on raw material for IB
+IB_MIN_MARGIN         = 0.18   # Ensure IB is at least 18 % margin over raw costs
+IB_TO_CUSTOMER_MARKUP = 1.15   # Customer Mat+Fab is 15 % higher than IB
+
+
+# Sink price list (emojis added for quick visual scanning)
+SINK_OPTIONS = {
+    "✅ In-Stock/No Sink": 0.00,
+    # ── Kitchen Sinks – Standard Radius ──────────────────────────────
+    "🥣 50/50 Undermount Standard Radius - SKU 83742 (16 ga)": 300.00,
+    "🥣 Large Single Bowl Undermount Standard Radius - SKU 83744 (16 ga)": 325.00,
+    "🥣 Medium Single Bowl Undermount Standard Radius - SKU 83745 (18 ga)": 230.00,
+    "🥣 60/40 Undermount Standard Radius - SKU 83747 (16 ga)": 370.00,
+    "🥣 40/60 Undermount Standard Radius - SKU 83995 (16 ga)": 370.00,
+    # ── Bar Sinks – Standard Radius ───────────────────────────────────
+    "🍸 Large Bar Undermount Standard Radius - SKU 83993 (18 ga)": 250.00,
+    "🍸 Small Bar Undermount Standard Radius - SKU 83992 (18 ga)": 180.00,
+    # ── Kitchen Sinks – 15° Radius ────────────────────────────────────
+    "🥣 50/50 Undermount 15° Radius - SKU 83749 (18 ga)": 440.00,
+    "🥣 Large Single Bowl Undermount 15° Radius - SKU 83748 (18 ga)": 450.00,
+    "🥣 Medium Single Bowl Undermount 15° Radius - SKU 83750 (18 ga)": 400.00,
+    # ── Top-mount ─────────────────────────────────────────────────────
+    "🥣 Top-mount Double Bowl Standard Radius - SKU 85446 (18 ga)": 270.00,
+    # ── Vanity Sinks (White Porcelain) ────────────────────────────────
+    "🛁 Large Rectangular Undermount Vanity - SKU 84020 (Porcelain)": 105.00,
+    "🛁 Medium Rectangular Undermount Vanity - SKU 84022 (Porcelain)": 105.00,
+    "🛁 Large Oval Undermount Vanity - SKU 84024 (Porcelain)": 89.00,
+    "🛁 Medium Oval Undermount Vanity - SKU 84026 (Porcelain)": 89.00,
+}
+
+
+def calculate_cost_batch(unit_costs, project_sqft, sink_price=0.0):
+    """
+    Vectorized pricing over a whole column of unit costs.
+
+    Same formula as `calculate_cost`, evaluated with NumPy in one pass:
+    1. Calculate Raw Direct Cost (Material + Fab).
+    2. Calculate IB (Material marked up 5 %, enforcing 18 % floor on total).
+    3. Calculate Customer Material + Fab (Fixed 15 % higher than IB).
+    4. Add Sink Price to Customer Total.
+
+    Returns a dict of float64 arrays (one entry per unit cost) with the same
+    keys as `calculate_cost`. `project_sqft` and `sink_price` may be scalars
+    or arrays that broadcast against `unit_costs`.
+    """
+    uc            = np.asarray(unit_costs, dtype=np.float64)
+    sq_finished   = np.asarray(project_sqft, dtype=np.float64)
+    sq_with_waste = sq_finished * WASTE_FACTOR
+    sink_price    = np.asarray(sink_price, dtype=np.float64)
+
+    # 1. RAW DIRECT COSTS
+    raw_material_cost = uc * sq_with_waste
+    raw_fab_cost      = FABRICATION_COST_PER_SQFT * sq_finished
+    total_direct_cost = raw_material_cost + raw_fab_cost
+
+    # 2. INTERNAL BASE (IB) CALCULATION
+    ib_candidate_markup = (raw_material_cost * IB_MATERIAL_MARKUP) + raw_fab_cost
+    ib_candidate_floor  = total_direct_cost / (1 - IB_MIN_MARGIN)
+    ib_cost = np.maximum(ib_candidate_markup, ib_candidate_floor)
+
+    # 3. CUSTOMER PRICING
+    customer_mat_fab_total = ib_cost * IB_TO_CUSTOMER_MARKUP
+    customer_ins_cost      = INSTALL_COST_PER_SQFT * sq_finished
+
+    slab_subtotal = customer_mat_fab_total + customer_ins_cost
+    subtotal      = slab_subtotal + sink_price
+
+    # Analytics
+    profit     = slab_subtotal - (total_direct_cost + (INSTALL_COST_PER_SQFT * sq_finished))
+    positive   = slab_subtotal > 0
+    margin_pct = np.divide(profit, slab_subtotal, out=np.zeros_like(profit), where=positive) * 100
+
+    shape = np.broadcast(uc, sq_finished, sink_price).shape
+    return {
+        "customer_mat_fab": np.broadcast_to(customer_mat_fab_total, shape),
+        "customer_ins":     np.broadcast_to(customer_ins_cost, shape),
+        "sink_price":       np.broadcast_to(sink_price, shape),
+        "slab_subtotal":    np.broadcast_to(slab_subtotal, shape),
+        "subtotal":         np.broadcast_to(subtotal, shape),
+        "ib_cost":          np.broadcast_to(ib_cost, shape),
+        "margin_pct":       np.broadcast_to(margin_pct, shape),
+        "total_with_tax":   np.broadcast_to(subtotal * (1 + TAX_RATE), shape),
+    }
+
+
+def calculate_cost(unit_cost, project_sqft, sink_price=0.0):
+    """
+    Price a single slab. Thin wrapper around `calculate_cost_batch` so the
+    scalar and column-wise paths always produce identical numbers.
+    """
+    batch = calculate_cost_batch(float(unit_cost), float(project_sqft), float(sink_price))
+    return {key: float(value) for key, value in batch.items()}
+
+
+def unit_cost_range_for_budget(budget_min, budget_max, project_sqft, sink_price=0.0):
+    """
+    Inverse of `calculate_cost(...)['total_with_tax']` for fixed sqft and sinks.
+
+    The customer total rises monotonically with unit cost (IB is the larger
+    of two increasing lines), so a budget interval maps to a unit-cost
+    interval. Returns (unit_cost_min, unit_cost_max); the bounds are exact
+    up to floating-point rounding, so callers that need exact agreement
+    with forward pricing should re-check the edges.
+    """
+    sq_finished   = float(project_sqft)
+    sq_with_waste = sq_finished * WASTE_FACTOR
+    raw_fab_cost  = FABRICATION_COST_PER_SQFT * sq_finished
+    customer_ins  = INSTALL_COST_PER_SQFT * sq_finished
+
+    def invert(total):
+        ib_cost = ((total / (1 + TAX_RATE)) - float(sink_price) - customer_ins) / IB_TO_CUSTOMER_MARKUP
+        # Each IB candidate is linear in unit cost; the max of the two inverts to the min
+        from_markup = (ib_cost - raw_fab_cost) / (sq_with_waste * IB_MATERIAL_MARKUP)
+        from_floor  = (ib_cost * (1 - IB_MIN_MARGIN) - raw_fab_cost) / sq_with_waste
+        return min(from_markup, from_floor)
+
+    return invert(budget_min), invert(budget_max)
@@ -0,0 +1,126 @@
+"""
+Per-run stage timings.
+
+A `RunProfile` times the stages of one script run (or any other unit of
+work) and hands them to a process-wide `StageProfiler`, which keeps a
+rolling window per stage for p50 / p95 and logs one JSON line per run on
+the `counterpro.profile` logger. When profiling is off, callers use
+`NULL_RUN`, whose stages are a shared no-op context manager.
+"""
+import contextlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+PROFILE_WINDOW = 200   # Most recent timings kept per stage
+
+log = logging.getLogger("counterpro.profile")
+
+
+class StageProfiler:
+    """Rolling per-stage timings shared by every run in the process."""
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.lock     = threading.Lock()
+        self.window   = window
+        self._samples = {}   # stage -> deque of {"ms", "rows", "cache"}
+
+    def run(self, **context):
+        """Start profiling one run; `context` is copied into its log line."""
+        return RunProfile(self, context)
+
+    def record(self, stage, ms, rows=None, cache=None):
+        """Add one timing for `stage`, e.g. for work done outside a script run."""
+        with self.lock:
+            samples = self._samples.setdefault(stage, deque(maxlen=self.window))
+            samples.append({"ms": ms, "rows": rows, "cache": cache})
+
+    def summary(self):
+        """One dict per stage (first-seen order, "total" last) with run count, p50/p95 and cache counts."""
+        with self.lock:
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items()}
+        rows = []
+        for stage, samples in snapshot.items():
+            ms     = np.array([s["ms"] for s in samples])
+            caches = [s["cache"] for s in samples if s["cache"] is not None]
+            rows.append({
+                "stage":     stage,
+                "runs":      len(samples),
+                "p50_ms":    float(np.percentile(ms, 50)),
+                "p95_ms":    float(np.percentile(ms, 95)),
+                "last_rows": samples[-1]["rows"],
+                "hits":      caches.count("hit") if caches else None,
+                "misses":    caches.count("miss") if caches else None,
+            })
+        rows.sort(key=lambda row: row["stage"] == "total")
+        return rows
+
+
+class RunProfile:
+    """
+    Timings for one run. Wrap each step in `stage()`; the yielded dict can
+    take a `rows` count. Stages opened with `cached=True` count as cache
+    hits unless `miss()` is called while they are open.
+    """
+
+    enabled = True
+
+    def __init__(self, profiler, context):
+        self._profiler = profiler
+        self._current  = None
+        self._start    = time.perf_counter()
+        self.context   = context
+        self.stages    = []
+
+    @contextlib.contextmanager
+    def stage(self, name, cached=False):
+        info = {"stage": name, "rows": None, "cache": "hit" if cached else None}
+        outer, self._current = self._current, info
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            info["ms"] = (time.perf_counter() - start) * 1000
+            self._current = outer
+            self.stages.append(info)
+
+    def miss(self):
+        """Mark the innermost open cached stage as a miss."""
+        if self._current is not None and self._current["cache"] is not None:
+            self._current["cache"] = "miss"
+
+    def finish(self):
+        """Record every stage with the profiler and log the run as one JSON line."""
+        total_ms = (time.perf_counter() - self._start) * 1000
+        for info in self.stages:
+            self._profiler.record(info["stage"], info["ms"], info["rows"], info["cache"])
+        self._profiler.record("total", total_ms)
+        log.info(json.dumps({
+            "event":    "run",
+            **self.context,
+            "total_ms": round(total_ms, 2),
+            "stages":   [{**info, "ms": round(info["ms"], 2)} for info in self.stages],
+        }, default=str))
+
+
+class _NullRun:
+    """Stand-in for RunProfile when profiling is off."""
+
+    enabled = False
+    _stage  = contextlib.nullcontext({})
+
+    def stage(self, name, cached=False):
+        return self._stage
+
+    def miss(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_RUN = _NullRun()
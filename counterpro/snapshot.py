@@ -0,0 +1,50 @@
+"""
+On-disk inventory snapshots: the typed inventory as a Parquet file, with
+its fetch time and source report in the schema metadata.
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+_SNAPSHOT_META_KEY = b"counterpro"
+
+
+def save_snapshot(df, report, fetched_at, path):
+    """
+    Write the typed inventory to a Parquet snapshot, atomically.
+    The fetch time and source report ride along in the file's schema metadata.
+    """
+    df = df.copy()
+    for col in df.columns:
+        # Sheets can mix numbers and text in one column (e.g. serials); Parquet can't
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta  = json.dumps({"fetched_at": fetched_at, "sources": report}).encode("utf-8")
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _SNAPSHOT_META_KEY: meta})
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    """Read a snapshot written by `save_snapshot`. Returns (df, meta) or (None, None)."""
+    try:
+        table = pq.read_table(path)
+    except (OSError, pa.ArrowException):
+        return None, None
+    meta = json.loads((table.schema.metadata or {}).get(_SNAPSHOT_META_KEY, b"{}"))
+    return table.to_pandas(), meta
+
+
+def inventory_version(report):
+    """Version key for an inventory: a hash over the payload hashes of the sources it came from."""
+    digests = [entry.get("sha256") or "" for entry in report if entry.get("status") == "ok"]
+    return hashlib.sha256("\n".join(digests).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,170 @@
+"""
+Process-wide inventory versions and the background refresher that feeds them.
+
+Every session reads the same in-memory frames, never a copy. A refresh
+publishes a new `InventorySnapshot` next to the old ones. Readers that
+hold a snapshot keep seeing exactly that data until they ask for a newer
+one.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+import logging
+import random
+import threading
+import time
+
+from counterpro.snapshot import inventory_version
+
+INVENTORY_VERSIONS_KEPT = 3   # Versions held in memory for sessions still pinned to them
+
+log = logging.getLogger("counterpro.refresh")
+
+
+class InventorySnapshot:
+    """
+    One published inventory version. Its attributes can't be reassigned, and
+    the frame is shared by every reader, so it must never be modified in place.
+    """
+
+    __slots__ = ("df", "report", "fetched_at", "version")
+
+    def __init__(self, df, report, fetched_at, version):
+        for name, value in zip(self.__slots__, (df, report, fetched_at, version)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"InventorySnapshot is read-only (tried to set {name!r})")
+
+
+class InventoryStore:
+    """The latest INVENTORY_VERSIONS_KEPT inventory versions, newest last."""
+
+    def __init__(self, keep=INVENTORY_VERSIONS_KEPT):
+        self.lock      = threading.Lock()
+        self.keep      = keep
+        self._versions = OrderedDict()   # version -> InventorySnapshot
+
+    def publish(self, df, report, fetched_at):
+        """
+        Make `df` the latest version and return its snapshot. If the sources
+        are unchanged (same version), the frame already held is kept and
+        only the report and fetch time move forward.
+        """
+        version = inventory_version(report)
+        with self.lock:
+            current  = self._versions.get(version)
+            snapshot = InventorySnapshot(current.df if current else df, report, fetched_at, version)
+            self._versions[version] = snapshot
+            self._versions.move_to_end(version)
+            while len(self._versions) > self.keep:
+                self._versions.popitem(last=False)
+        return snapshot
+
+    def latest(self):
+        """The newest snapshot, or None before anything is published."""
+        with self.lock:
+            return next(reversed(self._versions.values()), None)
+
+    def get(self, version):
+        """The snapshot for `version`, or None if it was never published or has been dropped."""
+        with self.lock:
+            return self._versions.get(version)
+
+
+class InventoryRefresher:
+    """
+    Keeps an InventoryStore current from a background thread.
+
+    Every `interval` seconds (give or take `jitter`, so several processes
+    don't hit the sheets in step) it calls `fetch()` -> (df, report) and
+    publishes the result. Requests never pay for the download, except when
+    there is no data at all yet. `refresh()` is single-flight: callers that
+    arrive while a fetch is running wait for that fetch rather than
+    starting another. `persist(df, report, fetched_at)` is called for each
+    new version and may return an extra report entry describing a failure.
+    """
+
+    def __init__(self, fetch, store=None, interval=60.0, jitter=0.0, persist=None):
+        self.lock      = threading.Lock()
+        self.store     = store if store is not None else InventoryStore()
+        self.interval  = interval
+        self.jitter    = jitter
+        self.report    = []     # Source report of the last refresh attempt
+        self.stats     = {"fetches": 0, "collapsed": 0}
+        self._fetch    = fetch
+        self._persist  = persist
+        self._inflight = None   # Future of the running fetch, if any
+        self._stop     = threading.Event()
+        self._thread   = None
+
+    @property
+    def refreshing(self):
+        with self.lock:
+            return self._inflight is not None
+
+    def load(self, df, report, fetched_at):
+        """Publish data from elsewhere (e.g. the on-disk snapshot) without fetching."""
+        self.store.publish(df, report, fetched_at)
+        with self.lock:
+            self.report = report
+
+    def start(self):
+        """Start the background thread (once)."""
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="inventory-refresher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def next_delay(self):
+        return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    def _loop(self):
+        # Data loaded from disk may already be due; otherwise wait out the rest of its interval
+        latest = self.store.latest()
+        age    = time.time() - latest.fetched_at if latest is not None and latest.fetched_at else None
+        delay  = 0.0 if age is None else max(0.0, self.next_delay() - age)
+        while not self._stop.wait(delay):
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("Background inventory refresh failed")
+            delay = self.next_delay()
+
+    def refresh(self):
+        """Fetch and publish now, or wait for the fetch already running. Returns the latest snapshot."""
+        with self.lock:
+            owner = self._inflight is None
+            if owner:
+                self._inflight = Future()
+            else:
+                self.stats["collapsed"] += 1
+            future = self._inflight
+
+        if owner:
+            try:
+                future.set_result(self._refresh_now())
+            except BaseException as exc:
+                future.set_exception(exc)
+            finally:
+                with self.lock:
+                    self._inflight = None
+        return future.result()
+
+    def _refresh_now(self):
+        with self.lock:
+            self.stats["fetches"] += 1
+        df, report = self._fetch()
+        fetched_at = time.time()
+        previous   = self.store.latest()
+        if df is not None:
+            self.store.publish(df, report, fetched_at)
+            if self._persist is not None and (previous is None or df is not previous.df):
+                error = self._persist(df, report, fetched_at)
+                if error is not None:
+                    report = report + [error]
+        with self.lock:
+            self.report = report
+        return self.store.latest()
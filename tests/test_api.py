@@ -0,0 +1,49 @@
+import pytest
+from starlette.exceptions import HTTPException
+
+from benchmarks.synthetic import synthetic_csv
+from counterpro.api import PricingService, make_refresher
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    path = tmp_path_factory.mktemp("api") / "inventory.csv"
+    path.write_bytes(synthetic_csv(2_000, 0))
+    service = PricingService(make_refresher(inventory=str(path)))
+    service.snapshot()
+    return service
+
+
+@pytest.fixture(scope="module")
+def variant(service):
+    return service.inventory({"sqft": "1", "limit": "1"})["items"][0]["variant"]
+
+
+@pytest.mark.parametrize("raw", ["inf", "-inf", "nan", "1e400", "Infinity"])
+def test_non_finite_numbers_are_rejected(service, variant, raw):
+    for call in (lambda: service.price({"variant": variant, "sqft": raw}),
+                 lambda: service.price({"variant": variant, "sqft": "35", "sinks": raw}),
+                 lambda: service.inventory({"sqft": raw}),
+                 lambda: service.inventory({"sqft": "35", "max_total": raw}),
+                 lambda: service.inventory({"sqft": "35", "offset": raw}),
+                 lambda: service.inventory({"sqft": "35", "limit": raw}),
+                 lambda: service.batch({"jobs": [{"variant": variant, "sqft": raw}]})):
+        with pytest.raises(HTTPException) as error:
+            call()
+        assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("bad", [["a"], {"a": 1}, 7])
+def test_batch_rejects_non_string_variant_and_location(service, variant, bad):
+    with pytest.raises(HTTPException) as error:
+        service.batch({"jobs": [{"variant": bad, "sqft": 35}]})
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        service.batch({"jobs": [{"variant": variant, "sqft": 35}], "location": bad})
+    assert error.value.status_code == 400
+
+
+def test_batch_prices_like_price(service, variant):
+    single = service.price({"variant": variant, "sqft": "35", "sinks": "450"})
+    batch  = service.batch({"jobs": [{"variant": variant, "sqft": 35, "sinks": 450, "job_id": "a"}]})
+    assert batch["quotes"][0]["pricing"] == single["pricing"]
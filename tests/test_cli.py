@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import synthetic_csv
+from counterpro.cli import main
+from counterpro.data import read_inventory_csv
+
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory):
+    root      = tmp_path_factory.mktemp("cli")
+    inventory = root / "inventory.csv"
+    inventory.write_bytes(synthetic_csv(150, 2))
+    variants  = read_inventory_csv(inventory.read_bytes())['Product Variant'].iloc[:2].tolist()
+    jobs      = root / "jobs.csv"
+    jobs.write_text("job_id,sqft,sinks,variant\n"
+                    "j1,40,,\n"
+                    f"j2,35,450,{variants[0]}\n"
+                    "j3,50,89,Not in stock\n"
+                    f"j4,12.5,0,{variants[1]}\n"
+                    f"j5,20,,{variants[0]}\n"
+                    "j6,60,,\n")
+    return root, str(inventory), str(jobs)
+
+
+def _quote(files, *extra):
+    root, inventory, jobs = files
+    output = root / "quotes.out"
+    assert main(["quote", inventory, jobs, "-o", str(output), *extra]) == 0
+    return output.read_text()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "json"])
+def test_output_does_not_depend_on_the_chunk_size(files, fmt):
+    outputs = [_quote(files, "--format", fmt, "--chunksize", str(size)) for size in (1, 2, 5, 10_000)]
+    assert all(output == outputs[0] for output in outputs)
+    if fmt == "json":
+        job_ids = [json.loads(line)["job_id"] for line in outputs[0].splitlines()]
+        assert list(dict.fromkeys(job_ids)) == ["j1", "j2", "j4", "j5", "j6"]   # Job order; j3 is skipped
+
+
+def test_unknown_variant_is_reported(files, capsys):
+    _quote(files)
+    assert "job j3: variant not in inventory, skipped" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("problem", ["no sqft column", "missing jobs file", "no variants", "missing inventory"])
+def test_errors_exit_with_code_2(files, tmp_path, capsys, problem):
+    _, inventory, jobs = files
+    if problem == "no sqft column":
+        jobs = tmp_path / "jobs.csv"
+        jobs.write_text("job_id,area\nj1,40\n")
+    elif problem == "missing jobs file":
+        jobs = tmp_path / "missing.csv"
+    elif problem == "no variants":
+        inventory = tmp_path / "inventory.csv"
+        inventory.write_text("Name,Qty\nfoo,1\n")
+    else:
+        inventory = tmp_path / "missing.csv"
+    assert main(["quote", str(inventory), str(jobs), "-o", str(tmp_path / "quotes.csv")]) == 2
+    assert capsys.readouterr().err.startswith("counterpro: ")
@@ -0,0 +1,177 @@
+import hashlib
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from benchmarks.synthetic import synthetic_csv
+from counterpro import data
+from counterpro.data import (SourceCache, _prepare_source, fetch_sources, iter_inventory_csv,
+                             location_column, read_inventory_csv)
+from counterpro.inventory import group_inventory, group_inventory_chunks
+
+INVENTORY = (b"Product Variant,On Hand Qty,Serialized On Hand Cost,Serial Number,Location\n"
+             b"Caesarstone Calacatta 3cm,60.5,\"$2,420.00\",SN1,Yard A\n"
+             b"Black Tempal 1.2cm,40,\"$1,600.00\",SN2,Yard B\n")
+NO_VARIANTS = b"Name,Qty\nfoo,1\n"
+ETAG        = '"v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        if self.path.startswith("/slow"):
+            server.release.wait(float(self.path.rsplit("/", 1)[1]))
+        if self.path == "/etag.csv" and self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        if self.path == "/missing.csv":
+            self.send_error(404)
+            return
+        body = NO_VARIANTS if self.path == "/other.csv" else INVENTORY
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        if self.path == "/etag.csv":
+            self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.hits, httpd.release = {}, threading.Event()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.release.set()   # Let slow handlers finish
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_reports_each_source_in_order(server):
+    urls = [f"{server.url}/plain.csv", f"{server.url}/other.csv", f"{server.url}/missing.csv"]
+    frames, report = fetch_sources(urls)
+    assert [entry["status"] for entry in report] == ["ok", "skipped", "error"]
+    assert [entry["source"] for entry in report] == urls
+    assert len(frames) == 1 and report[0]["rows"] == len(frames[0]) == 2
+    assert report[0]["sha256"] == hashlib.sha256(INVENTORY).hexdigest()
+    assert "404" in report[2]["error"]
+
+
+def test_read_timeout_fails_only_that_source(server):
+    frames, report = fetch_sources([f"{server.url}/slow/5", f"{server.url}/plain.csv"], timeout=(1.0, 0.3))
+    assert [entry["status"] for entry in report] == ["error", "ok"]
+    assert len(frames) == 1
+    assert report[0]["latency_ms"] < 3000
+
+
+def test_deadline_cuts_off_the_batch(server):
+    started = time.perf_counter()
+    frames, report = fetch_sources([f"{server.url}/plain.csv", f"{server.url}/slow/10"],
+                                   timeout=(1.0, 20.0), deadline=0.5)
+    assert time.perf_counter() - started < 3
+    assert [entry["status"] for entry in report] == ["ok", "timeout"]
+    assert report[1]["latency_ms"] is None and len(frames) == 1
+
+
+def test_etag_answers_not_modified(server):
+    cache = SourceCache()
+    url   = f"{server.url}/etag.csv"
+    (first,), report = fetch_sources([url], cache=cache)
+    assert report[0]["cache"] == "changed"
+    (second,), report = fetch_sources([url], cache=cache)
+    assert report[0]["cache"] == "not modified"
+    assert second is first
+    stats = cache.get_stats()
+    assert (stats["not_modified"], stats["changed"], stats["bytes_saved"]) == (1, 1, len(INVENTORY))
+    assert server.hits["/etag.csv"] == 2
+
+
+def test_same_bytes_skip_parsing(server):
+    cache = SourceCache()
+    url   = f"{server.url}/plain.csv"
+    (first,), _ = fetch_sources([url], cache=cache)
+    (second,), report = fetch_sources([url], cache=cache)
+    assert report[0]["cache"] == "unchanged" and report[0]["sha256"] == hashlib.sha256(INVENTORY).hexdigest()
+    assert second is first
+    stats = cache.get_stats()
+    assert (stats["unchanged"], stats["changed"], stats["bytes_downloaded"]) == (1, 1, 2 * len(INVENTORY))
+
+
+@pytest.mark.parametrize("names, expected", [
+    (["Website", "Store ID"], "Store ID"),
+    (["Website", "Homesite", "Restore Date"], None),
+    (["Location Notes", "site"], "site"),
+    (["warehouse_name", "Product Variant"], "warehouse_name"),
+    (["Site Code", " Location "], " Location "),
+])
+def test_location_column_matches_whole_words(names, expected):
+    assert location_column(names) == expected
+
+
+def test_website_column_is_not_a_location():
+    df = read_inventory_csv(b"Product Variant,On Hand Qty,Serialized On Hand Cost,Website\n"
+                            b"Black Tempal 1.2cm,40,\"$1,600.00\",https://example.com\n")
+    assert list(df['Location']) == ["Unassigned"] and 'Website' not in df.columns
+
+
+def _plain(df):
+    """Frame values as plain Python objects, so category and string dtypes compare by value."""
+    return df.reset_index(drop=True).astype(object).where(df.reset_index(drop=True).notna(), None)
+
+
+@pytest.fixture(scope="module")
+def payload():
+    return synthetic_csv(20_000, 3)
+
+
+@pytest.fixture(scope="module")
+def baseline(payload):
+    """The pandas pipeline the pyarrow reader replaced: read every column, clean, prepare."""
+    return _prepare_source(pd.read_csv(io.BytesIO(payload)))
+
+
+def test_pyarrow_ingest_matches_the_pandas_pipeline(payload, baseline):
+    df = read_inventory_csv(payload)
+    pd.testing.assert_frame_equal(_plain(df), _plain(baseline[df.columns]), check_exact=True)
+    pd.testing.assert_frame_equal(group_inventory(df), group_inventory(baseline), check_exact=True)
+
+
+def test_pandas_fallback_matches_pyarrow(payload, baseline, monkeypatch):
+    def rejected(*args, **kwargs):
+        raise pa.ArrowInvalid("rejected for the test")
+    monkeypatch.setattr(data.pacsv, "read_csv", rejected)
+    df = read_inventory_csv(payload)
+    pd.testing.assert_frame_equal(_plain(df), _plain(baseline[df.columns]), check_exact=True)
+
+
+@pytest.mark.parametrize("chunksize", [1_000, 4_321, 50_000])
+def test_streaming_matches_a_whole_file_read(payload, chunksize):
+    whole  = read_inventory_csv(payload)
+    chunks = list(iter_inventory_csv(io.BytesIO(payload), chunksize=chunksize))
+    assert all(len(chunk) <= chunksize for chunk in chunks)
+    pd.testing.assert_frame_equal(_plain(pd.concat([_plain(chunk) for chunk in chunks])), _plain(whole),
+                                  check_exact=True)
+    grouped = group_inventory_chunks(iter_inventory_csv(io.BytesIO(payload), chunksize=chunksize))
+    pd.testing.assert_frame_equal(_plain(grouped), _plain(group_inventory(whole)), check_exact=True)
+
+
+def test_streaming_starts_where_the_file_is_positioned(payload):
+    source = io.BytesIO(b"exported by the sheet\n" + payload)
+    source.readline()
+    chunks = list(iter_inventory_csv(source, chunksize=3_000))
+    pd.testing.assert_frame_equal(_plain(pd.concat([_plain(chunk) for chunk in chunks])),
+                                  _plain(read_inventory_csv(payload)), check_exact=True)
@@ -0,0 +1,88 @@
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from counterpro.fit import FitIndex, _best_subset, need_hundredths
+
+
+def brute_force(pieces, need, max_pieces):
+    """(total, piece count) of the least-leftover set, fewest pieces on a tie; None if nothing covers."""
+    best = None
+    for size in range(1, max_pieces + 1):
+        for picks in itertools.combinations(range(len(pieces)), size):
+            total = sum(pieces[idx] for idx in picks)
+            if total >= need and (best is None or (total, size) < best):
+                best = (total, size)
+    return best
+
+
+def test_exact_cover_prefers_fewer_pieces():
+    pieces = [491, 470, 419, 246, 171, 64, 58, 54, 31]
+    (total, picks), exact = _best_subset(pieces, 716, 3, 10**6)
+    assert exact
+    assert (total, len(picks)) == (716, 2)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_best_subset_matches_brute_force(seed):
+    rng = random.Random(seed)
+    for _ in range(2_000):
+        scale      = rng.choice([20, 500])   # Small areas make exact covers (and ties between them) common
+        pieces     = sorted((rng.randint(1, scale) for _ in range(rng.randint(0, 10))), reverse=True)
+        max_pieces = rng.randint(1, 4)
+        need       = rng.randint(1, 3 * scale)
+        found, exact = _best_subset(pieces, need, max_pieces, 10**6)
+        assert exact
+        if found is None:
+            assert brute_force(pieces, need, max_pieces) is None
+            continue
+        total, picks = found
+        assert len(set(picks)) == len(picks) and sum(pieces[idx] for idx in picks) == total
+        assert (total, len(picks)) == brute_force(pieces, need, max_pieces)
+
+
+def test_fit_index_matches_brute_force():
+    rng  = np.random.default_rng(0)
+    rows = 400
+    df   = pd.DataFrame({
+        'Product Variant': rng.choice([f"Variant {idx}" for idx in range(40)], rows),
+        'On Hand Qty':     np.round(rng.uniform(5, 80, rows), 2),
+        'Serial Number':   [f"SN{idx}" for idx in range(rows)],
+    })
+    grouped_df = df.groupby('Product Variant', as_index=False)['On Hand Qty'].sum()
+    index      = FitIndex(df, grouped_df)
+
+    for min_qty in (10.0, 55.5, 120.25, 190.0):
+        need  = need_hundredths(min_qty)
+        reach = index.reach(min_qty)
+        for row, variant in enumerate(grouped_df['Product Variant']):
+            pieces   = sorted(np.round(df.loc[df['Product Variant'] == variant, 'On Hand Qty'] * 100).astype(int),
+                              reverse=True)
+            expected = brute_force(pieces, need, 3)
+            fit      = index.best_fit(row, min_qty)
+            assert reach[row] == (expected is not None)
+            if expected is None:
+                assert fit is None
+                continue
+            assert (round(fit.total * 100), len(fit.rows)) == expected
+            assert fit.leftover == pytest.approx((expected[0] - need) / 100)
+            assert sorted(df['Serial Number'].iloc[fit.rows]) == sorted(fit.labels)
+
+
+def test_no_piece_limit_lists_every_variant_with_enough_stock():
+    df = pd.DataFrame({
+        'Product Variant': ["Many small"] * 5 + ["Short"] * 2,
+        'On Hand Qty':     [12.0, 11.5, 10.0, 9.0, 8.0, 20.0, 10.0],
+        'Serial Number':   [f"SN{idx}" for idx in range(7)],
+    })
+    grouped_df = df.groupby('Product Variant', as_index=False)['On Hand Qty'].sum()
+    capped     = FitIndex(df, grouped_df)
+    unlimited  = FitIndex(df, grouped_df, max_pieces=None)
+
+    assert capped.reach(40.0).tolist() == [False, False]
+    assert unlimited.reach(40.0).tolist() == (grouped_df['On Hand Qty'] >= 40.0).tolist() == [True, False]
+    fit = unlimited.best_fit(0, 40.0)
+    assert len(fit.rows) == 4 and fit.total == 40.5 and capped.best_fit(0, 40.0) is None
@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from counterpro.history import QuoteHistory
+from counterpro.pricing import calculate_cost
+
+SINKS = [{"type": "Undermount", "price": 450.0, "quantity": 1}]
+
+
+def _quote(**extra):
+    return {"kind": "pdf", "slab_name": "Caesarstone Calacatta 3cm", "variant": "Caesarstone Calacatta 3cm",
+            "sqft": 35.0, "total": 2_940.0, **extra}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = QuoteHistory(str(tmp_path / "quotes.sqlite"), batch_size=50)
+    yield history
+    history.close()
+
+
+@pytest.fixture
+def held(history):
+    """The history with its writer held at its first batch until the event is set."""
+    gate, sizes = threading.Event(), []
+    write = history._write
+
+    def held_write(conn, batch):
+        gate.wait(5)
+        sizes.append(len(batch))
+        write(conn, batch)
+
+    history._write = held_write
+    history.sizes  = sizes
+    yield gate
+    gate.set()
+
+
+def test_queued_quotes_are_written_in_batches(history, held):
+    for idx in range(120):
+        history.record(_quote(customer=f"Customer {idx}"))
+    held.set()
+    assert history.flush(5)
+    assert sum(history.sizes) == history.count() == 120
+    assert max(history.sizes) <= 50 and len(history.sizes) <= 4   # First batch, then 50, 50 and the rest
+    assert history.stats == {"written": 120, "batches": len(history.sizes), "failed": 0}
+
+
+def test_flush_times_out_while_the_writer_is_busy(history, held):
+    history.record(_quote())
+    assert history.flush(timeout=0.05) is False
+    held.set()
+    assert history.flush(timeout=5) is True
+    assert history.count() == 1
+
+
+def test_close_commits_what_is_queued(tmp_path):
+    path    = str(tmp_path / "quotes.sqlite")
+    history = QuoteHistory(path)
+    for _ in range(10):
+        history.record(_quote())
+    history.close()
+    reopened = QuoteHistory(path)
+    assert reopened.count() == 10
+    reopened.close()
+
+
+def test_search_matches_wildcards_literally(history):
+    for idx, customer in enumerate(["a_b Homes", "axb Homes", "50% Off Kitchens", "500 Off Kitchens", "Back\\Slash"]):
+        history.record(_quote(customer=customer, rep="Dana", created_at=1_000.0 + idx))
+    assert history.flush(5)
+
+    def customers(text):
+        return [quote["customer"] for quote in history.search(text)]
+
+    assert customers("a_b") == ["a_b Homes"]
+    assert customers("50%") == ["50% Off Kitchens"]
+    assert customers("A") == ["axb Homes", "a_b Homes"]   # Any case, newest first
+    assert customers("back\\") == ["Back\\Slash"]
+    assert customers("%") == [] and customers("_") == []
+    assert len(customers("dana")) == 5   # The rep name matches too
+
+
+def test_get_decodes_the_payload(history):
+    pricing = calculate_cost(60.0, 35.0, 450.0)
+    history.record(_quote(sinks=SINKS, pricing=pricing, customer="  Lee  ", location="Yard A"))
+    assert history.flush(5)
+    (found,) = history.search()
+    quote = history.get(found["id"])
+    assert quote["sinks"] == SINKS and quote["pricing"] == pricing
+    assert quote["customer"] == "Lee" and quote["location"] == "Yard A" and quote["sqft"] == 35.0
+    assert history.get(found["id"] + 1) is None
@@ -0,0 +1,198 @@
+import random
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from counterpro.inventory import (DEFAULT_JOB_SQFT, SERIAL_COLUMNS, PriceIndex, PriceMatrix, PriceMatrixCache,
+                                 LocationPartitions, SearchIndex, SerialIndex, group_inventory,
+                                 group_inventory_chunks)
+from counterpro.pricing import calculate_cost
+
+
+WORDS = ["Ice", "White", "Calacatta", "Nuvo", "3cm", "1.2cm", "#L4", "(Honed)", "Caesarstone", "Mont-Blanc",
+         "Blanc", "Crème", "ÉTOILE", "Straße", "Kelvin\u212a", "a_b", "", "  ", "&", "x"]
+
+
+def _text(rng):
+    return rng.choice([" ", "  ", "-", "", "/"]).join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+
+
+def _forward_search(grouped_df, term):
+    """The substring filter the index replaces."""
+    hits = np.zeros(len(grouped_df), dtype=bool)
+    for col in SearchIndex.FIELDS:
+        hits |= grouped_df[col].str.contains(re.escape(term), case=False, na=False).to_numpy(dtype=bool)
+    return np.flatnonzero(hits)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_search_matches_str_contains(seed):
+    rng        = random.Random(seed)
+    grouped_df = pd.DataFrame({
+        'Color':           [_text(rng) if rng.random() > 0.05 else None for _ in range(600)],
+        'Brand':           [_text(rng) for _ in range(600)],
+        'Product Variant': [_text(rng) for _ in range(600)],
+    })
+    if seed == 1:
+        grouped_df = grouped_df.astype("category")
+    index = SearchIndex(grouped_df)
+
+    terms = ["ice", "ice white", "ICE  WHITE", "e w", " white", "white ", "#l4", "3cm)", "nuvo 3", "1.2",
+             "mont-bl", "-", " ", "&", "a_b", "_", "crème", "CRÈME", "étoile", "strasse", "k", "zzz", "é", ""]
+    terms += [_text(rng)[rng.randint(0, 3):][:rng.randint(1, 12)] for _ in range(200)]
+    for term in terms:
+        assert index.search(term).tolist() == _forward_search(grouped_df, term).tolist(), term
+
+
+def _scan_serials(df, variant):
+    """The per-selection scan the index replaces: first serial column with any value, in row order."""
+    slabs = df[df['Product Variant'] == variant]
+    for col in SERIAL_COLUMNS:
+        if col in slabs.columns:
+            serials = list(dict.fromkeys(str(serial) for serial in slabs[col] if pd.notna(serial)))
+            if serials:
+                return serials
+    return []
+
+
+def test_serial_index_lookups():
+    df = pd.DataFrame({
+        'Product Variant': ["Calacatta", "Mist", "Calacatta", "Tempal", "Calacatta", "Mist", None],
+        'Serial Number':   ["SN3", None, "SN1", None, "SN3", None, "SN9"],
+        'SKU':             ["K1", "K2", None, None, "K1", 7, None],
+    })
+    index = SerialIndex(df)
+    assert index.serials("Calacatta") == ["SN3", "SN1"]    # Duplicates dropped, row order kept
+    assert index.serials("Mist") == ["K2", "7"]            # No serial numbers, so the next column
+    assert index.serials("Tempal") == [] and index.serials("Nuvo") == []
+    assert index.rows("Calacatta").tolist() == [0, 2, 4] and index.rows("Nuvo").tolist() == []
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_serial_index_matches_the_scan(seed):
+    rng  = random.Random(seed)
+    rows = 2_000
+    df   = pd.DataFrame({
+        'Product Variant': [f"Variant {rng.randrange(150)}" for _ in range(rows)],
+        'Serial Number':   [f"SN{rng.randrange(900)}" if rng.random() < 0.3 else None for _ in range(rows)],
+        'Item Code':       [f"IC{rng.randrange(900)}" if rng.random() < 0.5 else None for _ in range(rows)],
+    })
+    index = SerialIndex(df)
+    for variant in sorted(set(df['Product Variant'])) + ["Variant missing"]:
+        assert index.serials(variant) == _scan_serials(df, variant)
+        assert index.rows(variant).tolist() == np.flatnonzero(df['Product Variant'] == variant).tolist()
+
+
+def _grouped(rng, rows):
+    unit_cost = np.round(rng.uniform(10, 120, rows), 2)
+    unit_cost[rng.random(rows) < 0.2]  = unit_cost[0]   # Ties
+    unit_cost[rng.random(rows) < 0.05] = np.nan         # Unpriced rows
+    return pd.DataFrame({'Unit_Cost': unit_cost})
+
+
+def _totals(grouped_df, sqft, sink_price):
+    """Forward pricing, one row at a time, the way the budget filter used to."""
+    return np.array([np.nan if np.isnan(uc) else calculate_cost(uc, sqft, sink_price)['total_with_tax']
+                     for uc in grouped_df['Unit_Cost']])
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("sqft, sink_price", [(35.0, 0.0), (12.5, 450.0), (180.0, 89.0), (0.0, 250.0)])
+def test_budget_rows_match_the_forward_filter(seed, sqft, sink_price):
+    rng        = np.random.default_rng(seed)
+    grouped_df = _grouped(rng, 500)
+    index      = PriceIndex(grouped_df)
+    totals     = _totals(grouped_df, sqft, sink_price)
+    priced     = totals[~np.isnan(totals)]
+
+    # Random budgets, plus budgets that land exactly on a row's total
+    budgets = [tuple(sorted(rng.uniform(priced.min() - 100, priced.max() + 100, 2))) for _ in range(50)]
+    budgets += [(priced[i], priced[j]) for i, j in rng.integers(0, len(priced), (50, 2)) if priced[i] <= priced[j]]
+    budgets += [(priced.min(), priced.max()), (priced.max() + 1, priced.max() + 2), (0.0, 0.0)]
+
+    for budget_min, budget_max in budgets:
+        rows   = index.budget_rows(budget_min, budget_max, sqft, sink_price)
+        inside = np.flatnonzero((totals >= budget_min) & (totals <= budget_max))
+        assert sorted(rows.tolist()) == inside.tolist()
+        assert np.all(np.diff(totals[rows]) >= 0)   # Ascending price
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_price_bounds_match_the_forward_filter(seed):
+    rng        = np.random.default_rng(seed)
+    grouped_df = _grouped(rng, 300)
+    index      = PriceIndex(grouped_df)
+    for sqft, sink_price in [(35.0, 0.0), (90.0, 450.0)]:
+        totals = _totals(grouped_df, sqft, sink_price)
+        for share in (0.0, 0.01, 0.3, 1.0):
+            passed   = rng.random(len(grouped_df)) < share
+            expected = totals[passed & ~np.isnan(totals)]
+            bounds   = index.price_bounds(passed, sqft, sink_price)
+            if not len(expected):
+                assert bounds is None
+            else:
+                assert bounds == (expected.min(), expected.max())
+
+
+@pytest.mark.parametrize("max_cells", [100_000, 20_000, 3_000])
+def test_coarse_price_grid_keeps_the_default_sqft(max_cells):
+    grouped_df = _grouped(np.random.default_rng(0), 500)
+    matrix     = PriceMatrix(grouped_df, max_cells=max_cells)
+    assert len(matrix.sqft) < 500 and matrix.column(DEFAULT_JOB_SQFT) is not None
+    rows = np.flatnonzero(grouped_df['Unit_Cost'].notna().to_numpy())
+    np.testing.assert_array_equal(matrix.totals(rows, DEFAULT_JOB_SQFT, 450.0),
+                                  _totals(grouped_df.iloc[rows], DEFAULT_JOB_SQFT, 450.0))
+
+
+def test_price_matrix_cache_is_bounded_by_bytes():
+    matrices = [PriceMatrix(_grouped(np.random.default_rng(seed), 100)) for seed in range(4)]
+    size     = matrices[0].slab_subtotal.nbytes
+    cache    = PriceMatrixCache(max_bytes=2 * size)
+    for key, matrix in enumerate(matrices[:3]):
+        cache.put(key, matrix)
+        if key == 1:
+            assert cache.get(0) is matrices[0]   # Now the most recently used
+    assert cache.get(1) is None and cache.get(0) is matrices[0] and cache.get(2) is matrices[2]
+    assert cache.nbytes == 2 * size
+
+    tiny = PriceMatrixCache(max_bytes=1)
+    tiny.put("a", matrices[3])
+    assert tiny.get("a") is matrices[3]   # The newest matrix is kept even over the bound
+
+
+def _raw(rng, rows, variants=60):
+    return pd.DataFrame({
+        'Product Variant':         rng.choice([f"Variant {idx}" for idx in range(variants)], rows),
+        'On Hand Qty':             np.round(rng.uniform(0.01, 90, rows), 2),
+        'Serialized On Hand Cost': np.round(rng.uniform(1, 9_000, rows), 2),
+        'Brand':                   "Brand",
+        'Color':                   "Color",
+        'Thickness':               "3cm",
+    })
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_location_grouping_matches_grouping_the_flat_frame(seed):
+    rng = np.random.default_rng(seed)
+    df  = _raw(rng, 5_000)
+    df['Location'] = pd.Categorical(rng.choice(["Yard A", "Yard B", "Showroom"], len(df)))
+    partitions = LocationPartitions(df)
+
+    # Per-location totals are folded together, so sums are added in a different order; GROUP_DECIMALS evens that out
+    pd.testing.assert_frame_equal(partitions.combined.grouped_df, group_inventory(df), check_exact=True)
+    assert partitions.locations == ["Showroom", "Yard A", "Yard B"]
+    for location in partitions.locations:
+        view = partitions.view(location)
+        pd.testing.assert_frame_equal(view.grouped_df, group_inventory(df[df['Location'] == location]),
+                                      check_exact=True)
+        assert view.rows.tolist() == np.flatnonzero(df['Location'] == location).tolist()
+
+
+@pytest.mark.parametrize("chunksize", [37, 250, 5_000])
+def test_grouping_does_not_depend_on_the_chunk_size(chunksize):
+    rows = 5_000
+    df   = _raw(np.random.default_rng(0), rows)
+    chunks = (df.iloc[start:start + chunksize] for start in range(0, rows, chunksize))
+    pd.testing.assert_frame_equal(group_inventory_chunks(chunks), group_inventory(df), check_exact=True)
@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from counterpro.parsing import parse_product_variant, parse_product_variants
+
+VARIANTS = [
+    "Caesarstone Calacatta Nuvo 3cm",
+    "  Dekton   Carrara Mist  #5x 1.2cm",
+    "1234 - Silestone Eternal Marquina (Polished) 2cm",
+    "Black Tempal 1.2CM",
+    "Quartz & Co White 3.0cm #L4 (Honed)",
+    "Cambria",
+    "3cm",
+    "12 -  ",
+    "",
+    "Ice White Ice White 2cm",
+    "Émeraude Vert 3cm",
+    "#only-a-tag",
+    "nan",
+]
+
+
+def _random_variant(rng):
+    words = ["Caesarstone", "Dekton", "Ice", "White", "Mist", "(Honed)", "#L4", "3cm", "1.2cm", "&", "-", "Co"]
+    prefix = rng.choice(["", "12 - ", "7-", "  "])
+    return prefix + " ".join(rng.choice(words) for _ in range(rng.randint(0, 6)))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_the_row_parser(seed):
+    rng    = random.Random(seed)
+    values = VARIANTS + [_random_variant(rng) for _ in range(2_000)]
+    series = pd.Series(values, index=np.arange(len(values)) * 3)
+    parsed = parse_product_variants(series)
+    assert parsed.index.equals(series.index)
+    assert list(parsed.itertuples(index=False, name=None)) == [parse_product_variant(value) for value in values]
+
+
+@pytest.mark.parametrize("dtype", [object, "str", "category"])
+def test_missing_values(dtype):
+    series = pd.Series(["Dekton Mist 2cm", None, np.nan, pd.NA, "Dekton Mist 2cm"], dtype=dtype)
+    expect = [parse_product_variant(value) for value in series]
+    assert list(parse_product_variants(series).itertuples(index=False, name=None)) == expect
+
+
+def test_memo_parses_each_variant_once():
+    memo = {}
+    parse_product_variants(pd.Series(VARIANTS), memo=memo)
+    memo["Cambria"] = ("memo", "hit", "")
+    parsed = parse_product_variants(pd.Series(["Cambria", "Cambria"]), memo=memo)
+    assert list(parsed['Brand']) == ["memo", "memo"]
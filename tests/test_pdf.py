@@ -0,0 +1,65 @@
+import io
+import re
+import zipfile
+import zlib
+from datetime import date
+
+from counterpro.pdf import QuotePdfCache, generate_quote_pdf, make_render_pool, zip_quotes
+from counterpro.pricing import calculate_cost
+
+SINKS = [{"type": "Undermount", "price": 450.0, "quantity": 1}]
+
+
+def _quote(**extra):
+    return {"slab_name": "Caesarstone Calacatta 3cm", "sqft": 35.0, "sinks": SINKS,
+            "pricing": calculate_cost(60.0, 35.0, 450.0), **extra}
+
+
+def test_cached_pdf_is_keyed_on_the_quote_date():
+    cache = QuotePdfCache()
+    first = cache.get(**_quote(quote_date=date(2026, 3, 1)))
+    again = cache.get(**_quote(quote_date=date(2026, 3, 1)))
+    later = cache.get(**_quote(quote_date=date(2026, 3, 2)))
+    assert first == again and first != later
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_undated_quotes_are_dated_today():
+    cache  = QuotePdfCache()
+    today, = cache.get_many([_quote(quote_date=date.today())])
+    assert cache.get(**_quote()) == today
+    assert cache.get_stats()["hits"] == 1
+
+
+def _text(pdf_bytes):
+    """The page content streams of a PDF, decompressed."""
+    streams = re.findall(rb"stream\r?\n(.*?)\r?\nendstream", pdf_bytes, re.S)
+    return b"".join(zlib.decompress(stream) for stream in streams).decode("latin-1")
+
+
+def test_tax_label_follows_the_rate():
+    assert r"GST \(5%\)" in _text(generate_quote_pdf(**_quote()))
+    text = _text(generate_quote_pdf(**_quote(), tax_rate=0.075, validity_days=14))
+    assert r"GST \(7.5%\)" in text
+    assert "This quote is valid for 14 days. Prices exclude installation site preparation." in text
+
+
+def test_batch_renders_on_the_process_pool():
+    quotes = [_quote(sqft=sqft, pricing=calculate_cost(60.0, sqft, 450.0), quote_date=date(2026, 3, 1))
+              for sqft in (20.0, 35.0, 48.5, 60.0)]
+    cache  = QuotePdfCache()
+    with make_render_pool(2) as pool:
+        pdfs  = cache.get_many(quotes, pool)
+        again = cache.get_many(quotes[1:] + [_quote(sqft=75.0, pricing=calculate_cost(60.0, 75.0, 450.0),
+                                                      quote_date=date(2026, 3, 1))], pool)
+    assert again[:3] == pdfs[1:]
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (3, 5, 5)
+
+    # Same pages as an inline render (the PDF creation time differs)
+    assert [_text(pdf) for pdf in pdfs] == [_text(generate_quote_pdf(**quote)) for quote in quotes]
+
+    names = [f"quote_{idx}.pdf" for idx in range(len(pdfs))]
+    with zipfile.ZipFile(io.BytesIO(zip_quotes(zip(names, pdfs)))) as archive:
+        assert archive.namelist() == names
+        assert [archive.read(name) for name in names] == pdfs
@@ -0,0 +1,64 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from counterpro.pricing import (FABRICATION_COST_PER_SQFT, IB_MATERIAL_MARKUP, IB_MIN_MARGIN, IB_TO_CUSTOMER_MARKUP,
+                                INSTALL_COST_PER_SQFT, TAX_RATE, WASTE_FACTOR, calculate_cost, calculate_cost_batch)
+
+UNIT_COSTS = [0.0, 1e-9, 0.01, 1.0, 12.34, 45.67, 60.0, 99.999, 1_234.56, 1e6]
+SQFT       = [0.0, 0.01, 1.0, 12.5, 35.0, 35.5, 180.0, 499.99, 500.0]
+SINKS      = [0.0, 89.0, 450.5]
+
+
+def scalar_cost(unit_cost, project_sqft, sink_price=0.0):
+    """The scalar formula `calculate_cost_batch` replaced, as it was in app.py."""
+    uc            = float(unit_cost)
+    sq_finished   = float(project_sqft)
+    sq_with_waste = sq_finished * WASTE_FACTOR
+    sink_price    = float(sink_price)
+
+    raw_material_cost = uc * sq_with_waste
+    raw_fab_cost      = FABRICATION_COST_PER_SQFT * sq_finished
+    total_direct_cost = raw_material_cost + raw_fab_cost
+
+    ib_candidate_markup = (raw_material_cost * IB_MATERIAL_MARKUP) + raw_fab_cost
+    ib_candidate_floor  = total_direct_cost / (1 - IB_MIN_MARGIN)
+    ib_cost = max(ib_candidate_markup, ib_candidate_floor)
+
+    customer_mat_fab_total = ib_cost * IB_TO_CUSTOMER_MARKUP
+    customer_ins_cost      = INSTALL_COST_PER_SQFT * sq_finished
+
+    slab_subtotal = customer_mat_fab_total + customer_ins_cost
+    subtotal      = slab_subtotal + sink_price
+
+    profit     = slab_subtotal - (total_direct_cost + (INSTALL_COST_PER_SQFT * sq_finished))
+    margin_pct = (profit / slab_subtotal * 100) if slab_subtotal > 0 else 0
+
+    return {
+        "customer_mat_fab": customer_mat_fab_total,
+        "customer_ins":     customer_ins_cost,
+        "sink_price":       sink_price,
+        "slab_subtotal":    slab_subtotal,
+        "subtotal":         subtotal,
+        "ib_cost":          ib_cost,
+        "margin_pct":       margin_pct,
+        "total_with_tax":   subtotal * (1 + TAX_RATE),
+    }
+
+
+@pytest.mark.parametrize("sqft, sink_price", list(itertools.product(SQFT, SINKS)))
+def test_batch_matches_the_scalar_formula(sqft, sink_price):
+    batch = calculate_cost_batch(np.array(UNIT_COSTS), sqft, sink_price)
+    for idx, unit_cost in enumerate(UNIT_COSTS):
+        expected = scalar_cost(unit_cost, sqft, sink_price)
+        assert {key: float(values[idx]) for key, values in batch.items()} == expected
+        assert calculate_cost(unit_cost, sqft, sink_price) == expected
+
+
+def test_batch_broadcasts_sqft_and_sinks():
+    unit_costs = np.array(UNIT_COSTS)[:, None]
+    batch      = calculate_cost_batch(unit_costs, np.array(SQFT)[None, :], 450.5)
+    assert batch["total_with_tax"].shape == (len(UNIT_COSTS), len(SQFT))
+    for (row, unit_cost), (col, sqft) in itertools.product(enumerate(UNIT_COSTS), enumerate(SQFT)):
+        assert batch["total_with_tax"][row, col] == scalar_cost(unit_cost, sqft, 450.5)["total_with_tax"]
@@ -0,0 +1,44 @@
+import hashlib
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_csv
+from counterpro.data import read_inventory_csv
+from counterpro.snapshot import inventory_version, load_snapshot, save_snapshot
+
+
+def _report(payload):
+    return [{"source": "https://example.com/sheet.csv", "status": "ok", "rows": 2_000, "latency_ms": 12.5,
+             "sha256": hashlib.sha256(payload).hexdigest(), "cache": "changed"},
+            {"source": "https://example.com/other.csv", "status": "skipped", "rows": 0, "latency_ms": 3.0}]
+
+
+def test_round_trip_keeps_rows_metadata_and_version(tmp_path):
+    payload = synthetic_csv(2_000, 3)
+    df      = read_inventory_csv(payload)
+    report  = _report(payload)
+    path    = str(tmp_path / "cache" / "inventory.parquet")
+
+    save_snapshot(df, report, 1_760_000_000.25, path)
+    loaded, meta = load_snapshot(path)
+    # Category labels may come back as a different string dtype; the values and column dtypes must not change
+    pd.testing.assert_frame_equal(loaded.astype(object), df.astype(object), check_exact=True)
+    assert [str(dtype) for dtype in loaded.dtypes] == [str(dtype) for dtype in df.dtypes]
+    assert meta == {"fetched_at": 1_760_000_000.25, "sources": report}
+    assert inventory_version(meta["sources"]) == inventory_version(report)
+    assert list((tmp_path / "cache").iterdir()) == [tmp_path / "cache" / "inventory.parquet"]
+
+
+def test_mixed_columns_are_saved_as_text(tmp_path):
+    df   = pd.DataFrame({"Product Variant": ["A", "B", "C"], "Serial Number": [101, "SN-2", None]}, dtype=object)
+    path = str(tmp_path / "inventory.parquet")
+    save_snapshot(df, [], None, path)
+    loaded, _ = load_snapshot(path)
+    assert loaded["Serial Number"].tolist()[:2] == ["101", "SN-2"] and pd.isna(loaded["Serial Number"].iloc[2])
+
+
+def test_missing_or_corrupt_snapshot_loads_nothing(tmp_path):
+    assert load_snapshot(str(tmp_path / "missing.parquet")) == (None, None)
+    corrupt = tmp_path / "corrupt.parquet"
+    corrupt.write_bytes(b"not parquet")
+    assert load_snapshot(str(corrupt)) == (None, None)
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from counterpro.store import INVENTORY_VERSIONS_KEPT, InventoryRefresher, InventoryStore
+
+
+def _report(tag):
+    return [{"source": "sheet", "status": "ok", "sha256": tag}]
+
+
+def _frame(qty):
+    return pd.DataFrame({"On Hand Qty": [qty]})
+
+
+def test_pinned_version_is_read_after_a_newer_one_is_published():
+    store  = InventoryStore()
+    pinned = store.publish(_frame(1.0), _report("a"), 1.0).version
+    newer  = store.publish(_frame(2.0), _report("b"), 2.0)
+    assert store.latest() is newer and newer.version != pinned
+    assert store.get(pinned).df["On Hand Qty"].tolist() == [1.0]
+
+
+def test_only_the_newest_versions_are_kept():
+    store     = InventoryStore()
+    snapshots = [store.publish(_frame(float(idx)), _report(str(idx)), float(idx)) for idx in range(5)]
+    kept      = [snapshot.version for snapshot in snapshots[-INVENTORY_VERSIONS_KEPT:]]
+    assert INVENTORY_VERSIONS_KEPT == 3
+    assert [snapshot.version for snapshot in snapshots if store.get(snapshot.version)] == kept
+
+
+def test_republishing_a_version_keeps_its_frame():
+    store = InventoryStore()
+    first = store.publish(_frame(1.0), _report("a"), 1.0)
+    again = store.publish(_frame(1.0), _report("a"), 2.0)
+    assert again.df is first.df and again.fetched_at == 2.0 and store.latest() is again
+
+
+def test_snapshot_is_read_only():
+    snapshot = InventoryStore().publish(_frame(1.0), _report("a"), 1.0)
+    for name in ("df", "report", "fetched_at", "version"):
+        with pytest.raises(AttributeError):
+            setattr(snapshot, name, None)
+
+
+def test_concurrent_refreshes_share_one_fetch():
+    started, release = threading.Event(), threading.Event()
+    df = pd.DataFrame({"On Hand Qty": [1.0]})
+
+    def fetch():
+        started.set()
+        release.wait(5)
+        return df, _report("a")
+
+    refresher = InventoryRefresher(fetch=fetch)
+    results   = []
+    threads   = [threading.Thread(target=lambda: results.append(refresher.refresh())) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while refresher.stats["collapsed"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)   # Wait until the others are queued behind the running fetch
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert refresher.stats == {"fetches": 1, "collapsed": 3}
+    assert len(results) == 4 and all(snapshot is results[0] for snapshot in results)
+    assert results[0].df is df and not refresher.refreshing
+
+
+def test_failed_fetch_keeps_the_current_snapshot():
+    outcomes = [(pd.DataFrame({"On Hand Qty": [1.0]}), _report("a")), RuntimeError("sheet down"),
+                (None, [{"source": "sheet", "status": "error", "error": "timeout"}])]
+
+    def fetch():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    refresher = InventoryRefresher(fetch=fetch)
+    current   = refresher.refresh()
+    with pytest.raises(RuntimeError):
+        refresher.refresh()
+    assert refresher.store.latest() is current and not refresher.refreshing
+
+    assert refresher.refresh() is current
+    assert refresher.report[0]["status"] == "error"
+    assert refresher.stats["fetches"] == 3